@@ -0,0 +1,4 @@
+"""Reproducible benchmarks for yomigana-ebook.
+
+Run ``python -m benchmarks --help`` from the project root.
+"""
@@ -0,0 +1,125 @@
+from argparse import ArgumentParser
+from os import makedirs, path
+
+from benchmarks.corpus import SHAPES, generate_corpus
+from benchmarks.report import (
+    Results,
+    collect_metadata,
+    compare_results,
+    format_results,
+    load_results,
+    save_results,
+)
+
+
+def main():
+    parser = ArgumentParser(
+        prog="python -m benchmarks",
+        description="Run the yomigana-ebook benchmarks on a synthetic EPUB corpus",
+    )
+    parser.add_argument(
+        "--suite",
+        choices=("all", "micro", "throughput", "backends", "pools"),
+        default="all",
+        help="Which benchmarks to run",
+    )
+    parser.add_argument(
+        "--chars",
+        type=int,
+        default=200_000,
+        help="Characters of text per synthetic book",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument(
+        "--shape",
+        dest="shapes",
+        action="append",
+        choices=SHAPES,
+        help="Corpus shape to benchmark (repeatable, default: all shapes)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark")
+    parser.add_argument(
+        "--quick", action="store_true", help="Smaller inputs for a fast smoke run"
+    )
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this results JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Allowed relative slowdown against the baseline (default: 0.15)",
+    )
+    parser.add_argument(
+        "--save-corpus", metavar="DIR", help="Also write the generated EPUBs to DIR"
+    )
+    args = parser.parse_args()
+
+    chars = min(args.chars, 20_000) if args.quick else args.chars
+    shapes = tuple(args.shapes or SHAPES)
+    results: Results = {}
+
+    if args.suite in ("all", "micro"):
+        # Imported lazily: loading the MeCab tagger is not free.
+        from benchmarks.micro import run_micro
+
+        print("[bench] microbenchmarks")
+        results.update(run_micro(args.seed, args.repeat, args.quick))
+
+    if args.suite in ("all", "throughput") or args.save_corpus:
+        books = generate_corpus(chars, args.seed, shapes)
+
+        if args.save_corpus:
+            makedirs(args.save_corpus, exist_ok=True)
+            for book in books:
+                with open(path.join(args.save_corpus, f"{book.shape}.epub"), "wb") as f:
+                    f.write(book.data)
+
+        if args.suite in ("all", "throughput"):
+            from benchmarks.throughput import run_throughput
+
+            print(f"[bench] throughput ({chars} chars per book)")
+            results.update(run_throughput(books, args.repeat))
+
+    if args.suite in ("all", "backends"):
+        from benchmarks.backends import run_backends
+
+        print("[bench] thread and process backends by book size")
+        results.update(run_backends(args.seed, args.repeat, args.quick))
+
+    if args.suite in ("all", "pools"):
+        from benchmarks.pools import run_pools
+
+        print("[bench] plain and recycling process pools")
+        results.update(run_pools(args.seed, args.repeat, args.quick))
+
+    print(format_results(results))
+
+    if args.output:
+        settings = {
+            "suite": args.suite,
+            "chars": chars,
+            "seed": args.seed,
+            "shapes": list(shapes),
+            "repeat": args.repeat,
+            "quick": args.quick,
+        }
+        save_results(args.output, collect_metadata(settings), results)
+        print(f"[bench] results saved to {args.output}")
+
+    if args.baseline:
+        regressions = compare_results(
+            load_results(args.baseline), results, args.tolerance
+        )
+        for regression in regressions:
+            print(
+                f"[regression] {regression.benchmark} {regression.metric}: "
+                f"{regression.baseline:,.1f} -> {regression.current:,.1f} "
+                f"({regression.change:+.0%})"
+            )
+        if regressions:
+            exit(1)
+        print(f"[bench] no regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Thread versus process backends of ``process_ebook`` by book size.
+
+Also measures how well MeCab's own work scales over threads with one tagger
+each, which bounds what the thread backend can gain from more workers.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from os import cpu_count
+from random import Random
+from time import perf_counter
+from typing import Dict, List
+
+from benchmarks.corpus import generate_book, japanese_sentence
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import process_ebook
+from yomigana_ebook.yomituki import thread_tagger
+
+Result = Dict[str, float]
+
+SIZES = (5_000, 50_000, 500_000)
+QUICK_SIZES = (2_000, 20_000)
+
+
+def run_backends(
+    seed: int = 0, repeat: int = 3, quick: bool = False
+) -> Dict[str, Result]:
+    results: Dict[str, Result] = {}
+
+    for chars in QUICK_SIZES if quick else SIZES:
+        book = generate_book("many-small", chars, seed)
+        for backend in ("thread", "process"):
+            best = float("inf")
+            for _ in range(repeat):
+                with BytesIO(book.data) as reader, BytesIO() as writer:
+                    start = perf_counter()
+                    process_ebook(
+                        reader, writer, options=ConversionOptions(backend=backend)
+                    )
+                    best = min(best, perf_counter() - start)
+
+            results[f"backend.{backend}.{chars}"] = {
+                "seconds": best,
+                "chars_per_second": book.text_chars / best,
+            }
+
+    rng = Random(f"backends:{seed}")
+    sentences = [japanese_sentence(rng) for _ in range(200 if quick else 2_000)]
+    results["tagger.threads"] = tagger_parallelism(sentences, repeat)
+    return results
+
+
+def tagger_parallelism(sentences: List[str], repeat: int = 3) -> Result:
+    """Speedup of tagging on one thread per CPU over a single thread.
+
+    Every thread tags all ``sentences``, so perfect scaling gives a speedup
+    equal to the number of threads and 1.0 means the work is serialized.
+    """
+    threads = max(2, cpu_count() or 1)
+
+    def tag_all(_=None):
+        tagger = thread_tagger()
+        for sentence in sentences:
+            tagger.parse(sentence)  # type: ignore
+
+    with ThreadPoolExecutor(threads) as executor:
+        # Create the taggers of all threads outside of the measurement.
+        list(executor.map(lambda _: thread_tagger(), range(threads)))
+
+        single = parallel = float("inf")
+        for _ in range(repeat):
+            start = perf_counter()
+            executor.submit(tag_all).result()
+            single = min(single, perf_counter() - start)
+
+            start = perf_counter()
+            list(executor.map(tag_all, range(threads)))
+            parallel = min(parallel, perf_counter() - start)
+
+    return {"threads": threads, "speedup": threads * single / parallel}
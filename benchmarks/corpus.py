@@ -0,0 +1,276 @@
+"""Deterministic generator for synthetic EPUB benchmark corpora.
+
+Every book is built from a seeded ``random.Random`` and fixed zip timestamps,
+so the same ``(shape, text_chars, seed)`` always produces byte-identical
+archives. That keeps benchmark runs comparable across machines and commits.
+"""
+
+import re
+from dataclasses import dataclass
+from io import BytesIO
+from random import Random
+from typing import Callable, Dict, List, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+SHAPES = ("many-small", "one-huge", "image-heavy", "bilingual", "annotated")
+
+_ZIP_DATE_TIME = (2020, 1, 1, 0, 0, 0)
+
+# (surface, reading) pairs; kana-only entries have an empty reading.
+_NOUNS = [
+    ("学校", "がっこう"),
+    ("先生", "せんせい"),
+    ("図書館", "としょかん"),
+    ("本", "ほん"),
+    ("兵士", "へいし"),
+    ("娘", "むすめ"),
+    ("手段", "しゅだん"),
+    ("司書", "ししょ"),
+    ("月", "つき"),
+    ("魔法", "まほう"),
+    ("神殿", "しんでん"),
+    ("貴族", "きぞく"),
+    ("商人", "しょうにん"),
+    ("家族", "かぞく"),
+    ("言葉", "ことば"),
+    ("世界", "せかい"),
+    ("時間", "じかん"),
+    ("部屋", "へや"),
+    ("窓", "まど"),
+    ("空", "そら"),
+    ("森", "もり"),
+    ("街", "まち"),
+    ("日々", "ひび"),
+    ("ドア", ""),
+    ("パン", ""),
+    ("インク", ""),
+]
+_VERBS = [
+    ("見上げて", "みあげて"),
+    ("思い出した", "おもいだした"),
+    ("選んで", "えらんで"),
+    ("読んだ", "よんだ"),
+    ("書いている", "かいている"),
+    ("歩き出す", "あるきだす"),
+    ("引っ繰り返って", "ひっくりかえって"),
+    ("笑った", "わらった"),
+    ("考える", "かんがえる"),
+    ("走っていく", "はしっていく"),
+]
+_ADJECTIVES = [
+    ("綺麗な", "きれいな"),
+    ("静かな", "しずかな"),
+    ("古い", "ふるい"),
+    ("新しい", "あたらしい"),
+    ("大きな", "おおきな"),
+    ("小さな", "ちいさな"),
+]
+WORD_ENTRIES = _NOUNS + _VERBS + _ADJECTIVES
+
+_PARTICLES = ["は", "が", "を", "に", "で", "と", "の", "へ", "も"]
+_ENDINGS = ["。", "。", "。", "！", "？", "……。"]
+_ENGLISH_WORDS = (
+    "the quick library soldier daughter book magic temple merchant family "
+    "window forest street time world word moon ink bread door reads writes "
+    "walks remembers looks thinks quietly slowly again today"
+).split()
+
+_TAG_PATTERN = re.compile(r"<[^>]*>")
+
+_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+
+@dataclass(frozen=True)
+class SyntheticBook:
+    shape: str
+    data: bytes
+    text_chars: int
+    html_files: int
+
+
+def generate_book(
+    shape: str, text_chars: int = 200_000, seed: int = 0
+) -> SyntheticBook:
+    """Generate a synthetic EPUB of roughly ``text_chars`` characters of text.
+
+    Shapes:
+
+    - ``many-small``: many short chapters (about 2,000 characters each)
+    - ``one-huge``: the whole text in a single chapter
+    - ``image-heavy``: a few chapters plus many incompressible images
+    - ``bilingual``: alternating Japanese and English paragraphs
+    - ``annotated``: text that already carries ``<ruby>`` furigana
+    """
+    if shape not in _BUILDERS:
+        raise ValueError(f"unknown corpus shape: {shape!r} (expected one of {SHAPES})")
+
+    rng = Random(f"{shape}:{text_chars}:{seed}")
+    chapters, images = _BUILDERS[shape](rng, text_chars)
+
+    return SyntheticBook(
+        shape=shape,
+        data=_build_epub(shape, chapters, images),
+        text_chars=sum(chars for _, chars in chapters),
+        html_files=len(chapters),
+    )
+
+
+def generate_corpus(
+    text_chars: int = 200_000, seed: int = 0, shapes: Tuple[str, ...] = SHAPES
+) -> List[SyntheticBook]:
+    return [generate_book(shape, text_chars, seed) for shape in shapes]
+
+
+def japanese_sentence(rng: Random, ruby: bool = False) -> str:
+    parts: List[str] = []
+    for _ in range(rng.randint(2, 4)):
+        if rng.random() < 0.4:
+            parts.append(_word(rng.choice(_ADJECTIVES), ruby))
+        parts.append(_word(rng.choice(_NOUNS), ruby))
+        parts.append(rng.choice(_PARTICLES))
+    parts.append(_word(rng.choice(_VERBS), ruby))
+    parts.append(rng.choice(_ENDINGS))
+    return "".join(parts)
+
+
+def english_sentence(rng: Random) -> str:
+    words = [rng.choice(_ENGLISH_WORDS) for _ in range(rng.randint(6, 14))]
+    return " ".join(words).capitalize() + "."
+
+
+def _word(entry: Tuple[str, str], ruby: bool) -> str:
+    surface, reading = entry
+    if not ruby or not reading:
+        return surface
+    return f"<ruby>{surface}<rt>{reading}</rt></ruby>"
+
+
+def _paragraphs(
+    rng: Random, chars: int, sentence: Callable[[Random], str]
+) -> Tuple[List[str], int]:
+    paragraphs: List[str] = []
+    total = 0
+    while total < chars:
+        paragraph = "".join(sentence(rng) for _ in range(rng.randint(2, 6)))
+        paragraphs.append(paragraph)
+        total += len(_TAG_PATTERN.sub("", paragraph))
+    return paragraphs, total
+
+
+def _chapter(title: str, paragraphs: List[str]) -> str:
+    body = "\n".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="ja">\n'
+        f"<head><title>{title}</title></head>\n"
+        f"<body>\n<h1>{title}</h1>\n{body}\n</body>\n</html>\n"
+    )
+
+
+def _split_chapters(
+    rng: Random,
+    text_chars: int,
+    chapter_chars: int,
+    sentence: Callable[[Random], str] = japanese_sentence,
+) -> List[Tuple[str, int]]:
+    chapters: List[Tuple[str, int]] = []
+    remaining = text_chars
+    while remaining > 0:
+        paragraphs, chars = _paragraphs(rng, min(chapter_chars, remaining), sentence)
+        chapters.append((_chapter(f"第{len(chapters) + 1}章", paragraphs), chars))
+        remaining -= chars
+    return chapters
+
+
+def _many_small(rng: Random, text_chars: int):
+    return _split_chapters(rng, text_chars, 2_000), []
+
+
+def _one_huge(rng: Random, text_chars: int):
+    return _split_chapters(rng, text_chars, text_chars), []
+
+
+def _image_heavy(rng: Random, text_chars: int):
+    chapters = _split_chapters(rng, text_chars, 5_000)
+    images = [rng.randbytes(200_000) for _ in range(max(4, len(chapters) * 2))]
+    return chapters, images
+
+
+def _bilingual(rng: Random, text_chars: int):
+    def sentence(rng: Random) -> str:
+        if rng.random() < 0.5:
+            return english_sentence(rng)
+        return japanese_sentence(rng)
+
+    return _split_chapters(rng, text_chars, 5_000, sentence), []
+
+
+def _annotated(rng: Random, text_chars: int):
+    def sentence(rng: Random) -> str:
+        return japanese_sentence(rng, ruby=True)
+
+    return _split_chapters(rng, text_chars, 5_000, sentence), []
+
+
+_BUILDERS: Dict[
+    str, Callable[[Random, int], Tuple[List[Tuple[str, int]], List[bytes]]]
+] = {
+    "many-small": _many_small,
+    "one-huge": _one_huge,
+    "image-heavy": _image_heavy,
+    "bilingual": _bilingual,
+    "annotated": _annotated,
+}
+
+
+def _build_epub(
+    title: str, chapters: List[Tuple[str, int]], images: List[bytes]
+) -> bytes:
+    manifest: List[str] = []
+    spine: List[str] = []
+    buffer = BytesIO()
+
+    with ZipFile(buffer, "w") as zip_writer:
+        _write(zip_writer, "mimetype", b"application/epub+zip", ZIP_STORED)
+        _write(zip_writer, "META-INF/container.xml", _CONTAINER_XML.encode())
+
+        for index, (chapter, _) in enumerate(chapters):
+            name = f"chapter{index:04d}.xhtml"
+            manifest.append(
+                f'<item id="c{index}" href="{name}" media-type="application/xhtml+xml"/>'
+            )
+            spine.append(f'<itemref idref="c{index}"/>')
+            _write(zip_writer, f"OEBPS/{name}", chapter.encode())
+
+        for index, image in enumerate(images):
+            name = f"images/image{index:04d}.jpg"
+            manifest.append(
+                f'<item id="i{index}" href="{name}" media-type="image/jpeg"/>'
+            )
+            _write(zip_writer, f"OEBPS/{name}", image, ZIP_STORED)
+
+        opf = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="id">synthetic-{title}</dc:identifier>'
+            f"<dc:title>{title}</dc:title><dc:language>ja</dc:language></metadata>\n"
+            f"<manifest>{''.join(manifest)}</manifest>\n"
+            f"<spine>{''.join(spine)}</spine>\n"
+            "</package>\n"
+        )
+        _write(zip_writer, "OEBPS/content.opf", opf.encode())
+
+    return buffer.getvalue()
+
+
+def _write(zip_writer: ZipFile, name: str, data: bytes, compress_type=ZIP_DEFLATED):
+    info = ZipInfo(name, date_time=_ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    zip_writer.writestr(info, data)
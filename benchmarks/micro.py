@@ -0,0 +1,79 @@
+"""Microbenchmarks for the hot functions of the conversion pipeline."""
+
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.corpus import WORD_ENTRIES, english_sentence, japanese_sentence
+from yomigana_ebook import checking
+from yomigana_ebook.yomituki import tagger, yomituki, yomituki_word
+
+Result = Dict[str, float]
+
+
+def run_micro(seed: int = 0, repeat: int = 5, quick: bool = False) -> Dict[str, Result]:
+    """Run every microbenchmark and return ``{name: {"ns_per_op": ...}}``."""
+    rng = Random(f"micro:{seed}")
+    sentences = [japanese_sentence(rng) for _ in range(200 if quick else 2_000)]
+    english = [english_sentence(rng) for _ in range(200 if quick else 2_000)]
+    chars = "".join(sentences)
+    words = [
+        (morpheme.surface, morpheme.feature.kana)  # type: ignore
+        for sentence in sentences
+        for morpheme in tagger(sentence)  # type: ignore
+    ]
+    entries = WORD_ENTRIES
+
+    benchmarks: List[Tuple[str, Callable[[], object], int]] = [
+        (
+            "checking.is_kanji",
+            lambda: [checking.is_kanji(c) for c in chars],
+            len(chars),
+        ),
+        ("checking.is_hira", lambda: [checking.is_hira(c) for c in chars], len(chars)),
+        (
+            "checking.is_kanji_only",
+            lambda: [checking.is_kanji_only(s) for s, _ in entries],
+            len(entries),
+        ),
+        (
+            "checking.contains_japanese",
+            lambda: [checking.contains_japanese(s) for s in english],
+            len(english),
+        ),
+        (
+            "checking.contains_japanese_script",
+            lambda: [checking.contains_japanese_script(s) for s in english],
+            len(english),
+        ),
+        (
+            "yomituki_word.uncached",
+            lambda: [yomituki_word.__wrapped__(s, k) for s, k in words],
+            len(words),
+        ),
+        (
+            "yomituki_word.warm",
+            lambda: [yomituki_word(s, k) for s, k in words],
+            len(words),
+        ),
+        (
+            "yomituki.sentence",
+            lambda: ["".join(yomituki(s)) for s in sentences],
+            len(sentences),
+        ),
+    ]
+
+    results: Dict[str, Result] = {}
+    for name, func, ops in benchmarks:
+        results[name] = {"ns_per_op": _best_of(func, repeat) / ops * 1e9}
+    return results
+
+
+def _best_of(func: Callable[[], object], repeat: int) -> float:
+    func()  # warm up caches and allocations outside of the measurement
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
@@ -0,0 +1,50 @@
+"""A plain process pool versus the ``RecyclingExecutor`` of ``create_executor``.
+
+The recycling pool hands each worker one task at a time, so every HTML file
+takes a round-trip through the parent; books of many small files show the
+cost most. "stoppable" is that pool with recycling off, as the web demo and
+the desktop app use it; "recycling" also replaces workers as they go.
+"""
+
+from io import BytesIO
+from time import perf_counter
+from typing import Dict
+
+from benchmarks.corpus import generate_book
+from yomigana_ebook.process_ebook import create_executor, process_ebook, start_workers
+
+Result = Dict[str, float]
+
+POOLS = {
+    "plain": dict(max_tasks_per_worker=0, max_worker_rss=0),
+    "stoppable": dict(max_tasks_per_worker=0, max_worker_rss=0, stoppable=True),
+    "recycling": dict(max_tasks_per_worker=50, max_worker_rss=0),
+}
+
+SIZES = (50_000, 500_000)
+QUICK_SIZES = (20_000,)
+
+
+def run_pools(seed: int = 0, repeat: int = 3, quick: bool = False) -> Dict[str, Result]:
+    results: Dict[str, Result] = {}
+
+    for chars in QUICK_SIZES if quick else SIZES:
+        book = generate_book("many-small", chars, seed)
+        for name, settings in POOLS.items():
+            with create_executor(log=None, **settings) as executor:
+                # Starting the workers and loading the dictionary is not measured.
+                start_workers(executor)
+                best = float("inf")
+                for _ in range(repeat):
+                    with BytesIO(book.data) as reader, BytesIO() as writer:
+                        start = perf_counter()
+                        process_ebook(reader, writer, executor=executor)
+                        best = min(best, perf_counter() - start)
+
+            results[f"pool.{name}.{chars}"] = {
+                "seconds": best,
+                "chars_per_second": book.text_chars / best,
+                "html_files_per_second": book.html_files / best,
+            }
+
+    return results
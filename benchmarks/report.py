@@ -0,0 +1,85 @@
+"""Saving benchmark results as JSON and comparing them against a baseline."""
+
+import json
+import platform
+from datetime import datetime, timezone
+from importlib import metadata
+from os import cpu_count
+from typing import Any, Dict, List, NamedTuple
+
+Results = Dict[str, Dict[str, float]]
+
+# Metrics where a smaller value is better; everything else is a rate.
+LOWER_IS_BETTER = {"ns_per_op", "seconds"}
+
+
+class Regression(NamedTuple):
+    benchmark: str
+    metric: str
+    baseline: float
+    current: float
+    change: float
+
+
+def collect_metadata(settings: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        version = metadata.version("yomigana-ebook")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "yomigana_ebook": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": cpu_count(),
+        "settings": settings,
+    }
+
+
+def save_results(path: str, meta: Dict[str, Any], results: Results) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_results(path: str) -> Results:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare_results(
+    baseline: Results, current: Results, tolerance: float = 0.15
+) -> List[Regression]:
+    """Return the metrics that got worse than ``baseline`` by more than ``tolerance``.
+
+    ``change`` is the relative slowdown, e.g. ``0.25`` means 25% worse.
+    Benchmarks missing from either side are ignored.
+    """
+    regressions: List[Regression] = []
+
+    for name, metrics in current.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base or not value:
+                continue
+
+            if metric in LOWER_IS_BETTER:
+                change = value / base - 1
+            else:
+                change = base / value - 1
+
+            if change > tolerance:
+                regressions.append(Regression(name, metric, base, value, change))
+
+    return regressions
+
+
+def format_results(results: Results) -> str:
+    lines: List[str] = []
+    for name, metrics in sorted(results.items()):
+        values = ", ".join(
+            f"{metric}={value:,.1f}" for metric, value in metrics.items()
+        )
+        lines.append(f"{name:<40} {values}")
+    return "\n".join(lines)
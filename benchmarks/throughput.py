@@ -0,0 +1,33 @@
+"""End-to-end throughput of ``process_ebook`` over the synthetic corpus."""
+
+from io import BytesIO
+from time import perf_counter
+from typing import Dict, Iterable
+
+from benchmarks.corpus import SyntheticBook
+from yomigana_ebook.process_ebook import process_ebook
+
+Result = Dict[str, float]
+
+
+def run_throughput(
+    books: Iterable[SyntheticBook], repeat: int = 3
+) -> Dict[str, Result]:
+    """Convert each book ``repeat`` times and keep the fastest run."""
+    results: Dict[str, Result] = {}
+
+    for book in books:
+        best = float("inf")
+        for _ in range(repeat):
+            with BytesIO(book.data) as reader, BytesIO() as writer:
+                start = perf_counter()
+                process_ebook(reader, writer)
+                best = min(best, perf_counter() - start)
+
+        results[f"process_ebook.{book.shape}"] = {
+            "seconds": best,
+            "chars_per_second": book.text_chars / best,
+            "books_per_minute": 60 / best,
+        }
+
+    return results
@@ -58,9 +58,13 @@ def main() -> int:
 
     # Import after the dictionary is configured so the lazy worker import and
     # child processes see the correct YOMIGANA_UNIDIC_DIR.
+    from yomigana_desktop.engine import WarmEngine
     from yomigana_desktop.main_window import MainWindow
 
-    window = MainWindow()
+    # Load the dictionary and start the workers while the user picks files.
+    engine = WarmEngine()
+    window = MainWindow(engine)
+    engine.start()
     window.show()
     return app.exec()
 
@@ -0,0 +1,79 @@
+"""Background warm-up of the conversion engine for the desktop GUI.
+
+Loading UniDic and starting the worker processes takes several seconds. The
+engine does both right after the app starts, while the user is still picking
+files, and keeps the warm process pool for every conversion of the session.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor
+from time import perf_counter
+
+from PySide6.QtCore import QObject, QThread, Signal
+
+from yomigana_ebook.governor import Governor
+
+
+class WarmEngine(QThread):
+    """Load the tagger and start a process pool in a background thread."""
+
+    log = Signal(str)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self._executor: Executor | None = None
+        self.governor: Governor | None = None
+
+    def executor(self) -> Executor | None:
+        """Wait for the warm-up and return the pool, or None if it failed."""
+        self.wait()
+        return self._executor
+
+    def configure(self, governor: Governor | None) -> None:
+        """Replace the pool with one for ``governor``; only call it between conversions."""
+        self.shutdown()
+        self.governor = governor
+        self.start()
+
+    def shutdown(self) -> None:
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def run(self) -> None:  # noqa: D102
+        self.log.emit("[info] 正在后台加载词典……")
+        start_time = perf_counter()
+        executor = None
+        try:
+            # The import creates the tagger of this process; books with a
+            # single HTML file are converted here instead of in the pool.
+            from yomigana_ebook.process_ebook import (
+                create_executor,
+                start_workers,
+                warm_up_tagger,
+            )
+
+            warm_up_tagger()
+            self.log.emit(
+                f"[info] 词典加载完成，耗时 {perf_counter() - start_time:.2f} 秒"
+            )
+
+            pool_start_time = perf_counter()
+            # Stoppable, so that stopping a conversion stops its running files.
+            executor = create_executor(
+                governor=self.governor, log=self.log.emit, stoppable=True
+            )
+            start_workers(executor)
+        except Exception as exc:  # noqa: BLE001 - conversions fall back to a new pool
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self.log.emit(f"[error] 预加载转换引擎失败，将在转换时重新加载: {exc}")
+            return
+
+        self._executor = executor
+        self.log.emit(
+            f"[info] 转换引擎就绪：{executor._max_workers} 个工作进程，"
+            f"耗时 {perf_counter() - pool_start_time:.2f} 秒"
+        )
@@ -26,6 +26,8 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
+from yomigana_ebook.governor import Governor
+from yomigana_desktop.engine import WarmEngine
 from yomigana_desktop.worker import ConvertWorker
 
 GITHUB_URL = "https://github.com/FFFold/yomigana-ebook"
@@ -81,16 +83,24 @@ class DropListWidget(QListWidget):
 
 
 class MainWindow(QMainWindow):
-    def __init__(self) -> None:
+    def __init__(self, engine: WarmEngine | None = None) -> None:
         super().__init__()
         self.setWindowTitle("yomigana ebook - Windows GUI")
         self.resize(720, 560)
 
         self._worker: ConvertWorker | None = None
+        self._engine = engine
         self._succeeded_count = 0
         self._failed_count = 0
 
         self._build_ui()
+        if engine is not None:
+            engine.log.connect(self._append_log)
+            # The pool is rebuilt when the mode changes; not while it starts.
+            engine.started.connect(lambda: self.background_checkbox.setEnabled(False))
+            engine.finished.connect(
+                lambda: self.background_checkbox.setEnabled(self._worker is None)
+            )
 
     def _build_ui(self) -> None:
         central = QWidget(self)
@@ -136,6 +146,13 @@ class MainWindow(QMainWindow):
         options_layout = QHBoxLayout()
         self.filter_checkbox = QCheckBox("过滤非日语段落（-f）", central)
         options_layout.addWidget(self.filter_checkbox)
+        self.background_checkbox = QCheckBox("后台模式（低优先级，少占 CPU）", central)
+        self.background_checkbox.setToolTip(
+            "只使用一半的 CPU 核心并以低优先级运行，系统繁忙时自动减少并行数，"
+            "转换时电脑仍可流畅使用"
+        )
+        self.background_checkbox.toggled.connect(self._set_background_mode)
+        options_layout.addWidget(self.background_checkbox)
         options_layout.addStretch(1)
         layout.addLayout(options_layout)
 
@@ -290,6 +307,7 @@ class MainWindow(QMainWindow):
             paths,
             output_dir,
             filter_non_japanese=self.filter_checkbox.isChecked(),
+            engine=self._engine,
             parent=self,
         )
         worker.progress.connect(self._on_progress)
@@ -304,7 +322,14 @@ class MainWindow(QMainWindow):
         if self._worker is not None:
             self._worker.request_stop()
             self.stop_button.setEnabled(False)
-            self._append_log("[info] 正在停止，当前文件处理完会停止……")
+            self._append_log("[info] 正在停止……")
+
+    def _set_background_mode(self, enabled: bool) -> None:
+        if self._engine is not None:
+            self._engine.configure(Governor.background() if enabled else None)
+        self._append_log(
+            "[info] 已开启后台模式" if enabled else "[info] 已关闭后台模式"
+        )
 
     def _set_running(self, running: bool) -> None:
         self.start_button.setEnabled(not running)
@@ -315,6 +340,9 @@ class MainWindow(QMainWindow):
         self.output_button.setEnabled(not running)
         self.output_clear_button.setEnabled(not running)
         self.filter_checkbox.setEnabled(not running)
+        self.background_checkbox.setEnabled(
+            not running and (self._engine is None or not self._engine.isRunning())
+        )
         self.stop_button.setEnabled(running)
         self.progress_bar.setRange(0, 1)
         self.progress_bar.setValue(0)
@@ -385,4 +413,6 @@ class MainWindow(QMainWindow):
                 )
                 event.ignore()
                 return
+        if self._engine is not None:
+            self._engine.shutdown()
         event.accept()
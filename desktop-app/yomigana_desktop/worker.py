@@ -8,6 +8,8 @@ from time import time
 
 from PySide6.QtCore import QObject, QThread, Signal
 
+from yomigana_desktop.engine import WarmEngine
+
 
 class ConvertWorker(QThread):
     """Convert a list of EPUB files sequentially in a background thread.
@@ -29,28 +31,42 @@ class ConvertWorker(QThread):
         ebook_paths: list[Path],
         output_dir: Path | None,
         filter_non_japanese: bool = False,
+        engine: WarmEngine | None = None,
         parent: QObject | None = None,
     ) -> None:
         super().__init__(parent)
+        self._engine = engine
         self._ebook_paths = ebook_paths
         self._output_dir = output_dir
         self._filter_non_japanese = filter_non_japanese
         self._stop_requested = False
+        self._cancel_token = None
 
     def request_stop(self) -> None:
-        """Ask the worker to stop after the current book finishes."""
+        """Ask the worker to stop; the current book is abandoned promptly."""
         self._stop_requested = True
+        if self._cancel_token is not None:
+            self._cancel_token.cancel("已停止")
 
     def run(self) -> None:  # noqa: D102
         # Import lazily so the GUI can set YOMIGANA_UNIDIC_DIR before the
         # module-level MeCab tagger is created.
         try:
+            from yomigana_ebook.cancellation import CancelToken, ConversionCancelled
             from yomigana_ebook.process_ebook import process_ebook
         except Exception as exc:  # noqa: BLE001 - report any import failure
             self.log.emit(f"[error] 无法加载转换模块: {exc}")
             self.all_done.emit(0, len(self._ebook_paths))
             return
 
+        executor = None
+        governor = None
+        if self._engine is not None:
+            governor = self._engine.governor
+            if self._engine.isRunning():
+                self.log.emit("[info] 等待转换引擎就绪……")
+            executor = self._engine.executor()
+
         total = len(self._ebook_paths)
         succeeded = 0
         failed = 0
@@ -80,6 +96,9 @@ class ConvertWorker(QThread):
                 self.progress.emit(index, total, done, html_total)
 
             temp_path = output_path.with_name(output_path.name + ".tmp")
+            self._cancel_token = CancelToken()
+            if self._stop_requested:
+                self._cancel_token.cancel()
             try:
                 with input_path.open("rb") as reader, temp_path.open("wb") as writer:
                     process_ebook(
@@ -87,8 +106,18 @@ class ConvertWorker(QThread):
                         writer,
                         self._filter_non_japanese,
                         progress_callback=on_progress,
+                        executor=executor,
+                        governor=governor,
+                        cancel_token=self._cancel_token,
                     )
                 os.replace(temp_path, output_path)
+            except ConversionCancelled:
+                try:
+                    temp_path.unlink(missing_ok=True)
+                except OSError:
+                    pass
+                self.log.emit(f"[info] ({index}/{total}) 已停止处理: {input_path.name}")
+                break
             except (
                 Exception
             ) as exc:  # noqa: BLE001 - report any conversion failure in GUI
@@ -0,0 +1,38 @@
+"""Builders shared by the tests: in-memory EPUBs to convert and read back."""
+
+from io import BytesIO
+from typing import Mapping, Union
+from zipfile import ZipFile
+
+
+def page(text: str) -> str:
+    return f"<html><body><p>{text}</p></body></html>"
+
+
+def numbered_pages(count: int, text: str = "漢字") -> dict[str, str]:
+    """``count`` pages ``page<i>.xhtml``, each with ``text`` and its number."""
+    return {f"page{index}.xhtml": page(f"{text}{index}") for index in range(count)}
+
+
+def make_ebook(
+    pages: Mapping[str, Union[str, bytes]], mimetype: bool = False
+) -> BytesIO:
+    """A zip of ``pages`` (entry name -> content), ready to be read.
+
+    With ``mimetype``, it starts with the ``mimetype`` entry of an EPUB.
+    """
+    reader = BytesIO()
+    with ZipFile(reader, "w") as zip_writer:
+        if mimetype:
+            zip_writer.writestr("mimetype", "application/epub+zip")
+        for name, content in pages.items():
+            zip_writer.writestr(name, content)
+    reader.seek(0)
+    return reader
+
+
+def read_entries(ebook: Union[bytes, BytesIO]) -> dict[str, bytes]:
+    """Every entry of a converted ebook by name."""
+    data = ebook.getvalue() if isinstance(ebook, BytesIO) else ebook
+    with ZipFile(BytesIO(data)) as zip_reader:
+        return {name: zip_reader.read(name) for name in zip_reader.namelist()}
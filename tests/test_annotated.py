@@ -0,0 +1,81 @@
+from io import BytesIO
+
+import pytest
+
+from yomigana_ebook.annotated import is_annotated_html, is_converted_archive
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import process_ebook
+from tests.helpers import make_ebook, read_entries
+
+ANNOTATED_PAGE = (
+    "<html><body><p><ruby>漢字<rt>かんじ</rt></ruby>を<ruby>読<rt>よ</rt></ruby>む</p>"
+    "</body></html>"
+).encode()
+SPARSE_PAGE = (
+    "<html><body><p><ruby>薔薇<rt>ばら</rt></ruby>の花が咲いた公園を散歩する</p>"
+    "</body></html>"
+).encode()
+BARE_PAGE = "<html><body><p>漢字を読む</p></body></html>".encode()
+
+
+@pytest.mark.parametrize(
+    "test_case, content, expected",
+    [
+        ("dense ruby", ANNOTATED_PAGE, True),
+        ("sparse publisher ruby", SPARSE_PAGE, False),
+        ("no ruby", BARE_PAGE, False),
+        ("ruby without kanji", b"<p><ruby>abc<rt>x</rt></ruby></p>", False),
+    ],
+)
+def test_is_annotated_html(test_case: str, content: bytes, expected: bool):
+    assert is_annotated_html(content) == expected
+
+
+def test_converted_archive_is_marked_and_copied_through():
+    first = BytesIO()
+    process_ebook(make_ebook({"page.xhtml": BARE_PAGE}, mimetype=True), first)
+    first.seek(0)
+    assert is_converted_archive(first)
+    assert first.tell() == 0
+
+    second = BytesIO()
+    progress_calls: list[tuple[int, int]] = []
+    process_ebook(
+        first,
+        second,
+        progress_callback=lambda done, total: progress_calls.append((done, total)),
+    )
+
+    assert second.getvalue() == first.getvalue()
+    assert progress_calls == [(0, 0)]
+
+
+def test_process_ebook_passes_annotated_entries_through():
+    writer = BytesIO()
+    process_ebook(
+        make_ebook(
+            {"annotated.xhtml": ANNOTATED_PAGE, "bare.xhtml": BARE_PAGE}, mimetype=True
+        ),
+        writer,
+    )
+
+    entries = read_entries(writer.getvalue())
+    assert entries["annotated.xhtml"] == ANNOTATED_PAGE
+    assert b"<ruby>" in entries["bare.xhtml"]
+
+
+def test_process_ebook_bare_policy_annotates_remaining_text():
+    reader = make_ebook(
+        {"sparse.xhtml": ANNOTATED_PAGE.replace("む".encode(), "む本".encode())},
+        mimetype=True,
+    )
+    writer = BytesIO()
+    process_ebook(reader, writer, options=ConversionOptions(annotated_policy="bare"))
+
+    content = read_entries(writer.getvalue())["sparse.xhtml"]
+    assert content.count(b"<ruby>") == 3
+
+
+def test_options_reject_unknown_policy():
+    with pytest.raises(ValueError):
+        ConversionOptions(annotated_policy="nope")
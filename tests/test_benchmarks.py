@@ -0,0 +1,50 @@
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from benchmarks.corpus import SHAPES, generate_book
+from benchmarks.report import compare_results
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_generate_book_is_deterministic(shape: str):
+    first = generate_book(shape, text_chars=3_000, seed=1)
+    second = generate_book(shape, text_chars=3_000, seed=1)
+
+    assert first.data == second.data
+    assert first.text_chars >= 3_000
+    assert first.html_files >= 1
+
+
+def test_generate_book_produces_epub_layout():
+    book = generate_book("many-small", text_chars=5_000)
+
+    with ZipFile(BytesIO(book.data)) as zip_reader:
+        names = zip_reader.namelist()
+
+    assert names[0] == "mimetype"
+    assert "OEBPS/content.opf" in names
+    assert sum(name.endswith(".xhtml") for name in names) == book.html_files
+
+
+def test_generate_book_rejects_unknown_shape():
+    with pytest.raises(ValueError):
+        generate_book("no-such-shape")
+
+
+def test_compare_results_reports_only_regressions():
+    baseline = {
+        "micro": {"ns_per_op": 100.0},
+        "e2e": {"chars_per_second": 1000.0},
+    }
+    current = {
+        "micro": {"ns_per_op": 130.0},
+        "e2e": {"chars_per_second": 1100.0},
+        "new": {"ns_per_op": 1.0},
+    }
+
+    regressions = compare_results(baseline, current, tolerance=0.15)
+
+    assert [(r.benchmark, r.metric) for r in regressions] == [("micro", "ns_per_op")]
+    assert regressions[0].change == pytest.approx(0.3)
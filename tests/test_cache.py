@@ -0,0 +1,79 @@
+import tomllib
+from io import BytesIO
+from pathlib import Path
+
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.process_ebook import process_ebook
+from tests.helpers import make_ebook, read_entries
+
+PAGE_1 = "<html><body><p>漢字一</p></body></html>".encode()
+PAGE_2 = "<html><body><p>漢字二</p></body></html>".encode()
+
+
+def _convert(pages: dict[str, bytes], cache: EntryCache, **kwargs) -> dict[str, bytes]:
+    writer = BytesIO()
+    process_ebook(make_ebook(pages), writer, cache=cache, **kwargs)
+    return read_entries(writer)
+
+
+def test_entry_cache_key_depends_on_content_and_filter(tmp_path):
+    cache = EntryCache(str(tmp_path))
+
+    assert cache.key(PAGE_1) == cache.key(PAGE_1)
+    assert cache.key(PAGE_1) != cache.key(PAGE_2)
+    assert cache.key(PAGE_1) != cache.key(PAGE_1, filter_non_japanese=True)
+
+
+def test_entry_cache_round_trip(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    key = cache.key(PAGE_1)
+
+    assert cache.get(key) is None
+    cache.put(key, b"converted")
+    assert cache.get(key) == b"converted"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_process_ebook_reuses_cached_entries(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    pages = {"page1.xhtml": PAGE_1, "page2.xhtml": PAGE_2}
+
+    first = _convert(pages, cache)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # Poison one cached entry to prove the second run reads it from the cache.
+    cache.put(cache.key(PAGE_1), b"from cache")
+    second = _convert(pages, cache)
+
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert second["page1.xhtml"] == b"from cache"
+    assert second["page2.xhtml"] == first["page2.xhtml"]
+
+
+def test_process_ebook_converts_only_changed_entries(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    _convert({"page1.xhtml": PAGE_1, "page2.xhtml": PAGE_2}, cache)
+
+    cache.hits = cache.misses = 0
+    revised = "<html><body><p>漢字三</p></body></html>".encode()
+    progress_calls: list[tuple[int, int]] = []
+    result = _convert(
+        {"page1.xhtml": PAGE_1, "page2.xhtml": revised},
+        cache,
+        progress_callback=lambda done, total: progress_calls.append((done, total)),
+    )
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert b"<ruby>" in result["page2.xhtml"]
+    assert progress_calls[0] == (0, 2)
+    assert progress_calls[-1] == (2, 2)
+
+
+def test_package_version_is_the_only_version():
+    # The version is part of every cache key; pyproject must not pin its own.
+    with open(Path(__file__).parent.parent / "pyproject.toml", "rb") as f:
+        pyproject = tomllib.load(f)
+
+    assert "version" not in pyproject["project"]
+    assert "version" in pyproject["project"]["dynamic"]
+    assert pyproject["tool"]["hatch"]["version"]["path"] == "yomigana_ebook/__init__.py"
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock, Timer
+from time import monotonic, sleep
+
+import pytest
+
+from yomigana_ebook import process_ebook as process_ebook_module
+
+from yomigana_ebook.cancellation import (
+    CancelToken,
+    ConversionCancelled,
+    DeadlineExceeded,
+    check_cancelled,
+    poll_timeout,
+)
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import create_executor, process_ebook
+from tests.helpers import make_ebook, numbered_pages
+
+
+def test_check_cancelled():
+    token = CancelToken()
+    check_cancelled(token, monotonic() + 60)
+
+    token.cancel("stopped by the user")
+    with pytest.raises(ConversionCancelled, match="stopped by the user"):
+        check_cancelled(token, None)
+    with pytest.raises(DeadlineExceeded):
+        check_cancelled(None, monotonic())
+
+
+def test_poll_timeout():
+    assert poll_timeout(None, None) is None
+    assert poll_timeout(CancelToken(), None) > 0
+    assert poll_timeout(None, monotonic() - 1) == 0
+
+
+@pytest.mark.parametrize("pool", ["process", "thread", "shared"])
+def test_process_ebook_stops_when_cancelled(pool):
+    token = CancelToken()
+    writer = BytesIO()
+    writer.write(b"kept")
+    progress = []
+
+    def on_progress(done: int, total: int):
+        progress.append(done)
+        if done == 2:
+            token.cancel()
+
+    with ThreadPoolExecutor(1) as executor:
+        with pytest.raises(ConversionCancelled):
+            process_ebook(
+                make_ebook(numbered_pages(20)),
+                writer,
+                progress_callback=on_progress,
+                executor=executor if pool == "shared" else None,
+                options=ConversionOptions(
+                    backend="auto" if pool == "shared" else pool, max_in_flight=1
+                ),
+                cancel_token=token,
+            )
+
+    assert max(progress) < 20
+    # The partial archive was cut off again.
+    assert writer.getvalue() == b"kept"
+
+
+def test_process_ebook_stops_at_deadline():
+    with pytest.raises(DeadlineExceeded):
+        process_ebook(make_ebook(numbered_pages(2)), BytesIO(), deadline=monotonic())
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    """Thread pool that records how many tasks it held at once."""
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers)
+        self._count_lock = Lock()
+        self.in_flight = self.peak_in_flight = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._count_lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._count_lock:
+            self.in_flight -= 1
+
+
+def test_shared_executor_holds_twice_its_workers_by_default():
+    with _CountingExecutor(2) as executor:
+        process_ebook(make_ebook(numbered_pages(20)), BytesIO(), executor=executor)
+
+    assert 0 < executor.peak_in_flight <= 4
+
+
+def _stuck(file: str, content: bytes, **kwargs):
+    sleep(60)
+
+
+def _pid_after(seconds: float) -> int:
+    sleep(seconds)
+    return os.getpid()
+
+
+def test_cancelling_stops_running_entries_on_a_shared_pool(monkeypatch):
+    monkeypatch.setattr(process_ebook_module, "convert_html", _stuck)
+    token = CancelToken()
+
+    with create_executor(2, stoppable=True) as executor:
+        # Another book's entry, which keeps its worker.
+        other = executor.submit(sleep, 3)
+        Timer(1, token.cancel).start()
+        start = monotonic()
+        with pytest.raises(ConversionCancelled):
+            process_ebook(
+                make_ebook(numbered_pages(10)),
+                BytesIO(),
+                executor=executor,
+                cancel_token=token,
+            )
+
+        assert monotonic() - start < 5
+        assert other.result() is None
+        # Both workers are free again for the next book.
+        pids = [executor.submit(_pid_after, 0.5) for _ in range(2)]
+        assert len({pid.result(timeout=10) for pid in pids}) == 2
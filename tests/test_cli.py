@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+from zipfile import ZipFile
+
+import pytest
+
+from yomigana_ebook import cli
+from yomigana_ebook.cli import process_ebooks, run_queue_workers
+from yomigana_ebook.governor import Governor
+from yomigana_ebook.options import ConversionOptions
+from tests.helpers import make_ebook, page
+
+# No kana: the filter takes this paragraph for Chinese and leaves it bare.
+PAGES = {"page.xhtml": page("漢字")}
+
+
+def _convert(tmp_path, *args, **kwargs) -> str:
+    book = tmp_path / "book.epub"
+    book.write_bytes(make_ebook(PAGES).getvalue())
+    process_ebooks([str(book)], *args, **kwargs)
+    with ZipFile(tmp_path / "with-yomigana_book.epub") as zip_reader:
+        return zip_reader.read("page.xhtml").decode()
+
+
+def test_process_ebooks_accepts_filter_positionally(tmp_path):
+    assert "<ruby>" in _convert(tmp_path)
+    assert "<ruby>" not in _convert(tmp_path, True)
+
+
+def test_process_ebooks_takes_options(tmp_path):
+    options = ConversionOptions(filter_non_japanese=True)
+
+    assert "<ruby>" not in _convert(tmp_path, options=options)
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "nice") or multiprocessing.get_start_method() != "fork",
+    reason="needs os.nice, and fork to keep the patched worker loop",
+)
+def test_queue_workers_run_at_the_governor_priority(tmp_path, monkeypatch):
+    def run_worker(queue):
+        (tmp_path / f"{os.getpid()}.nice").write_text(str(os.nice(0)))
+
+    monkeypatch.setattr(cli, "run_worker", run_worker)
+    run_queue_workers(str(tmp_path / "queue.sqlite"), 2, Governor(nice=5))
+
+    niceness = [int(file.read_text()) for file in tmp_path.glob("*.nice")]
+    assert niceness == [os.nice(0) + 5] * 2
@@ -0,0 +1,155 @@
+import json
+import os
+import pickle
+import sqlite3
+from io import BytesIO
+from multiprocessing import Process
+
+import pytest
+
+from yomigana_ebook import distributed as distributed_module
+from yomigana_ebook.distributed import (
+    MAX_ATTEMPTS,
+    QueueExecutor,
+    TaskQueue,
+    run_worker,
+)
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import convert_html, process_ebook
+from tests.helpers import make_ebook, read_entries
+
+PAGE = "<html><body>" + "<p>漢字を読む</p>" * 20 + "</body></html>"
+PAGES = {f"{index}.xhtml": PAGE.replace("読む", f"読む{index}") for index in range(6)}
+
+
+def _start_workers(queue: TaskQueue, count: int) -> list[Process]:
+    workers = [
+        Process(target=run_worker, args=(queue,), kwargs={"log": None})
+        for _ in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def test_workers_convert_the_entries_of_an_ebook(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"))
+    workers = _start_workers(queue, 3)
+    try:
+        local = BytesIO()
+        process_ebook(
+            make_ebook(PAGES, mimetype=True),
+            local,
+            options=ConversionOptions(backend="thread"),
+        )
+        distributed = BytesIO()
+        with QueueExecutor(queue, poll_interval=0.01) as executor:
+            report = process_ebook(
+                make_ebook(PAGES, mimetype=True), distributed, executor=executor
+            )
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+    assert read_entries(distributed) == read_entries(local)
+    assert report.converted_entries == 6
+    assert report.worker_peak_rss
+    assert os.getpid() not in report.worker_peak_rss
+    assert queue.counts() == {}
+
+
+def test_errors_are_raised_in_the_coordinator(tmp_path, monkeypatch):
+    def broken_convert_html(*args, **kwargs):
+        raise ValueError("broken")
+
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"))
+    with QueueExecutor(queue, poll_interval=0.01) as executor:
+        future = executor.submit(convert_html, "a.xhtml", PAGE.encode())
+        monkeypatch.setattr(distributed_module, "convert_html", broken_convert_html)
+        assert run_worker(queue, max_tasks=1, log=None) == 1
+
+        with pytest.raises(RuntimeError, match="a.xhtml: ValueError: broken"):
+            future.result(timeout=10)
+
+
+def test_only_html_entries_are_queued(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"))
+    with QueueExecutor(queue) as executor:
+        with pytest.raises(TypeError):
+            executor.submit(os.system, "true")
+        with pytest.raises(TypeError):
+            executor.submit(convert_html, "a.xhtml", b"", profile=os.system)
+
+    assert queue.counts() == {}
+
+
+class _Exploit:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+
+def test_workers_do_not_unpickle_tasks(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"))
+    marker = str(tmp_path / "unpickled")
+    payload = pickle.dumps(_Exploit(marker))
+    with sqlite3.connect(queue.db_path) as connection:
+        task_id = connection.execute(
+            "INSERT INTO tasks (entry, content, options) VALUES (?, ?, ?)",
+            ("a.xhtml", payload, payload),
+        ).lastrowid
+
+    assert run_worker(queue, max_tasks=1, log=None) == 1
+
+    assert not os.path.exists(marker)
+    [(_, _, content, result)] = queue.take_results([task_id])
+    assert content is None
+    assert json.loads(result)["error"].startswith("UnicodeDecodeError")
+
+
+def test_queues_of_pickled_tasks_are_refused(tmp_path):
+    db_path = str(tmp_path / "queue.sqlite")
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, payload BLOB)")
+
+    with pytest.raises(ValueError):
+        TaskQueue(db_path)
+
+
+def test_results_are_plain_data(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"))
+    with QueueExecutor(queue, poll_interval=0.01) as executor:
+        future = executor.submit(
+            convert_html, "a.xhtml", PAGE.encode(), collect_words=True
+        )
+        run_worker(queue, max_tasks=1, log=None)
+        entry = future.result(timeout=10)
+
+    local = convert_html("a.xhtml", PAGE.encode(), collect_words=True)
+    assert entry.content == local.content
+    assert entry.chars == local.chars
+    assert entry.words == local.words
+    assert entry.fallback is None
+
+
+def test_cancelled_tasks_leave_the_queue(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"))
+    with QueueExecutor(queue) as executor:
+        future = executor.submit(convert_html, "a.xhtml", PAGE.encode())
+        assert queue.counts() == {"pending": 1}
+
+        assert future.cancel()
+        assert queue.counts() == {}
+
+
+def test_task_of_a_lost_worker_is_handed_out_again(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"), lease=0)
+    task_id = queue.put("a.xhtml", b"html", "{}")
+
+    for attempt in range(MAX_ATTEMPTS):
+        assert queue.claim(f"worker-{attempt}") == (task_id, "a.xhtml", b"html", "{}")
+    # Too many workers lost it: the task fails instead.
+    assert queue.claim("worker-last") is None
+    assert queue.counts() == {"failed": 1}
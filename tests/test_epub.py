@@ -0,0 +1,80 @@
+from io import BytesIO
+from zipfile import ZipFile
+
+from yomigana_ebook.epub import spine_order
+from yomigana_ebook.process_ebook import process_ebook
+from tests.helpers import make_ebook
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>"""
+
+PACKAGE = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="c1" href="text/chapter%201.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/chapter2.xhtml" media-type="application/xhtml+xml"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+  </manifest>
+  <spine>
+    <itemref idref="c2"/>
+    <itemref idref="c1"/>
+  </spine>
+</package>"""
+
+PAGE = "<html><body><p>漢字</p></body></html>"
+
+
+class NonSeekableWriter:
+    def __init__(self):
+        self.buffer = BytesIO()
+
+    def write(self, data: bytes) -> int:
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def _make_epub(with_package: bool = True) -> BytesIO:
+    pages = {}
+    if with_package:
+        pages["META-INF/container.xml"] = CONTAINER
+        pages["OEBPS/content.opf"] = PACKAGE
+    pages["OEBPS/nav.xhtml"] = PAGE
+    pages["OEBPS/text/chapter 1.xhtml"] = PAGE
+    pages["OEBPS/text/chapter2.xhtml"] = PAGE
+    pages["OEBPS/style.css"] = "p {}"
+    return make_ebook(pages, mimetype=True)
+
+
+def test_spine_order_resolves_manifest_hrefs():
+    with ZipFile(_make_epub()) as zip_reader:
+        assert spine_order(zip_reader) == [
+            "OEBPS/text/chapter2.xhtml",
+            "OEBPS/text/chapter 1.xhtml",
+        ]
+
+
+def test_spine_order_without_package_document():
+    with ZipFile(_make_epub(with_package=False)) as zip_reader:
+        assert spine_order(zip_reader) == []
+
+
+def test_process_ebook_streams_spine_order_to_non_seekable_writer():
+    writer = NonSeekableWriter()
+    process_ebook(_make_epub(), writer)
+
+    with ZipFile(BytesIO(writer.buffer.getvalue())) as zip_reader:
+        assert zip_reader.testzip() is None
+        html_files = [name for name in zip_reader.namelist() if name.endswith("html")]
+        # Spine documents first, the rest in archive order.
+        assert html_files == [
+            "OEBPS/text/chapter2.xhtml",
+            "OEBPS/text/chapter 1.xhtml",
+            "OEBPS/nav.xhtml",
+        ]
+        assert b"<rt>" in zip_reader.read("OEBPS/text/chapter 1.xhtml")
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from yomigana_ebook import process_ebook as process_ebook_module
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import (
+    AUTO_THREAD_MAX_BYTES,
+    choose_backend,
+    convert_html,
+    create_executor,
+    process_ebook,
+    start_workers,
+)
+from tests.helpers import make_ebook, numbered_pages, read_entries
+
+
+def test_start_workers_starts_every_worker():
+    # Stoppable like the desktop app's pool, which reports the worker pids.
+    with create_executor(2, stoppable=True) as executor:
+        start_workers(executor)
+
+        assert len(executor.pids()) == 2
+
+
+def test_thread_backend_converts_like_process_backend():
+    outputs = {}
+    for backend in ("process", "thread"):
+        writer = BytesIO()
+        report = process_ebook(
+            make_ebook(numbered_pages(4)),
+            writer,
+            options=ConversionOptions(backend=backend),
+        )
+        outputs[backend] = read_entries(writer)
+        assert report.morphemes > 0
+
+    assert outputs["thread"] == outputs["process"]
+
+
+def test_morphemes_are_counted_per_thread():
+    pages = [f"<p>漢字{index}を読む</p>".encode() for index in range(8)]
+    expected = sum(convert_html("page.xhtml", page).morphemes for page in pages)
+
+    with ThreadPoolExecutor(4) as executor:
+        entries = list(
+            executor.map(lambda page: convert_html("page.xhtml", page), pages)
+        )
+
+    assert sum(entry.morphemes for entry in entries) == expected
+
+
+def test_process_backend_is_the_default():
+    # Threads are opt-in: MeCab holds the GIL.
+    report = process_ebook(make_ebook(numbered_pages(2)), BytesIO())
+
+    assert report.worker_peak_rss
+    assert os.getpid() not in report.worker_peak_rss
+
+
+def test_choose_backend_by_book_size(monkeypatch):
+    monkeypatch.setattr(process_ebook_module.os, "cpu_count", lambda: 8)
+
+    assert choose_backend(10 * 1024) == "thread"
+    assert choose_backend(AUTO_THREAD_MAX_BYTES * 4) == "process"
+
+    monkeypatch.setattr(process_ebook_module.os, "cpu_count", lambda: 1)
+    assert choose_backend(AUTO_THREAD_MAX_BYTES * 4) == "thread"
@@ -0,0 +1,53 @@
+import os
+from io import BytesIO
+
+import pytest
+
+from yomigana_ebook import governor as governor_module
+from yomigana_ebook.governor import Governor
+from yomigana_ebook.process_ebook import create_executor, process_ebook
+from tests.helpers import make_ebook, numbered_pages
+
+
+def test_governor_hands_out_limited_slots():
+    governor = Governor(max_workers=1)
+
+    assert governor.acquire(timeout=0)
+    assert not governor.acquire(timeout=0)
+    governor.release()
+    assert governor.acquire(timeout=0)
+
+
+def test_governor_adapts_to_load_average(monkeypatch):
+    monkeypatch.setattr(governor_module.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(governor_module.os, "getloadavg", lambda: (6.2, 0, 0))
+    governor = Governor(max_workers=8, adaptive=True)
+
+    # Two CPUs are left by the other programs.
+    assert governor.worker_limit() == 2
+
+
+def test_background_governor_uses_half_of_the_cpus(monkeypatch):
+    monkeypatch.setattr(governor_module.os, "cpu_count", lambda: 8)
+
+    governor = Governor.background()
+
+    assert governor.max_workers == 4
+    assert governor.nice > 0 and governor.idle_io
+
+
+@pytest.mark.skipif(not hasattr(os, "nice"), reason="needs os.nice")
+def test_governed_workers_run_at_lower_priority():
+    with create_executor(4, governor=Governor(max_workers=1, nice=5)) as executor:
+        assert executor._max_workers == 1
+        assert executor.submit(os.nice, 0).result() == os.nice(0) + 5
+
+
+def test_process_ebook_with_governor():
+    reader = make_ebook(numbered_pages(5))
+    governor = Governor(max_workers=1, nice=1)
+
+    report = process_ebook(reader, BytesIO(), governor=governor)
+
+    assert report.converted_entries == 5
+    assert governor.acquire(timeout=0)
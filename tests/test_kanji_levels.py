@@ -0,0 +1,94 @@
+from io import BytesIO
+
+import pytest
+
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.kanji_levels import KANJI_LEVELS, known_kanji
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import convert_html, process_ebook
+from yomigana_ebook.yomituki import MAX_MERGED_RUBY_BASE, merge_rubies, yomituki
+from tests.helpers import make_ebook, read_entries
+
+PAGE = "<html><body><p>第一部の日本語を勉強する</p></body></html>"
+PAGES = {"a.xhtml": PAGE, "b.xhtml": PAGE}
+
+
+def _html(ebook: BytesIO) -> str:
+    return read_entries(ebook)["a.xhtml"].decode()
+
+
+def test_levels_include_every_easier_level():
+    assert "一" in known_kanji("grade1")
+    assert "勉" not in known_kanji("grade1")
+    assert known_kanji("grade1") < known_kanji("grade2") < known_kanji("joyo")
+    assert known_kanji("n5") < known_kanji("n1")
+    assert len(known_kanji("grade6")) == 1026
+    assert len(known_kanji("joyo")) == 2136
+    assert KANJI_LEVELS[0] == "grade1"
+
+    with pytest.raises(ValueError):
+        known_kanji("grade7")
+
+
+def test_yomituki_leaves_known_words_bare():
+    annotated = "".join(yomituki("第一部の日本語を勉強する", "grade2"))
+
+    # 第 and 勉強 are taught later than grade 2.
+    assert "<ruby>第<rt>だい</rt></ruby>一<ruby>部" in annotated
+    assert "の日本語を" in annotated
+    assert "<ruby>勉強<rt>べんきょう</rt></ruby>" in annotated
+
+
+def test_merge_rubies_merges_adjacent_rubies_only():
+    merged = merge_rubies(
+        "<ruby>第<rt>だい</rt></ruby><ruby>一<rt>いち</rt></ruby>"
+        "<ruby>部<rt>ぶ</rt></ruby>の<ruby>本<rt>ほん</rt></ruby>"
+    )
+
+    assert (
+        merged == "<ruby>第一部<rt>だいいちぶ</rt></ruby>の<ruby>本<rt>ほん</rt></ruby>"
+    )
+
+
+def test_merge_rubies_keeps_merged_bases_short():
+    rubies = "".join(f"<ruby>{char}<rt>か</rt></ruby>" for char in "一二三四五六")
+
+    merged = merge_rubies(rubies)
+
+    assert merged.count("<ruby>") == 2
+    assert f"<ruby>{'一二三四五六'[:MAX_MERGED_RUBY_BASE]}<rt>" in merged
+
+
+def test_convert_html_reports_saved_bytes():
+    full = convert_html("a.xhtml", PAGE.encode())
+    compact = convert_html(
+        "a.xhtml", PAGE.encode(), kanji_level="n5", compact_ruby=True
+    )
+
+    assert full.ruby_bytes_saved == 0
+    assert compact.ruby_bytes_saved > 0
+    assert len(compact.content) < len(full.content)
+
+
+def test_process_ebook_reports_saved_bytes_and_keys_the_cache(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    full, compact = BytesIO(), BytesIO()
+    process_ebook(make_ebook(PAGES), full, cache=cache)
+
+    report = process_ebook(
+        make_ebook(PAGES),
+        compact,
+        cache=cache,
+        options=ConversionOptions(kanji_level="grade2", compact_ruby=True),
+    )
+
+    # Converted again instead of served from the full annotation's cache entries.
+    assert report.cached_entries == 0
+    assert report.ruby_bytes_saved > 0
+    assert "日本語" in _html(compact)
+    assert len(_html(compact)) < len(_html(full))
+
+
+def test_options_reject_unknown_levels():
+    with pytest.raises(ValueError):
+        ConversionOptions(kanji_level="n6")
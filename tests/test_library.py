@@ -0,0 +1,114 @@
+import json
+import os
+
+from yomigana_ebook.library import (
+    JOURNAL_SUFFIX,
+    MANIFEST_NAME,
+    LibraryManifest,
+    convert_library,
+    find_ebooks,
+)
+from tests.helpers import make_ebook, page, read_entries
+
+
+def _write_ebook(file_path, text: str):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(
+        make_ebook({"page.xhtml": page(text)}, mimetype=True).getvalue()
+    )
+
+
+def _make_library(root):
+    _write_ebook(root / "a.epub", "漢字一")
+    _write_ebook(root / "series" / "b.epub", "漢字二")
+    (root / "notes.txt").write_text("not an ebook")
+
+
+def test_find_ebooks_walks_recursively_and_excludes_output(tmp_path):
+    _make_library(tmp_path)
+    _write_ebook(tmp_path / "out" / "a.epub", "漢字")
+
+    assert find_ebooks(str(tmp_path), exclude_dir=str(tmp_path / "out")) == [
+        "a.epub",
+        os.path.join("series", "b.epub"),
+    ]
+
+
+def test_convert_library_mirrors_tree_and_writes_manifest(tmp_path):
+    library, output = tmp_path / "library", tmp_path / "output"
+    _make_library(library)
+
+    result = convert_library(str(library), str(output), log=lambda _: None)
+
+    assert sorted(result.converted) == ["a.epub", os.path.join("series", "b.epub")]
+    assert not result.failed
+    entries = read_entries((output / "series" / "b.epub").read_bytes())
+    assert b"<ruby>" in entries["page.xhtml"]
+
+    manifest = json.loads((output / MANIFEST_NAME).read_text(encoding="utf-8"))
+    record = manifest["books"]["a.epub"]
+    assert record["size"] == (library / "a.epub").stat().st_size
+    assert record["options"]["filter_non_japanese"] is False
+
+
+def test_convert_library_skips_current_books(tmp_path):
+    library, output = tmp_path / "library", tmp_path / "output"
+    _make_library(library)
+    convert_library(str(library), str(output), log=lambda _: None)
+
+    # Same content with a new mtime is still current; changed content is not.
+    os.utime(library / "a.epub", ns=(0, 10**9))
+    _write_ebook(library / "series" / "b.epub", "漢字三")
+
+    result = convert_library(str(library), str(output), log=lambda _: None)
+
+    assert result.skipped == ["a.epub"]
+    assert result.converted == [os.path.join("series", "b.epub")]
+
+
+def test_convert_library_resumes_books_without_output(tmp_path):
+    library, output = tmp_path / "library", tmp_path / "output"
+    _make_library(library)
+    convert_library(str(library), str(output), log=lambda _: None)
+
+    (output / "a.epub").unlink()
+    result = convert_library(str(library), str(output), log=lambda _: None)
+
+    assert result.converted == ["a.epub"]
+    assert result.skipped == [os.path.join("series", "b.epub")]
+
+
+def test_convert_library_reconverts_when_options_change(tmp_path):
+    library, output = tmp_path / "library", tmp_path / "output"
+    _make_library(library)
+    convert_library(str(library), str(output), log=lambda _: None)
+
+    result = convert_library(
+        str(library), str(output), filter_non_japanese=True, log=lambda _: None
+    )
+
+    assert len(result.converted) == 2
+
+
+def test_manifest_journal_survives_a_crash(tmp_path):
+    book = tmp_path / "a.epub"
+    _write_ebook(book, "漢字")
+    manifest_path = str(tmp_path / MANIFEST_NAME)
+    manifest = LibraryManifest(manifest_path)
+    manifest.record("a.epub", str(book), "hash-a", {"option": 1})
+    manifest.record("b.epub", str(book), "hash-b", {"option": 1})
+
+    # Recording appends to the journal; the manifest itself is not rewritten.
+    assert not (tmp_path / MANIFEST_NAME).exists()
+    # A crash while writing the next record leaves a partial line behind.
+    with open(manifest_path + JOURNAL_SUFFIX, "a", encoding="utf-8") as f:
+        f.write('{"book": "c.epub", "rec')
+
+    resumed = LibraryManifest(manifest_path)
+    assert resumed.books["a.epub"]["sha256"] == "hash-a"
+    assert resumed.books["b.epub"]["sha256"] == "hash-b"
+    assert "c.epub" not in resumed.books
+
+    resumed.compact()
+    assert not (tmp_path / (MANIFEST_NAME + JOURNAL_SUFFIX)).exists()
+    assert LibraryManifest(manifest_path).books == resumed.books
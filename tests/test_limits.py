@@ -0,0 +1,168 @@
+import signal
+import sys
+import time
+from io import BytesIO
+
+import pytest
+
+from yomigana_ebook import process_ebook as process_ebook_module
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.limits import entry_limits
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import (
+    annotate_html_lean,
+    convert_html,
+    create_executor,
+    process_ebook,
+)
+from tests.helpers import make_ebook, read_entries
+
+PAGE = (
+    "<html><head><title>漢字</title><style>p { color: red }</style></head><body>"
+    "<p>漢字を読む<br/><ruby>本<rt>ほん</rt></ruby>と日本</p>"
+    "<script>var text = '漢字';</script></body></html>"
+)
+
+
+def test_lean_mode_annotates_like_the_tree():
+    lean, chars = annotate_html_lean(PAGE.encode())
+
+    assert lean == convert_html("page.xhtml", PAGE.encode()).content
+    assert chars == len("漢字") + len("漢字を読む") + len("と日本")
+
+
+def test_lean_mode_keeps_markup_it_does_not_annotate():
+    page = '<?xml version="1.0"?><!-- 漢字 --><p title="漢字">漢字&amp;かな</p>'
+
+    lean, _ = annotate_html_lean(page.encode())
+
+    assert lean.decode().startswith(
+        '<?xml version="1.0"?><!-- 漢字 --><p title="漢字">'
+    )
+    assert "&amp;" in lean.decode()
+    assert "<rt>かんじ</rt>" in lean.decode()
+
+
+def test_entry_over_memory_limit_is_converted_in_low_memory_mode():
+    entry = convert_html("page.xhtml", PAGE.encode(), memory_limit=len(PAGE))
+
+    assert entry.fallback == "low-memory"
+    assert entry.fallback_reason == "memory limit"
+    assert b"<rt>" in entry.content
+
+
+def test_entry_that_fails_to_parse_is_converted_in_low_memory_mode(monkeypatch):
+    def broken_parser(*args, **kwargs):
+        raise RecursionError("maximum recursion depth exceeded")
+
+    monkeypatch.setattr(process_ebook_module, "BeautifulSoup", broken_parser)
+
+    entry = convert_html("page.xhtml", PAGE.encode())
+
+    assert entry.fallback == "low-memory"
+    assert entry.fallback_reason.startswith("RecursionError")
+    assert b"<rt>" in entry.content
+
+
+def test_entry_over_time_limit_is_copied_through():
+    entry = convert_html("page.xhtml", PAGE.encode(), time_limit=0)
+
+    assert entry.fallback == "passthrough"
+    assert entry.fallback_reason == "time limit"
+    assert entry.content == PAGE.encode()
+    assert entry.chars == 0
+
+
+def test_retry_shares_the_time_limit(monkeypatch):
+    def slow_broken_parser(*args, **kwargs):
+        time.sleep(0.3)
+        raise RecursionError("maximum recursion depth exceeded")
+
+    monkeypatch.setattr(process_ebook_module, "BeautifulSoup", slow_broken_parser)
+
+    entry = convert_html("page.xhtml", PAGE.encode(), time_limit=0.2)
+
+    assert entry.fallback == "passthrough"
+    assert entry.fallback_reason == "time limit"
+
+
+@pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="needs SIGALRM")
+def test_worker_stops_inside_a_huge_text_node():
+    # A single text node that takes seconds to annotate.
+    text = "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。" * 20000
+    page = f"<html><body><p>{text}</p></body></html>".encode()
+
+    with create_executor(1) as executor:
+        executor.submit(len, "").result()
+        start = time.monotonic()
+        entry = executor.submit(convert_html, "page.xhtml", page, time_limit=0.2)
+        entry = entry.result()
+
+    assert time.monotonic() - start < 3
+    assert entry.fallback == "passthrough"
+    assert entry.fallback_reason == "time limit"
+
+
+def _stuck_in_c_code(file: str, content: bytes, **kwargs):
+    # Like a call into C code that never returns: the alarm cannot stop it.
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(60)
+
+
+@pytest.mark.skipif(not hasattr(signal, "pthread_sigmask"), reason="POSIX only")
+def test_parent_stops_workers_stuck_past_the_time_limit(monkeypatch):
+    monkeypatch.setattr(process_ebook_module, "convert_html", _stuck_in_c_code)
+    monkeypatch.setattr(process_ebook_module, "ENTRY_KILL_GRACE", 0.2)
+    writer = BytesIO()
+
+    start = time.monotonic()
+    report = process_ebook(
+        make_ebook({"a.xhtml": PAGE, "b.xhtml": PAGE}),
+        writer,
+        options=ConversionOptions(entry_time_limit=0.2),
+    )
+
+    assert time.monotonic() - start < 10
+    assert report.passthrough_entries == {
+        "a.xhtml": "time limit",
+        "b.xhtml": "time limit",
+    }
+    assert read_entries(writer) == {"a.xhtml": PAGE.encode(), "b.xhtml": PAGE.encode()}
+
+
+def test_process_ebook_reports_fallbacks_and_does_not_cache_passthroughs(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    writer = BytesIO()
+
+    report = process_ebook(
+        make_ebook({"a.xhtml": PAGE, "b.xhtml": PAGE}),
+        writer,
+        cache=cache,
+        options=ConversionOptions(entry_time_limit=0),
+    )
+
+    assert set(report.passthrough_entries) == {"a.xhtml", "b.xhtml"}
+    assert report.passthrough_entries["a.xhtml"] == "time limit"
+    assert read_entries(writer)["a.xhtml"] == PAGE.encode()
+
+    report = process_ebook(make_ebook({"a.xhtml": PAGE}), BytesIO(), cache=cache)
+    assert report.cached_entries == 0
+    assert not report.passthrough_entries
+
+
+def _allocate(megabytes: int) -> bool:
+    try:
+        with entry_limits(None, 64 * 1024 * 1024):
+            bytearray(megabytes * 1024 * 1024)
+    except MemoryError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="RLIMIT_DATA is Linux only")
+def test_worker_processes_enforce_the_memory_limit():
+    with create_executor(1) as executor:
+        assert executor.submit(_allocate, 16).result()
+        assert not executor.submit(_allocate, 256).result()
+        # The limit is lifted again after the entry.
+        assert executor.submit(bytearray, 256 * 1024 * 1024).result()
@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from yomigana_ebook.limits import estimated_tree_bytes
+from yomigana_ebook.memory import HeldBytes, peak_rss, traced_peak
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import convert_html, process_ebook
+from tests.helpers import make_ebook
+
+PAGE = "<html><body>" + "<p>漢字を読む</p>" * 200 + "</body></html>"
+PAGES = dict.fromkeys(["0.xhtml", "1.xhtml", "2.xhtml", "3.xhtml"], PAGE)
+
+
+def test_held_bytes_tracks_peaks_per_kind_and_in_total():
+    held = HeldBytes()
+    held.add("in_flight", 10)
+    held.add("write_buffer", 5)
+    held.remove("in_flight", 10)
+    held.add("in_flight", 3)
+
+    assert held.current == {"in_flight": 3, "write_buffer": 5}
+    assert held.peak == {"in_flight": 10, "write_buffer": 5, "total": 15}
+
+
+def test_traced_peak_measures_the_block():
+    peaks: dict[str, int] = {}
+    with traced_peak(peaks, "annotate"):
+        data = bytearray(4 * 1024 * 1024)
+        del data
+
+    assert peaks["annotate"] >= 4 * 1024 * 1024
+    assert peak_rss() > 0
+
+
+def test_convert_html_reports_worker_memory():
+    entry = convert_html("page.xhtml", PAGE.encode(), trace_memory=True)
+
+    assert entry.worker_pid == os.getpid()
+    assert entry.worker_peak_rss > 0
+    assert entry.stage_peak_bytes is not None
+    assert set(entry.stage_peak_bytes) == {"parse", "annotate", "serialize"}
+    assert convert_html("page.xhtml", PAGE.encode()).stage_peak_bytes is None
+
+
+def test_process_ebook_reports_peak_memory():
+    report = process_ebook(
+        make_ebook(PAGES), BytesIO(), options=ConversionOptions(backend="process")
+    )
+
+    assert report.peak_rss > 0
+    assert report.worker_peak_rss
+    assert all(pid != os.getpid() for pid in report.worker_peak_rss)
+    assert report.held_peak_bytes["html_files"] == 4 * len(PAGE.encode())
+    assert report.held_peak_bytes["total"] >= report.held_peak_bytes["in_flight"]
+    assert "peak RSS" in report.memory_summary()
+
+
+def test_memory_budget_keeps_fewer_entries_in_flight():
+    unlimited = process_ebook(
+        make_ebook(PAGES), BytesIO(), options=ConversionOptions(backend="thread")
+    )
+    budgeted = process_ebook(
+        make_ebook(PAGES),
+        BytesIO(),
+        options=ConversionOptions(backend="thread", memory_budget=1),
+    )
+
+    assert unlimited.held_peak_bytes["in_flight"] == 4 * len(PAGE.encode())
+    # A single entry is always let through, however small the budget.
+    assert budgeted.held_peak_bytes["in_flight"] == len(PAGE.encode())
+    assert budgeted.converted_entries == 4
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Records how many entries are in flight as each one is submitted."""
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers)
+        self.in_flight = 0
+        self.in_flight_at_submit: list[int] = []
+        self.lock = Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.in_flight_at_submit.append(self.in_flight)
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def test_memory_budget_keeps_throughput_through_the_book():
+    pages = {f"{index}.xhtml": PAGE for index in range(12)}
+    # Room for a few entries, far less than the book read ahead.
+    budget = 3 * estimated_tree_bytes(len(PAGE.encode()))
+
+    with CountingExecutor(4) as executor:
+        report = process_ebook(
+            make_ebook(pages),
+            BytesIO(),
+            options=ConversionOptions(memory_budget=budget),
+            executor=executor,
+        )
+
+    counts = executor.in_flight_at_submit
+    first_half, second_half = counts[: len(counts) // 2], counts[len(counts) // 2 :]
+    assert report.converted_entries == 12
+    assert max(first_half) > 1
+    assert max(second_half) >= max(first_half)
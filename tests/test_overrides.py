@@ -0,0 +1,105 @@
+from random import Random
+
+import pytest
+
+from yomigana_ebook.overrides import ReadingOverrides
+from yomigana_ebook.yomituki import (
+    dictionary_identity,
+    set_reading_overrides,
+    yomituki,
+)
+
+
+def _naive_find(readings: dict[str, str], text: str):
+    matches = []
+    position = 0
+    while position < len(text):
+        surfaces = [s for s in readings if text.startswith(s, position)]
+        if surfaces:
+            surface = max(surfaces, key=len)
+            matches.append((position, position + len(surface)))
+            position += len(surface)
+        else:
+            position += 1
+    return matches
+
+
+def test_find_prefers_leftmost_longest_matches():
+    overrides = ReadingOverrides(
+        {
+            "魔法": "まほう",
+            "魔法科": "まほうか",
+            "法科高校": "ほうかこうこう",
+            "高校": "こうこう",
+        }
+    )
+
+    matches = overrides.find("魔法科高校の劣等生")
+
+    assert matches == [(0, 3, "マホウカ"), (3, 5, "コウコウ")]
+
+
+def test_find_matches_naive_scan_on_many_entries():
+    rng = Random(0)
+    alphabet = "漢字読書本日月火水"
+    readings = {
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))): "よみ"
+        for _ in range(3_000)
+    }
+    overrides = ReadingOverrides(readings)
+    text = "".join(rng.choice(alphabet + "のをに") for _ in range(5_000))
+
+    found = [(start, end) for start, end, _ in overrides.find(text)]
+
+    assert found == _naive_find(readings, text)
+
+
+def test_from_tsv(tmp_path):
+    tsv = tmp_path / "readings.tsv"
+    tsv.write_text("# names\n八幡\tはちまん\n\n雪ノ下\tユキノシタ # comment\n", "utf-8")
+
+    overrides = ReadingOverrides.from_tsv(str(tsv))
+
+    assert overrides.readings == {"八幡": "ハチマン", "雪ノ下": "ユキノシタ"}
+
+    tsv.write_text("八幡 はちまん\n", "utf-8")
+    with pytest.raises(ValueError, match=":1:"):
+        ReadingOverrides.from_tsv(str(tsv))
+
+
+def test_yomituki_applies_overrides():
+    identity = dictionary_identity()
+    set_reading_overrides(
+        ReadingOverrides({"八幡": "はちまん", "雪ノ下": "ゆきのした"})
+    )
+    try:
+        annotated = "".join(yomituki("八幡と雪ノ下が話す"))
+        assert dictionary_identity() != identity
+    finally:
+        set_reading_overrides(None)
+
+    assert annotated.startswith("<ruby>八幡<rt>はちまん</rt></ruby>と")
+    assert "<ruby>雪ノ下<rt>ゆきのした</rt></ruby>が" in annotated
+    assert dictionary_identity() == identity
+
+
+def test_find_only_at_boundaries():
+    overrides = ReadingOverrides({"光": "ひかる", "光景": "けしき"})
+
+    assert overrides.find("光景", starts={0, 1}, ends={1}) == [(0, 1, "ヒカル")]
+    assert overrides.find("光景", starts={0}, ends={2}) == [(0, 2, "ケシキ")]
+    assert overrides.find("光景", starts={0}, ends={1}) == [(0, 1, "ヒカル")]
+    assert overrides.find("光景", starts={1}, ends={2}) == []
+
+
+def test_overrides_do_not_rewrite_compounds_containing_them():
+    set_reading_overrides(ReadingOverrides({"光": "ひかる"}))
+    try:
+        name = "".join(yomituki("光が来た"))
+        compound = "".join(yomituki("光景を見た"))
+    finally:
+        set_reading_overrides(None)
+
+    assert name.startswith("<ruby>光<rt>ひかる</rt></ruby>が")
+    # 光景 is one morpheme, so it keeps its dictionary reading.
+    assert compound.startswith("<ruby>光景<rt>こうけい</rt></ruby>を")
@@ -0,0 +1,32 @@
+from io import BytesIO
+
+from yomigana_ebook.process_ebook import process_ebook
+from yomigana_ebook.profiling import MERGED_PROFILE_NAME, merge_profiles
+from tests.helpers import make_ebook, numbered_pages, page
+
+
+def test_process_ebook_writes_worker_profiles(tmp_path):
+    reader = make_ebook(numbered_pages(2))
+
+    process_ebook(reader, BytesIO(), profile_dir=str(tmp_path))
+
+    worker_profiles = list(tmp_path.glob("worker-*.pstats"))
+    assert worker_profiles
+
+    stats = merge_profiles(str(tmp_path))
+    assert stats is not None
+    assert (tmp_path / MERGED_PROFILE_NAME).is_file()
+    assert any(func[2] == "convert_html" for func in stats.stats)  # type: ignore
+
+
+def test_process_ebook_profiles_single_html_file_in_process(tmp_path):
+    reader = make_ebook({"page0.xhtml": page("漢字")})
+
+    process_ebook(reader, BytesIO(), profile_dir=str(tmp_path))
+
+    assert list(tmp_path.glob("main-*.pstats"))
+
+
+def test_merge_profiles_returns_none_without_profiles(tmp_path):
+    assert merge_profiles(str(tmp_path)) is None
+    assert merge_profiles(str(tmp_path / "missing")) is None
@@ -0,0 +1,116 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from yomigana_ebook import yomituki as yomituki_module
+from yomigana_ebook.process_ebook import convert_html, create_executor
+from yomigana_ebook.recycling import (
+    WORKER_MAX_RSS_ENV,
+    WORKER_MAX_TASKS_ENV,
+    RecyclingExecutor,
+    recycling_settings,
+)
+
+PAGE = b"<html><body><p>\xe6\xbc\xa2\xe5\xad\x97</p></body></html>"
+
+
+def _wait_for(condition, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def _worker_pids(executor, count):
+    return {executor.submit(os.getpid).result() for _ in range(count)}
+
+
+def test_recycling_settings_read_the_environment(monkeypatch):
+    monkeypatch.setenv(WORKER_MAX_TASKS_ENV, "100")
+    monkeypatch.setenv(WORKER_MAX_RSS_ENV, "512")
+
+    assert recycling_settings() == (100, 512 * 1024 * 1024)
+
+
+def test_create_executor_recycles_only_when_asked(monkeypatch):
+    monkeypatch.delenv(WORKER_MAX_TASKS_ENV, raising=False)
+    monkeypatch.delenv(WORKER_MAX_RSS_ENV, raising=False)
+    with create_executor(1) as executor:
+        assert type(executor) is ProcessPoolExecutor
+    with create_executor(1, stoppable=True) as executor:
+        assert isinstance(executor, RecyclingExecutor)
+        assert not executor.max_tasks_per_worker and not executor.max_worker_rss
+    monkeypatch.setenv(WORKER_MAX_TASKS_ENV, "100")
+    with create_executor(1) as executor:
+        assert isinstance(executor, RecyclingExecutor)
+    with create_executor(1, backend="thread", max_tasks_per_worker=1) as executor:
+        assert not isinstance(executor, RecyclingExecutor)
+
+
+def test_worker_is_replaced_after_max_tasks():
+    messages: list[str] = []
+    with create_executor(
+        1, max_tasks_per_worker=2, max_worker_rss=0, log=messages.append
+    ) as executor:
+        first = _worker_pids(executor, 2)
+        _wait_for(lambda: executor.recycles == 1)
+
+        assert _worker_pids(executor, 1).isdisjoint(first)
+        assert messages == [f"[info] recycled worker {first.pop()} (2 tasks)"]
+
+
+def test_worker_is_replaced_when_it_grows_too_large():
+    messages: list[str] = []
+    with create_executor(
+        1, max_tasks_per_worker=0, max_worker_rss=1, log=messages.append
+    ) as executor:
+        entry = executor.submit(convert_html, "page.xhtml", PAGE).result()
+        _wait_for(lambda: executor.recycles == 1)
+
+        assert entry.worker_pid not in _worker_pids(executor, 1)
+        assert messages[0].startswith(f"[info] recycled worker {entry.worker_pid} (")
+
+
+def test_recycling_replaces_one_worker_at_a_time():
+    with create_executor(2, max_tasks_per_worker=2, max_worker_rss=0) as executor:
+        # Each worker takes one of these, then the first worker a second task.
+        first, second = [executor.submit(time.sleep, 0.5) for _ in range(2)]
+        first.result(), second.result()
+        before = set(executor.pids())
+        executor.submit(os.getpid).result()
+        _wait_for(lambda: executor.recycles == 1)
+        _wait_for(lambda: len(executor.pids()) == 2)
+
+        # The other worker kept running.
+        assert len(before & set(executor.pids())) == 1
+
+
+def test_terminate_stops_only_the_given_tasks():
+    with create_executor(2, stoppable=True) as executor:
+        stuck = executor.submit(time.sleep, 60)
+        other = executor.submit(time.sleep, 0.5)
+        _wait_for(lambda: len(executor.pids()) == 2)
+
+        start = time.monotonic()
+        assert executor.terminate([stuck], TimeoutError("stuck")) == 1
+
+        with pytest.raises(TimeoutError):
+            stuck.result()
+        assert time.monotonic() - start < 10
+        assert other.result() is None
+        assert executor.submit(os.getpid).result() in executor.pids()
+
+
+def test_set_word_cache_size():
+    # Like benchmarks/micro.py, which keeps a reference from before the resize.
+    yomituki_word = yomituki_module.yomituki_word
+    try:
+        yomituki_module.set_word_cache_size(16)
+        "".join(yomituki_module.yomituki("漢字を読む"))
+
+        assert yomituki_word.cache_info().maxsize == 16
+        assert 0 < yomituki_word.cache_info().currsize <= 16
+    finally:
+        yomituki_module.set_word_cache_size(yomituki_module._word_cache_size)
@@ -0,0 +1,59 @@
+from io import BytesIO
+
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.process_ebook import convert_html, process_ebook
+from yomigana_ebook.report import STAGES
+from tests.helpers import make_ebook
+
+PAGE = "<html><body><p>漢字を読む</p><ruby>本<rt>ほん</rt></ruby></body></html>"
+ANNOTATED_PAGE = "<html><body><p><ruby>漢字<rt>かんじ</rt></ruby></p></body></html>"
+
+
+def test_convert_html_counts_annotated_text():
+    entry = convert_html("page.xhtml", PAGE.encode())
+
+    assert entry.file == "page.xhtml"
+    assert b"<rt>" in entry.content
+    # Text inside existing <ruby> elements is left alone.
+    assert entry.chars == len("漢字を読む")
+    assert entry.morphemes > 0
+    assert entry.morphemes == entry.tagger_cache_hits + entry.tagger_cache_misses
+    assert entry.parse_seconds >= 0 and entry.annotate_seconds > 0
+
+
+def test_process_ebook_returns_report():
+    report = process_ebook(
+        make_ebook(
+            {"a.xhtml": PAGE, "b.xhtml": PAGE, "c.xhtml": ANNOTATED_PAGE, "x.css": ""}
+        ),
+        BytesIO(),
+    )
+
+    assert report.converted_entries == 2
+    assert report.annotated_entries == 1
+    assert report.chars == 2 * len("漢字を読む")
+    assert set(report.stage_seconds) == set(STAGES)
+    assert report.worker_seconds > 0
+    assert report.wall_seconds > 0
+    assert report.to_dict()["tagger_cache_hit_rate"] == report.tagger_cache_hit_rate
+
+
+def test_process_ebook_report_counts_cached_entries(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    process_ebook(make_ebook({"a.xhtml": PAGE}), BytesIO(), cache=cache)
+
+    report = process_ebook(make_ebook({"a.xhtml": PAGE}), BytesIO(), cache=cache)
+
+    assert report.converted_entries == report.cached_entries == 1
+    assert report.chars == 0
+
+
+def test_process_ebook_report_marks_skipped_archives():
+    converted = BytesIO()
+    process_ebook(make_ebook({"a.xhtml": PAGE}), converted)
+    converted.seek(0)
+
+    report = process_ebook(converted, BytesIO())
+
+    assert report.skipped_archive
+    assert report.converted_entries == 0
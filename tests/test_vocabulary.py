@@ -0,0 +1,94 @@
+import json
+import sqlite3
+from io import BytesIO
+
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.library import convert_library
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import convert_html, process_ebook
+from yomigana_ebook.vocabulary import Vocabulary, vocabulary_path
+from tests.helpers import make_ebook
+
+PAGE = "<html><body><p>本を読んだ。東京で本を読む。</p></body></html>"
+OTHER_PAGE = "<html><body><p>大学の本</p></body></html>"
+
+
+def _counts(vocabulary: Vocabulary) -> dict[str, int]:
+    return {word["word"]: word["count"] for word in vocabulary.words()}
+
+
+def test_convert_html_counts_dictionary_forms_with_kanji():
+    entry = convert_html("page.xhtml", PAGE.encode(), collect_words=True)
+
+    assert entry.words is not None
+    assert entry.words[("本", "ホン")] == 2
+    # Inflected forms are counted by their dictionary form.
+    assert entry.words[("読む", "ヨム")] == 2
+    assert not any(word in ("を", "。") for word, _ in entry.words)
+    assert convert_html("page.xhtml", PAGE.encode()).words is None
+
+
+def test_process_ebook_merges_the_words_of_all_entries():
+    vocabulary = Vocabulary()
+
+    process_ebook(
+        make_ebook({"a.xhtml": PAGE, "b.xhtml": OTHER_PAGE, "c.xhtml": PAGE}),
+        BytesIO(),
+        options=ConversionOptions(backend="process"),
+        vocabulary=vocabulary,
+    )
+
+    counts = _counts(vocabulary)
+    assert counts["本"] == 5
+    assert counts["大学"] == 1
+    assert vocabulary.words()[0] == {"word": "本", "reading": "ほん", "count": 5}
+
+
+def test_cached_entries_keep_their_words(tmp_path):
+    cache = EntryCache(str(tmp_path))
+    process_ebook(make_ebook({"a.xhtml": PAGE}), BytesIO(), cache=cache)
+
+    # Cached without words: converted again to count them.
+    first = Vocabulary()
+    report = process_ebook(
+        make_ebook({"a.xhtml": PAGE}), BytesIO(), cache=cache, vocabulary=first
+    )
+    assert report.cached_entries == 0
+
+    second = Vocabulary()
+    report = process_ebook(
+        make_ebook({"a.xhtml": PAGE}), BytesIO(), cache=cache, vocabulary=second
+    )
+    assert report.cached_entries == 1
+    assert second.counts == first.counts
+
+
+def test_vocabulary_is_saved_as_json_and_sqlite(tmp_path):
+    vocabulary = Vocabulary()
+    vocabulary.update({("本", "ホン"): 3, ("大学", "ダイガク"): 1})
+
+    vocabulary.save(str(tmp_path / "book.words.json"))
+    vocabulary.save(str(tmp_path / "book.words.sqlite"))
+
+    with open(tmp_path / "book.words.json", encoding="utf-8") as f:
+        assert json.load(f)["words"] == vocabulary.words()
+    connection = sqlite3.connect(tmp_path / "book.words.sqlite")
+    rows = connection.execute("SELECT word, reading, count FROM words").fetchall()
+    connection.close()
+    assert sorted(rows) == [("大学", "だいがく", 1), ("本", "ほん", 3)]
+
+
+def test_library_writes_a_vocabulary_per_book(tmp_path):
+    input_dir = tmp_path / "books"
+    input_dir.mkdir()
+    (input_dir / "book.epub").write_bytes(make_ebook({"a.xhtml": PAGE}).getvalue())
+    output_dir = tmp_path / "out"
+
+    convert_library(
+        str(input_dir), str(output_dir), log=lambda _: None, vocabulary_format="json"
+    )
+
+    words_path = vocabulary_path(str(output_dir / "book.epub"), "json")
+    assert words_path.endswith("book.words.json")
+    with open(words_path, encoding="utf-8") as f:
+        assert {"word": "本", "reading": "ほん", "count": 2} in json.load(f)["words"]
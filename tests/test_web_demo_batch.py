@@ -0,0 +1,63 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from web_demo.batch import RESULTS_NAME, stream_batch
+from web_demo.jobs import JobManager, QueueFull
+from tests.helpers import make_ebook, page, read_entries
+
+
+def test_stream_batch_zips_finished_books():
+    async def scenario():
+        with ThreadPoolExecutor(2) as executor:
+            jobs = JobManager(max_workers=2, executor=executor)
+            await jobs.start()
+            try:
+                batch = await jobs.submit_batch(
+                    [
+                        (make_ebook({"page.xhtml": page("漢字")}), "book.epub"),
+                        (make_ebook({"page.xhtml": page("日本")}), "book.epub"),
+                        (BytesIO(b"not a zip"), "broken.epub"),
+                    ]
+                )
+                return b"".join([chunk async for chunk in stream_batch(batch)])
+            finally:
+                await jobs.shutdown()
+
+    archive = asyncio.run(scenario())
+
+    with ZipFile(BytesIO(archive)) as zip_reader:
+        assert sorted(zip_reader.namelist()) == [
+            RESULTS_NAME,
+            "with-yomigana_book (2).epub",
+            "with-yomigana_book.epub",
+        ]
+        book = read_entries(zip_reader.read("with-yomigana_book.epub"))
+        assert b"<ruby>" in book["page.xhtml"]
+
+        results = json.loads(zip_reader.read(RESULTS_NAME))
+        statuses = {result["filename"]: result["status"] for result in results}
+        assert statuses == {"book.epub": "succeeded", "broken.epub": "failed"}
+
+
+def test_submit_batch_admits_all_books_or_none():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(executor=executor, max_queued_jobs=2)
+            await jobs.submit(make_ebook({"page.xhtml": page("漢字")}), "queued.epub")
+            with pytest.raises(QueueFull):
+                await jobs.submit_batch(
+                    [
+                        (make_ebook({"page.xhtml": page("一")}), "a.epub"),
+                        (make_ebook({"page.xhtml": page("二")}), "b.epub"),
+                    ]
+                )
+            return jobs
+
+    jobs = asyncio.run(scenario())
+
+    assert [job.filename for job in jobs.queued_jobs()] == ["queued.epub"]
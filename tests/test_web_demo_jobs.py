@@ -0,0 +1,235 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import time
+from zipfile import ZipFile
+
+import pytest
+
+from web_demo.jobs import JobManager, JobStatus, QueueFull, UploadTooLarge
+from tests.helpers import make_ebook, numbered_pages, read_entries
+
+
+async def _read_output(job) -> bytes:
+    return b"".join([chunk async for chunk in job.iter_output(chunk_size=128)])
+
+
+def test_job_manager_converts_jobs_on_shared_executor():
+    async def scenario():
+        with ThreadPoolExecutor(2) as executor:
+            jobs = JobManager(max_workers=2, executor=executor)
+            await jobs.start()
+            try:
+                first = await jobs.submit(
+                    make_ebook(numbered_pages(2), mimetype=True), "first.epub"
+                )
+                second = await jobs.submit(
+                    make_ebook(numbered_pages(3), mimetype=True), "second.epub"
+                )
+                await asyncio.wait_for(first.finished.wait(), 30)
+                await asyncio.wait_for(second.finished.wait(), 30)
+                return first, second, await _read_output(second)
+            finally:
+                await jobs.shutdown()
+
+    first, second, output = asyncio.run(scenario())
+
+    assert first.status is JobStatus.SUCCEEDED
+    assert (second.done, second.total) == (3, 3)
+    assert b"<ruby>" in read_entries(output)["page2.xhtml"]
+
+
+def test_job_output_can_be_streamed_while_the_job_runs():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(max_workers=1, executor=executor)
+            job = await jobs.submit(
+                make_ebook(numbered_pages(20), mimetype=True), "book.epub"
+            )
+            # Start reading before the job has even started.
+            reader = asyncio.create_task(_read_output(job))
+            await asyncio.sleep(0)
+            await jobs.start()
+            try:
+                output = await asyncio.wait_for(reader, 30)
+                return job, output
+            finally:
+                await jobs.shutdown()
+
+    job, output = asyncio.run(scenario())
+
+    assert job.status is JobStatus.SUCCEEDED
+    assert len(output) == job.output_size
+    with ZipFile(BytesIO(output)) as zip_reader:
+        assert zip_reader.testzip() is None
+        assert b"<ruby>" in zip_reader.read("page19.xhtml")
+
+
+def test_job_manager_cancels_queued_job():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(max_workers=1, max_concurrent_jobs=1, executor=executor)
+            # Not started: submitted jobs stay queued.
+            job = await jobs.submit(
+                make_ebook(numbered_pages(2), mimetype=True), "book.epub"
+            )
+            position = jobs.queue_position(job)
+            jobs.cancel(job)
+            return job, position
+
+    job, position = asyncio.run(scenario())
+
+    assert position == 0
+    assert job.status is JobStatus.CANCELLED
+    assert job.finished.is_set()
+
+
+def test_job_manager_cancels_running_job():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(max_workers=1, executor=executor)
+            await jobs.start()
+            try:
+                job = await jobs.submit(
+                    make_ebook(numbered_pages(200), mimetype=True), "book.epub"
+                )
+                while not job.done:
+                    await asyncio.sleep(0.01)
+                jobs.cancel(job)
+                await asyncio.wait_for(job.finished.wait(), 30)
+                return job
+            finally:
+                await jobs.shutdown()
+
+    job = asyncio.run(scenario())
+
+    assert job.status is JobStatus.CANCELLED
+    assert job.done < job.total
+
+
+def test_job_manager_fails_jobs_running_past_the_timeout():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(max_workers=1, executor=executor, job_timeout=1e-9)
+            await jobs.start()
+            try:
+                job = await jobs.submit(
+                    make_ebook(numbered_pages(2), mimetype=True), "book.epub"
+                )
+                await asyncio.wait_for(job.finished.wait(), 30)
+                return job
+            finally:
+                await jobs.shutdown()
+
+    job = asyncio.run(scenario())
+
+    assert job.status is JobStatus.FAILED
+    assert "longer than" in job.error
+
+
+def test_job_manager_reports_failed_job():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(executor=executor)
+            await jobs.start()
+            try:
+                job = await jobs.submit(BytesIO(b"not a zip"), "broken.epub")
+                await asyncio.wait_for(job.finished.wait(), 30)
+                return job
+            finally:
+                await jobs.shutdown()
+
+    job = asyncio.run(scenario())
+
+    assert job.status is JobStatus.FAILED
+    assert job.error
+
+
+def test_job_manager_splits_workers_between_running_jobs():
+    with ThreadPoolExecutor(1) as executor:
+        jobs = JobManager(max_workers=8, max_concurrent_jobs=3, executor=executor)
+        assert jobs.max_in_flight == 3
+
+
+def test_job_manager_rejects_jobs_when_queue_is_full():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(executor=executor, max_queued_jobs=1)
+            await jobs.submit(
+                make_ebook(numbered_pages(2), mimetype=True), "queued.epub"
+            )
+            with pytest.raises(QueueFull) as exc_info:
+                await jobs.submit(
+                    make_ebook(numbered_pages(2), mimetype=True), "rejected.epub"
+                )
+            return jobs, exc_info.value
+
+    jobs, exc = asyncio.run(scenario())
+
+    assert exc.retry_after >= 1
+    assert len(jobs.jobs) == 1
+    assert jobs.stats()["queue_saturation"] == 1.0
+
+
+def test_job_manager_rejects_oversized_uploads():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(executor=executor, max_upload_size=10)
+            with pytest.raises(UploadTooLarge):
+                jobs.check_admission(content_length=11)
+            with pytest.raises(UploadTooLarge):
+                await jobs.submit(
+                    make_ebook(numbered_pages(2), mimetype=True), "big.epub"
+                )
+            return jobs
+
+    assert not asyncio.run(scenario()).jobs
+
+
+def test_job_manager_estimates_wait_from_queued_bytes():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(executor=executor, max_concurrent_jobs=2)
+            jobs.bytes_per_second = 100.0
+            await jobs.submit(BytesIO(b"x" * 400), "a.epub")
+            await jobs.submit(BytesIO(b"x" * 200), "b.epub")
+            return jobs
+
+    jobs = asyncio.run(scenario())
+
+    assert jobs.estimated_wait() == pytest.approx(3.0)
+    assert jobs.retry_after() == 3
+
+
+def test_job_manager_reports_progress_with_eta():
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(max_workers=1, max_concurrent_jobs=1, executor=executor)
+            jobs.bytes_per_second = 1000
+            first = await jobs.submit(
+                make_ebook(numbered_pages(2), mimetype=True), "first.epub"
+            )
+            second = await jobs.submit(
+                make_ebook(numbered_pages(2), mimetype=True), "second.epub"
+            )
+            queued = jobs.progress(second)
+
+            first.status, first.started_at, first.done, first.total = (
+                JobStatus.RUNNING,
+                time() - 2,
+                1,
+                4,
+            )
+            running = jobs.progress(first)
+            return first, second, queued, running
+
+    first, second, queued, running = asyncio.run(scenario())
+
+    assert queued["status"] == "queued"
+    assert queued["queue_position"] == 1
+    # The first book, then the second one.
+    expected = (first.input_size + second.input_size) / 1000
+    assert queued["eta_seconds"] == pytest.approx(expected, abs=0.01)
+
+    assert running["entries_per_second"] == pytest.approx(0.5, abs=0.01)
+    assert running["eta_seconds"] == pytest.approx(6, abs=0.1)
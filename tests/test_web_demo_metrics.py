@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from web_demo.jobs import JobManager
+from web_demo.metrics import Counter, Histogram, ServiceMetrics
+from tests.helpers import make_ebook, page
+
+
+def _sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} not found")
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", (0.1, 1), ("route",))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5, route="/a")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 2',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+        'latency_seconds_sum{route="/a"} 5.55',
+        'latency_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("requests_total", "Requests.", ("path",))
+    counter.inc(path='a"b\\c')
+
+    assert counter.render()[-1] == 'requests_total{path="a\\"b\\\\c"} 1'
+
+
+def test_service_metrics_record_finished_jobs():
+    metrics = ServiceMetrics()
+
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(max_workers=1, executor=executor, metrics=metrics)
+            await jobs.start()
+            try:
+                job = await jobs.submit(
+                    make_ebook({"page.xhtml": page("漢字")}), "book.epub"
+                )
+                await asyncio.wait_for(job.finished.wait(), 30)
+                return metrics.render(jobs)
+            finally:
+                await jobs.shutdown()
+
+    text = asyncio.run(scenario())
+
+    assert 'yomigana_jobs_total{status="succeeded",cache_hit="false"} 1' in text
+    assert _sample(text, "yomigana_job_queue_wait_seconds_count") == 1
+    assert _sample(text, "yomigana_characters_total") == len("漢字")
+    assert _sample(text, "yomigana_morphemes_total") >= 1
+    assert 'yomigana_conversion_stage_seconds_total{stage="annotate"}' in text
+    assert _sample(text, "yomigana_jobs_queued") == 0
+    assert _sample(text, "yomigana_pool_workers") == 1
+    assert 0 <= _sample(text, "yomigana_pool_utilization") <= 1
@@ -0,0 +1,138 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from yomigana_ebook.report import ConversionReport
+from web_demo.jobs import Job, JobManager, JobStatus
+from web_demo.result_cache import ResultCache
+from tests.helpers import make_ebook, page
+
+
+def _read(cache: ResultCache, key: str):
+    result = cache.open(key)
+    if result is None:
+        return None
+    with result:
+        return result.read()
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=100)
+
+    assert _read(cache, "a") is None
+    cache.put("a", BytesIO(b"converted"))
+    assert _read(cache, "a") == b"converted"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=25)
+    cache.put("a", BytesIO(b"a" * 10))
+    cache.put("b", BytesIO(b"b" * 10))
+    _read(cache, "a")
+    cache.put("c", BytesIO(b"c" * 10))
+
+    assert _read(cache, "b") is None
+    assert _read(cache, "a") == b"a" * 10
+    assert _read(cache, "c") == b"c" * 10
+    assert cache.total_bytes == 20
+
+
+def test_result_cache_skips_results_larger_than_the_cache(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=5)
+    cache.put("a", BytesIO(b"too large"))
+
+    assert _read(cache, "a") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_result_cache_restores_entries_on_start(tmp_path):
+    ResultCache(str(tmp_path), max_bytes=100).put("a", BytesIO(b"converted"))
+
+    cache = ResultCache(str(tmp_path), max_bytes=100)
+
+    assert cache.total_bytes == len(b"converted")
+    assert _read(cache, "a") == b"converted"
+
+
+def test_job_manager_serves_repeated_uploads_from_result_cache(tmp_path):
+    upload = make_ebook({"page.xhtml": page("漢字")}).getvalue()
+
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(
+                executor=executor,
+                result_cache=ResultCache(str(tmp_path), max_bytes=1024**2),
+            )
+            await jobs.start()
+            try:
+                first = await jobs.submit(BytesIO(upload), "book.epub")
+                await asyncio.wait_for(first.finished.wait(), 30)
+                second = await jobs.submit(BytesIO(upload), "book.epub")
+                other = await jobs.submit(BytesIO(upload), "book.epub", True)
+                await asyncio.wait_for(other.finished.wait(), 30)
+
+                outputs = []
+                for job in (first, second):
+                    outputs.append(b"".join([c async for c in job.iter_output()]))
+                return first, second, other, outputs
+            finally:
+                await jobs.shutdown()
+
+    first, second, other, outputs = asyncio.run(scenario())
+
+    assert not first.cache_hit
+    assert second.cache_hit and second.status is JobStatus.SUCCEEDED
+    assert second.etag == first.etag
+    assert outputs[0] == outputs[1]
+    assert not other.cache_hit and other.etag != first.etag
+
+
+def test_job_manager_finds_cached_etag_without_a_job(tmp_path):
+    upload = make_ebook({"page.xhtml": page("漢字")}).getvalue()
+
+    async def scenario():
+        with ThreadPoolExecutor(1) as executor:
+            jobs = JobManager(
+                executor=executor,
+                result_cache=ResultCache(str(tmp_path), max_bytes=1024**2),
+            )
+            await jobs.start()
+            try:
+                missing = await jobs.cached_etag(BytesIO(upload))
+                job = await jobs.submit(BytesIO(upload), "book.epub")
+                await asyncio.wait_for(job.finished.wait(), 30)
+                jobs.delete(job)
+
+                again = BytesIO(upload)
+                found = await jobs.cached_etag(again)
+                return missing, job.etag, found, again.tell(), len(jobs.jobs)
+            finally:
+                await jobs.shutdown()
+
+    missing, etag, found, position, job_count = asyncio.run(scenario())
+
+    assert missing is None
+    assert etag is not None and found == etag
+    assert position == 0
+    assert job_count == 0
+
+
+def test_results_with_passthrough_entries_have_no_etag():
+    job = Job(
+        id="job",
+        filename="book.epub",
+        filter_non_japanese=False,
+        input=BytesIO(),
+        output=BytesIO(),
+        result_key="key",
+    )
+    assert job.etag is None
+
+    job.status = JobStatus.SUCCEEDED
+    job.report = ConversionReport()
+    assert job.etag == '"key"'
+
+    job.report.passthrough_entries["page.xhtml"] = "time limit"
+    assert job.etag is None
@@ -0,0 +1,45 @@
+import asyncio
+
+from web_demo.metrics import ServiceMetrics
+from web_demo.text_batcher import TextBatcher, annotate_batch, annotate_text
+
+
+def test_annotate_text_escapes_markup():
+    assert (
+        annotate_text("漢字 <b>&") == "<ruby>漢字<rt>かんじ</rt></ruby> &lt;b&gt;&amp;"
+    )
+
+
+def test_annotate_text_filters_non_japanese():
+    assert annotate_text("a < b", filter_non_japanese=True) == "a &lt; b"
+
+
+def test_annotate_batch_keeps_request_order():
+    requests = [("漢字", False), ("本", False), ("漢字", False)]
+
+    assert annotate_batch(requests) == [
+        "<ruby>漢字<rt>かんじ</rt></ruby>",
+        "<ruby>本<rt>ほん</rt></ruby>",
+        "<ruby>漢字<rt>かんじ</rt></ruby>",
+    ]
+
+
+def test_text_batcher_groups_concurrent_requests():
+    metrics = ServiceMetrics()
+    texts = ["漢字", "本", "日本語"] * 10
+
+    async def scenario():
+        batcher = TextBatcher(max_batch_size=8, metrics=metrics)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.annotate(text) for text in texts))
+        finally:
+            await batcher.shutdown()
+
+    results = asyncio.run(scenario())
+
+    assert results == [annotate_text(text) for text in texts]
+    counts, total = metrics.text_batch_size.values[()]
+    # One warm-up batch, then the first request alone and the rest in batches of 8.
+    assert total == 1 + len(texts)
+    assert sum(counts) == 1 + 1 + 4
@@ -1,34 +1,239 @@
 import "./style.css";
 
+interface JobProgress {
+    status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+    done: number;
+    total: number;
+    queue_position: number | null;
+    entries_per_second: number | null;
+    eta_seconds: number | null;
+    error?: string | null;
+}
+
 const loader = <HTMLDivElement>document.querySelector(".loader");
 const dropContainer = <HTMLLabelElement>document.querySelector(".drop-container");
 const fileInput = <HTMLInputElement>document.querySelector(".input-file");
 const filterCheckbox = <HTMLInputElement>document.querySelector(".filter-checkbox");
 const submitBtn = <HTMLButtonElement>document.querySelector(".btn-submit");
+const loaderTitle = <HTMLSpanElement>document.querySelector(".loader-title");
+const progressBar = <HTMLProgressElement>document.querySelector(".progress-bar");
+const progressText = <HTMLSpanElement>document.querySelector(".progress-text");
+const cancelBtn = <HTMLButtonElement>document.querySelector(".btn-cancel");
+
+let currentJobId: string | null = null;
+let batchAbort: AbortController | null = null;
+let cancelled = false;
 
 submitBtn.addEventListener("click", async _event => {
-    const files = fileInput.files;
+    const files = Array.from(fileInput.files!);
 
+    cancelled = false;
     enableLoader();
 
-    for (const file of files!) {
-        const formData = new FormData();
-        formData.append("ebook", file);
-        formData.append("filter", filterCheckbox.checked ? "true" : "false");
+    if (files.length > 1) {
+        // One request for all books, so the server converts them side by side.
+        const error = await convertBatch(files);
+        if (error) {
+            alert(error);
+        }
+    } else if (files.length === 1) {
+        const error = await convert(files[0]);
+        if (error) {
+            alert(`${files[0].name}: ${error}`);
+        }
+    }
 
-        const response = await fetch("/api/process-ebook", { method: "POST", body: formData });
-        const blobUrl = URL.createObjectURL(await response.blob());
+    disableLoader();
+});
 
-        const link = document.createElement("a");
-        link.href = blobUrl;
-        link.download = `with-yomigana_${file.name}`;
-        link.click();
+cancelBtn.addEventListener("click", async _event => {
+    cancelled = true;
+    batchAbort?.abort();
+    if (currentJobId) {
+        await fetch(`/api/jobs/${currentJobId}`, { method: "DELETE" });
+    }
+});
+
+// Converts one book as a job and downloads the result; returns an error message on failure.
+async function convert(file: File): Promise<string | null> {
+    const formData = new FormData();
+    formData.append("ebook", file);
+    formData.append("filter", filterCheckbox.checked ? "true" : "false");
+
+    loaderTitle.textContent = `正在上传 ${file.name}`;
+    showProgress(null);
 
-        link.remove();
+    const response = await fetch("/api/jobs", { method: "POST", body: formData });
+    if (!response.ok) {
+        return await errorMessage(response);
     }
 
-    disableLoader();
-});
+    const job = await response.json();
+    currentJobId = job.id;
+    loaderTitle.textContent = `服务器正在处理 ${file.name}`;
+
+    try {
+        const result = await followProgress(job.id);
+        if (result.status === "cancelled") {
+            return null;
+        }
+        if (result.status !== "succeeded") {
+            return result.error || "处理失败";
+        }
+
+        const resultResponse = await fetch(`/api/jobs/${job.id}/result`);
+        if (!resultResponse.ok) {
+            return await errorMessage(resultResponse);
+        }
+        download(await resultResponse.blob(), `with-yomigana_${file.name}`);
+        return null;
+    } finally {
+        currentJobId = null;
+        await fetch(`/api/jobs/${job.id}`, { method: "DELETE" });
+    }
+}
+
+// Converts several books in one batch request and downloads the zip of the results.
+async function convertBatch(files: File[]): Promise<string | null> {
+    const formData = new FormData();
+    for (const file of files) {
+        formData.append("ebooks", file);
+    }
+    formData.append("filter", filterCheckbox.checked ? "true" : "false");
+
+    loaderTitle.textContent = `正在上传 ${files.length} 本书`;
+    showProgress(null);
+    batchAbort = new AbortController();
+    let polling: number | undefined;
+
+    try {
+        const response = await fetch("/api/batches", {
+            method: "POST",
+            body: formData,
+            signal: batchAbort.signal,
+        });
+        if (!response.ok) {
+            return await errorMessage(response);
+        }
+
+        loaderTitle.textContent = `服务器正在处理 ${files.length} 本书`;
+        const jobIds = (response.headers.get("X-Job-Ids") || "").split(",").filter(id => id);
+        // Polled rather than one event stream per book: browsers only open a
+        // few connections per server, and the download needs one of them.
+        polling = window.setInterval(() => pollBatchProgress(jobIds), 1000);
+
+        download(await response.blob(), "with-yomigana.zip");
+        return null;
+    } catch (error) {
+        return cancelled ? null : String(error);
+    } finally {
+        window.clearInterval(polling);
+        batchAbort = null;
+    }
+}
+
+async function pollBatchProgress(jobIds: string[]) {
+    const responses = await Promise.all(jobIds.map(id => fetch(`/api/jobs/${id}`)));
+    const jobs: JobProgress[] = await Promise.all(
+        responses.filter(response => response.ok).map(response => response.json())
+    );
+    if (!jobs.length) {
+        return;
+    }
+
+    const active = jobs.filter(job => job.status === "queued" || job.status === "running");
+    const etas = active.map(job => job.eta_seconds).filter((eta): eta is number => eta !== null);
+    showProgress({
+        status: active.some(job => job.status === "running") || !active.length ? "running" : "queued",
+        done: jobs.reduce((sum, job) => sum + job.done, 0),
+        total: jobs.reduce((sum, job) => sum + job.total, 0),
+        queue_position: Math.min(...active.map(job => job.queue_position ?? 0)),
+        entries_per_second: null,
+        eta_seconds: etas.length ? Math.max(...etas) : null,
+    });
+}
+
+// Shows the job's progress events until the job ends and resolves with its final status.
+function followProgress(jobId: string): Promise<JobProgress> {
+    return new Promise(resolve => {
+        const events = new EventSource(`/api/jobs/${jobId}/events`);
+
+        events.addEventListener("progress", event => {
+            showProgress(JSON.parse((<MessageEvent>event).data));
+        });
+
+        events.addEventListener("end", event => {
+            events.close();
+            resolve(JSON.parse((<MessageEvent>event).data));
+        });
+
+        // The browser reconnects by itself unless the job is gone.
+        events.addEventListener("error", _event => {
+            if (events.readyState === EventSource.CLOSED) {
+                resolve({
+                    status: "failed",
+                    done: 0,
+                    total: 0,
+                    queue_position: null,
+                    entries_per_second: null,
+                    eta_seconds: null,
+                    error: "与服务器的连接已断开",
+                });
+            }
+        });
+    });
+}
+
+function showProgress(progress: JobProgress | null) {
+    if (!progress || !progress.total) {
+        progressBar.removeAttribute("value");
+    } else {
+        progressBar.value = progress.done / progress.total;
+    }
+
+    if (!progress) {
+        progressText.textContent = "";
+    } else if (progress.status === "queued") {
+        progressText.textContent = `排队中，前面还有 ${progress.queue_position} 本书${formatEta(progress.eta_seconds)}`;
+    } else if (progress.total) {
+        const speed = progress.entries_per_second
+            ? ` · ${progress.entries_per_second.toFixed(1)} 个文件/秒`
+            : "";
+        progressText.textContent = `${progress.done} / ${progress.total}${speed}${formatEta(progress.eta_seconds)}`;
+    } else {
+        progressText.textContent = formatEta(progress.eta_seconds).replace(" · ", "");
+    }
+}
+
+function formatEta(seconds: number | null): string {
+    if (seconds === null) {
+        return "";
+    }
+    if (seconds < 60) {
+        return ` · 预计剩余 ${Math.ceil(seconds)} 秒`;
+    }
+    return ` · 预计剩余 ${Math.ceil(seconds / 60)} 分钟`;
+}
+
+async function errorMessage(response: Response): Promise<string> {
+    try {
+        const body = await response.json();
+        return body.detail || response.statusText;
+    } catch {
+        return response.statusText;
+    }
+}
+
+function download(blob: Blob, filename: string) {
+    const blobUrl = URL.createObjectURL(blob);
+
+    const link = document.createElement("a");
+    link.href = blobUrl;
+    link.download = filename;
+    link.click();
+
+    link.remove();
+}
 
 dropContainer.addEventListener("drop", event => {
     event.preventDefault();
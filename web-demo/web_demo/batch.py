@@ -0,0 +1,108 @@
+"""Stream the results of a batch of jobs as one zip archive.
+
+All books of a batch are queued at once, so they share the process pool like
+any other jobs. Every book is added to the archive as soon as it is finished,
+and the archive is written to a non-seekable sink, so the response starts with
+the first finished book instead of after the last one.
+"""
+
+import asyncio
+import json
+from time import localtime
+from typing import AsyncGenerator, List, Set
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from web_demo.jobs import Job, JobStatus
+
+RESULTS_NAME = "results.json"
+
+
+class _Chunks:
+    """Non-seekable file object collecting what zipfile writes."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+async def stream_batch(batch: List[Job]) -> AsyncGenerator[bytes, None]:
+    """Yield a zip archive of the converted books in the order they finish.
+
+    The archive ends with ``results.json``, listing the status of every book.
+    """
+    sink = _Chunks()
+    results = []
+    names: Set[str] = set()
+    waiters = {asyncio.ensure_future(job.finished.wait()): job for job in batch}
+
+    try:
+        with ZipFile(sink, "w") as zip_writer:
+            while waiters:
+                done, _ = await asyncio.wait(
+                    waiters, return_when=asyncio.FIRST_COMPLETED
+                )
+                for waiter in done:
+                    job = waiters.pop(waiter)
+                    result = {
+                        "filename": job.filename,
+                        "status": job.status.value,
+                        "error": job.error,
+                        "output": None,
+                    }
+                    results.append(result)
+                    if job.status is not JobStatus.SUCCEEDED:
+                        continue
+
+                    result["output"] = _unique_name(
+                        f"with-yomigana_{job.filename}", names
+                    )
+                    # EPUBs are zip archives already; compressing them again
+                    # only costs time.
+                    info = ZipInfo(result["output"], localtime()[:6])
+                    info.compress_type = ZIP_STORED
+                    info.external_attr = 0o644 << 16
+                    with zip_writer.open(info, "w", force_zip64=True) as entry:
+                        async for chunk in job.iter_output():
+                            entry.write(chunk)
+                            if data := sink.drain():
+                                yield data
+                    if data := sink.drain():
+                        yield data
+
+            zip_writer.writestr(
+                RESULTS_NAME,
+                json.dumps(results, ensure_ascii=False, indent=1),
+                ZIP_DEFLATED,
+            )
+        yield sink.drain()
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+
+def _unique_name(name: str, names: Set[str]) -> str:
+    stem, dot, suffix = name.rpartition(".")
+    if not dot:
+        stem, suffix = name, ""
+
+    candidate, number = name, 1
+    while candidate in names:
+        number += 1
+        candidate = f"{stem} ({number}){dot}{suffix}"
+    names.add(candidate)
+    return candidate
@@ -0,0 +1,578 @@
+"""Conversion jobs scheduled on one process pool shared by the whole app.
+
+Every job converts one uploaded book. At most ``max_concurrent_jobs`` jobs run
+at a time and the rest wait in a FIFO queue. Running jobs share the pool and
+each keeps only ``max_in_flight`` HTML files in it at once, so the workers are
+split fairly between books instead of being drained by the first one.
+
+The queue is bounded: once ``max_queued_jobs`` jobs are waiting, or an upload
+exceeds ``max_upload_size``, new work is rejected straight away together with
+an estimate of when to retry, instead of letting every request slow down.
+"""
+
+import asyncio
+from math import ceil
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from enum import Enum
+from os import cpu_count
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+from time import monotonic, time
+from typing import IO, Any, AsyncGenerator, Dict, Optional
+from uuid import uuid4
+
+from yomigana_ebook.cancellation import (
+    CancelToken,
+    ConversionCancelled,
+    DeadlineExceeded,
+)
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import create_executor, process_ebook
+from yomigana_ebook.report import ConversionReport
+from web_demo.metrics import ServiceMetrics
+from web_demo.result_cache import ResultCache, result_hasher
+
+# Jobs that finished this many seconds ago are dropped with their results.
+DEFAULT_RESULT_TTL = 15 * 60
+
+# Conversion speed assumed until the first job has finished.
+INITIAL_BYTES_PER_SECOND = 1024 * 1024
+# Weight of the latest job in the moving average of the conversion speed.
+_SPEED_SMOOTHING = 0.3
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = {JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"the queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_upload_size: int):
+        super().__init__(f"the upload exceeds the limit of {max_upload_size} bytes")
+        self.max_upload_size = max_upload_size
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    filter_non_japanese: bool
+    input: IO[bytes]
+    output: IO[bytes]
+    input_size: int = 0
+    # Hash of the upload and the conversion options, see result_cache.py.
+    result_key: str = ""
+    cache_hit: bool = False
+    status: JobStatus = JobStatus.QUEUED
+    done: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    report: Optional[ConversionReport] = None
+    created_at: float = field(default_factory=time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_token: CancelToken = field(default_factory=CancelToken)
+    finished: asyncio.Event = field(default_factory=asyncio.Event)
+    # Bytes of ``output`` written so far; the result grows while the job runs.
+    output_size: int = 0
+    output_written: asyncio.Event = field(default_factory=asyncio.Event)
+    output_lock: Lock = field(default_factory=Lock)
+
+    @property
+    def etag(self) -> Optional[str]:
+        """Names the full conversion of the upload; None until the job has one.
+
+        A result with files copied through unannotated is not that conversion.
+        """
+        if self.cache_hit or (
+            self.status is JobStatus.SUCCEEDED
+            and self.report is not None
+            and not self.report.passthrough_entries
+        ):
+            return f'"{self.result_key}"'
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "filter": self.filter_non_japanese,
+            "status": self.status.value,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+            "cache_hit": self.cache_hit,
+            "report": self.report.to_dict() if self.report is not None else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def close(self):
+        self.input.close()
+        self.output.close()
+
+    def notify_output(self):
+        """Wake up readers waiting for more output; call it on the event loop."""
+        # Readers hold on to the event they saw before reading, so replacing it
+        # wakes every one of them without a lost wake-up.
+        written, self.output_written = self.output_written, asyncio.Event()
+        written.set()
+
+    async def wait_for_output(self):
+        """Wait until the first bytes of the result are written or the job finished."""
+        while True:
+            written = self.output_written
+            if self.output_size or self.finished.is_set():
+                return
+            await written.wait()
+
+    async def iter_output(
+        self, chunk_size: int = 64 * 1024
+    ) -> AsyncGenerator[bytes, None]:
+        """Stream the converted book, following it while it is still being written.
+
+        Concurrent downloads keep their own offsets.
+        """
+        offset = 0
+        while True:
+            written = self.output_written
+            finished = self.finished.is_set()
+            chunk = await asyncio.to_thread(self._read_output, offset, chunk_size)
+            if chunk:
+                offset += len(chunk)
+                yield chunk
+            elif finished:
+                return
+            else:
+                await written.wait()
+
+    def _read_output(self, offset: int, size: int) -> bytes:
+        with self.output_lock:
+            self.output.seek(offset)
+            return self.output.read(size)
+
+
+class _OutputWriter:
+    """Append-only, non-seekable writer into a job's output.
+
+    The output is streamed while it is written; given a seekable file, zipfile
+    would go back and rewrite local headers that were already sent.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    def write(self, data: bytes) -> int:
+        job = self.job
+        with job.output_lock:
+            # Readers move the file position around.
+            job.output.seek(job.output_size)
+            job.output.write(data)
+            job.output_size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.job.output_size
+
+    def flush(self):
+        pass
+
+
+class JobManager:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_concurrent_jobs: int = 2,
+        spool_max_size: int = 8 * 1024 * 1024,
+        result_ttl: float = DEFAULT_RESULT_TTL,
+        executor: Optional[Executor] = None,
+        max_queued_jobs: Optional[int] = None,
+        max_upload_size: Optional[int] = None,
+        result_cache: Optional[ResultCache] = None,
+        metrics: Optional[ServiceMetrics] = None,
+        job_timeout: Optional[float] = None,
+        entry_time_limit: Optional[float] = None,
+        entry_memory_limit: Optional[int] = None,
+    ):
+        self.max_workers = max_workers or cpu_count() or 1
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.spool_max_size = spool_max_size
+        self.result_ttl = result_ttl
+        self.max_queued_jobs = max_queued_jobs
+        self.max_upload_size = max_upload_size
+        self.result_cache = result_cache
+        self.metrics = metrics
+        # Seconds a job may run before it is stopped and marked as failed.
+        self.job_timeout = job_timeout or None
+        # Per HTML file, see process_ebook; files over them are copied through.
+        self.entry_time_limit = entry_time_limit or None
+        self.entry_memory_limit = entry_memory_limit or None
+        self.bytes_per_second = float(INITIAL_BYTES_PER_SECOND)
+        self.jobs: Dict[str, Job] = {}
+        self.ready = False
+
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._runners: list["asyncio.Task[None]"] = []
+
+    @property
+    def max_in_flight(self) -> int:
+        """HTML files a single running job may keep in the pool at once."""
+        return max(1, -(-self.max_workers // self.max_concurrent_jobs))
+
+    async def start(self):
+        if self._executor is None:
+            # Stoppable: cancelled and timed out jobs stop their running files.
+            self._executor = create_executor(self.max_workers, stoppable=True)
+        self._runners = [
+            asyncio.create_task(self._run_jobs())
+            for _ in range(self.max_concurrent_jobs)
+        ]
+        self.ready = True
+
+    async def shutdown(self):
+        self.ready = False
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+
+        for job in list(self.jobs.values()):
+            self._discard(job)
+
+        if self._owns_executor and self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown, cancel_futures=True)
+            self._executor = None
+
+    async def submit(
+        self, upload: IO[bytes], filename: str, filter_non_japanese: bool = False
+    ) -> Job:
+        """Queue a conversion of ``upload``, which is copied into the job.
+
+        Raises ``QueueFull`` or ``UploadTooLarge`` when the job is not admitted.
+        """
+        self._expire_finished_jobs()
+        self.check_admission()
+
+        job = Job(
+            id=uuid4().hex,
+            filename=filename,
+            filter_non_japanese=filter_non_japanese,
+            input=SpooledTemporaryFile(max_size=self.spool_max_size),
+            output=SpooledTemporaryFile(max_size=self.spool_max_size),
+        )
+        try:
+            job.input_size, job.result_key = await asyncio.to_thread(
+                _copy_limited,
+                upload,
+                job.input,
+                self.max_upload_size,
+                filter_non_japanese,
+            )
+            if await self._use_cached_result(job):
+                return job
+            # Other uploads may have been admitted while this one was copied.
+            self.check_admission()
+        except BaseException:
+            job.close()
+            raise
+        job.input.seek(0)
+
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    async def cached_etag(
+        self, upload: IO[bytes], filter_non_japanese: bool = False
+    ) -> Optional[str]:
+        """The ETag of the cached result for ``upload``, None if it is not cached.
+
+        ``upload`` is read to hash it, then rewound; no job is created.
+        """
+        if self.result_cache is None:
+            return None
+        key = await asyncio.to_thread(_result_key, upload, filter_non_japanese)
+        return f'"{key}"' if key in self.result_cache else None
+
+    async def submit_batch(
+        self, uploads: list[tuple[IO[bytes], str]], filter_non_japanese: bool = False
+    ) -> list[Job]:
+        """Queue one job per ``(upload, filename)``; either all or none are admitted."""
+        self.check_admission(slots=len(uploads))
+
+        batch: list[Job] = []
+        try:
+            for upload, filename in uploads:
+                batch.append(await self.submit(upload, filename, filter_non_japanese))
+        except BaseException:
+            for job in batch:
+                self.delete(job)
+            raise
+        return batch
+
+    def queued_jobs(self) -> list[Job]:
+        return [job for job in self.jobs.values() if job.status is JobStatus.QUEUED]
+
+    def running_jobs(self) -> list[Job]:
+        return [job for job in self.jobs.values() if job.status is JobStatus.RUNNING]
+
+    def queue_full(self, slots: int = 1) -> bool:
+        """Whether the queue has no room for ``slots`` more jobs."""
+        if self.max_queued_jobs is None:
+            return False
+        return len(self.queued_jobs()) + slots > self.max_queued_jobs
+
+    def check_admission(self, content_length: Optional[int] = None, slots: int = 1):
+        """Raise when ``slots`` new jobs of ``content_length`` bytes would be rejected."""
+        if (
+            self.max_upload_size is not None
+            and content_length is not None
+            and content_length > self.max_upload_size
+        ):
+            raise UploadTooLarge(self.max_upload_size)
+        if self.queue_full(slots):
+            raise QueueFull(self.retry_after())
+
+    def estimated_wait(self, before: Optional[Job] = None) -> float:
+        """Seconds until the work that is running or queued now has finished.
+
+        With ``before``, only the queued jobs ahead of that job are counted.
+        """
+        queued = self.queued_jobs()
+        if before in queued:
+            queued = queued[: queued.index(before)]
+
+        remaining_bytes = sum(job.input_size for job in queued)
+        for job in self.running_jobs():
+            share_left = 1 - job.done / job.total if job.total else 1
+            remaining_bytes += job.input_size * share_left
+
+        seconds = remaining_bytes / self.bytes_per_second
+        return seconds / self.max_concurrent_jobs
+
+    def retry_after(self) -> int:
+        return max(1, min(3600, ceil(self.estimated_wait())))
+
+    def stats(self) -> Dict[str, Any]:
+        queued = len(self.queued_jobs())
+        if self.max_queued_jobs is None:
+            saturation = 0.0
+        elif self.max_queued_jobs == 0:
+            saturation = 1.0
+        else:
+            saturation = min(1.0, queued / self.max_queued_jobs)
+        return {
+            "ready": self.ready,
+            "running_jobs": len(self.running_jobs()),
+            "queued_jobs": queued,
+            "max_concurrent_jobs": self.max_concurrent_jobs,
+            "max_queued_jobs": self.max_queued_jobs,
+            "queue_saturation": saturation,
+            "estimated_wait_seconds": self.estimated_wait(),
+        }
+
+    def progress(self, job: Job) -> Dict[str, Any]:
+        """Progress of ``job`` with its throughput and estimated time left."""
+        entries_per_second = None
+        eta = None
+
+        if job.status is JobStatus.QUEUED:
+            eta = self.estimated_wait(before=job) + self._estimated_duration(job)
+        elif job.status is JobStatus.RUNNING and job.started_at is not None:
+            elapsed = time() - job.started_at
+            if job.done and elapsed > 0:
+                entries_per_second = job.done / elapsed
+                eta = (job.total - job.done) / entries_per_second
+            else:
+                eta = max(0.0, self._estimated_duration(job) - elapsed)
+        elif job.status is JobStatus.SUCCEEDED:
+            eta = 0.0
+
+        return {
+            "status": job.status.value,
+            "done": job.done,
+            "total": job.total,
+            "queue_position": self.queue_position(job),
+            "entries_per_second": _round(entries_per_second),
+            "eta_seconds": _round(eta),
+        }
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        """0-based position of a queued job, or None when it is not queued."""
+        if job.status is not JobStatus.QUEUED:
+            return None
+        return self.queued_jobs().index(job)
+
+    def cancel(self, job: Job):
+        """Cancel a queued or running job; finished jobs are left as they are."""
+        if job.status is JobStatus.QUEUED:
+            self._finish(job, JobStatus.CANCELLED)
+        elif job.status is JobStatus.RUNNING:
+            job.cancel_token.cancel()
+
+    def delete(self, job: Job):
+        """Cancel ``job`` if needed and drop it together with its result."""
+        self.cancel(job)
+        self._discard(job)
+
+    async def _run_jobs(self):
+        while True:
+            job = await self._queue.get()
+            if job.status is not JobStatus.QUEUED:
+                continue
+
+            job.status = JobStatus.RUNNING
+            job.started_at = time()
+            if self.metrics is not None:
+                self.metrics.observe_job_started(job.started_at - job.created_at)
+            try:
+                await asyncio.to_thread(self._convert, job, asyncio.get_running_loop())
+            except DeadlineExceeded:
+                self._finish(
+                    job,
+                    JobStatus.FAILED,
+                    f"the conversion took longer than {self.job_timeout:g} seconds",
+                )
+            except ConversionCancelled:
+                self._finish(job, JobStatus.CANCELLED)
+            except Exception as exc:
+                self._finish(job, JobStatus.FAILED, str(exc) or type(exc).__name__)
+            else:
+                # Cache first, so an upload of the same book right after this
+                # job finished is a cache hit. Books with files copied through
+                # unannotated are not cached; those files may convert next time.
+                if self.result_cache is not None and not (
+                    job.report and job.report.passthrough_entries
+                ):
+                    await asyncio.to_thread(self._store_result, job)
+                self._finish(job, JobStatus.SUCCEEDED)
+                self._update_speed(job)
+
+            if job.id not in self.jobs:
+                # Deleted while it was running.
+                job.close()
+
+    def _convert(self, job: Job, loop: asyncio.AbstractEventLoop):
+        def on_progress(done: int, total: int):
+            job.done, job.total = done, total
+            # Called after every written entry: let streaming readers follow.
+            loop.call_soon_threadsafe(job.notify_output)
+
+        job.report = process_ebook(
+            job.input,
+            _OutputWriter(job),
+            progress_callback=on_progress,
+            options=ConversionOptions(
+                filter_non_japanese=job.filter_non_japanese,
+                entry_time_limit=self.entry_time_limit,
+                entry_memory_limit=self.entry_memory_limit,
+                max_in_flight=self.max_in_flight,
+            ),
+            executor=self._executor,
+            cancel_token=job.cancel_token,
+            deadline=monotonic() + self.job_timeout if self.job_timeout else None,
+        )
+
+    async def _use_cached_result(self, job: Job) -> bool:
+        if self.result_cache is None:
+            return False
+
+        cached = await asyncio.to_thread(self.result_cache.open, job.result_key)
+        if cached is None:
+            return False
+
+        job.output.close()
+        job.output = cached
+        job.output_size = cached.seek(0, 2)
+        job.cache_hit = True
+        job.started_at = time()
+        self.jobs[job.id] = job
+        self._finish(job, JobStatus.SUCCEEDED)
+        return True
+
+    def _store_result(self, job: Job):
+        assert self.result_cache is not None
+        with job.output_lock:
+            job.output.seek(0)
+            self.result_cache.put(job.result_key, job.output)
+
+    def _finish(self, job: Job, status: JobStatus, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time()
+        job.finished.set()
+        job.notify_output()
+        if self.metrics is not None:
+            self.metrics.observe_job_finished(job)
+
+    def _estimated_duration(self, job: Job) -> float:
+        return job.input_size / self.bytes_per_second
+
+    def _update_speed(self, job: Job):
+        assert job.started_at is not None and job.finished_at is not None
+        duration = job.finished_at - job.started_at
+        if duration <= 0 or not job.input_size:
+            return
+        speed = job.input_size / duration
+        self.bytes_per_second += _SPEED_SMOOTHING * (speed - self.bytes_per_second)
+
+    def _discard(self, job: Job):
+        self.jobs.pop(job.id, None)
+        if job.status is not JobStatus.RUNNING:
+            job.close()
+
+    def _expire_finished_jobs(self):
+        deadline = time() - self.result_ttl
+        for job in list(self.jobs.values()):
+            if job.finished_at is not None and job.finished_at < deadline:
+                self._discard(job)
+
+
+def _copy_limited(
+    source: IO[bytes],
+    target: IO[bytes],
+    limit: Optional[int],
+    filter_non_japanese: bool,
+) -> tuple[int, str]:
+    """Copy an upload, returning its size and its result cache key."""
+    digest = result_hasher(filter_non_japanese)
+    copied = 0
+    while chunk := source.read(_COPY_CHUNK_SIZE):
+        copied += len(chunk)
+        if limit is not None and copied > limit:
+            raise UploadTooLarge(limit)
+        digest.update(chunk)
+        target.write(chunk)
+    return copied, digest.hexdigest()
+
+
+def _result_key(source: IO[bytes], filter_non_japanese: bool) -> str:
+    start = source.tell()
+    digest = result_hasher(filter_non_japanese)
+    while chunk := source.read(_COPY_CHUNK_SIZE):
+        digest.update(chunk)
+    source.seek(start)
+    return digest.hexdigest()
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
@@ -0,0 +1,129 @@
+"""Load test for ``POST /api/yomituki`` using only the standard library.
+
+Start the web service, then run for example::
+
+    $ python -m web_demo.load_test --clients 32 --requests 5000
+
+Every client thread keeps one HTTP/1.1 connection open and sends requests
+back to back; the latency distribution is printed at the end.
+"""
+
+import json
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from random import Random
+from threading import Thread
+from time import perf_counter
+from typing import List
+from urllib.parse import urlsplit
+
+SENTENCES = (
+    "月が綺麗ですね。",
+    "吾輩は猫である。名前はまだ無い。",
+    "国境の長いトンネルを抜けると雪国であった。",
+    "本好きの下剋上を読み始めた。",
+    "今日は図書館で歴史の本を借りました。",
+    "明日の天気は晴れのち曇りだそうです。",
+    "彼女は静かに窓の外を眺めていた。",
+    "新しい言葉を覚えるのは楽しい。",
+)
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def make_texts(count: int, seed: int = 0) -> List[str]:
+    """Sentences of one to three random parts, so some of them repeat."""
+    random = Random(seed)
+    return [
+        "".join(random.choices(SENTENCES, k=random.randint(1, 3))) for _ in range(count)
+    ]
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = round(percent / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+def run_client(
+    url: str, texts: List[str], latencies: List[float], errors: List[str]
+) -> None:
+    parts = urlsplit(url)
+    connection = HTTPConnection(parts.hostname or "localhost", parts.port or 80)
+    headers = {"Content-Type": "application/json"}
+    try:
+        for text in texts:
+            body = json.dumps({"text": text})
+            start = perf_counter()
+            try:
+                connection.request("POST", parts.path, body, headers)
+                response = connection.getresponse()
+                response.read()
+            except OSError as exc:
+                errors.append(str(exc))
+                connection.close()
+                continue
+
+            latencies.append(perf_counter() - start)
+            if response.status != 200:
+                errors.append(f"HTTP {response.status}")
+    finally:
+        connection.close()
+
+
+def main():
+    parser = ArgumentParser(
+        prog="python -m web_demo.load_test",
+        description="Drive POST /api/yomituki with concurrent clients",
+    )
+    parser.add_argument(
+        "--url",
+        default="http://localhost:8000/api/yomituki",
+        help="Endpoint to load (default: %(default)s)",
+    )
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients")
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="Requests over all clients"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the texts")
+    parser.add_argument(
+        "--slo-ms",
+        type=float,
+        default=20.0,
+        help="p99 latency target in milliseconds (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    texts = make_texts(args.requests, args.seed)
+    clients = max(1, args.clients)
+    latencies: List[float] = []
+    errors: List[str] = []
+    threads = [
+        Thread(target=run_client, args=(args.url, texts[i::clients], latencies, errors))
+        for i in range(clients)
+    ]
+
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    latencies.sort()
+    print(f"[load] {len(latencies)} requests from {clients} clients")
+    print(f"[load] {len(latencies) / elapsed:.1f} requests/sec, {len(errors)} errors")
+    for percent in PERCENTILES:
+        print(f"[load] p{percent:<5} {percentile(latencies, percent) * 1000:8.2f} ms")
+    if latencies:
+        print(f"[load] max    {latencies[-1] * 1000:8.2f} ms")
+
+    p99 = percentile(latencies, 99) * 1000
+    if errors or p99 > args.slo_ms:
+        print(f"[load] FAILED: p99 {p99:.2f} ms (target {args.slo_ms} ms)")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
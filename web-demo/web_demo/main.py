@@ -1,19 +1,162 @@
 import asyncio
+import json
+from contextlib import asynccontextmanager
+from os import environ
+from time import perf_counter
+from tempfile import gettempdir
+from typing import Annotated, AsyncGenerator, Dict, Optional
+from urllib.parse import quote
 
-from typing import Annotated
-from io import BytesIO
-
-from fastapi import FastAPI, File, Form  # type: ignore
+from fastapi import FastAPI, Form, HTTPException, Request, UploadFile  # type: ignore
 from fastapi.staticfiles import StaticFiles  # type: ignore
-from fastapi.responses import FileResponse, StreamingResponse  # type: ignore
+from pydantic import BaseModel  # type: ignore
+from fastapi.responses import (  # type: ignore
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import Match  # type: ignore
+
+from web_demo.batch import stream_batch
+from web_demo.jobs import Job, JobManager, JobStatus, QueueFull, UploadTooLarge
+from web_demo.metrics import CONTENT_TYPE, ServiceMetrics
+from web_demo.result_cache import ResultCache
+from web_demo.text_batcher import TextBatcher
+
+# Converted books smaller than this stay in memory, larger ones are spooled to
+# a temporary file. Uploads are spooled by Starlette itself (above 1 MiB).
+SPOOL_MAX_SIZE = int(environ.get("YOMIGANA_SPOOL_MAX_SIZE", 8 * 1024 * 1024))
+# Size of the process pool shared by all jobs (default: number of CPUs).
+MAX_WORKERS = int(environ.get("YOMIGANA_WORKERS", 0)) or None
+MAX_CONCURRENT_JOBS = int(environ.get("YOMIGANA_MAX_CONCURRENT_JOBS", 2))
+# Admission limits: jobs waiting for a free slot, and bytes per upload.
+MAX_QUEUED_JOBS = int(environ.get("YOMIGANA_MAX_QUEUED_JOBS", 16))
+MAX_UPLOAD_SIZE = int(environ.get("YOMIGANA_MAX_UPLOAD_SIZE", 256 * 1024 * 1024))
+# Converted books are cached on disk by content hash, up to this many bytes;
+# set YOMIGANA_RESULT_CACHE_SIZE=0 to disable the cache.
+RESULT_CACHE_DIR = environ.get(
+    "YOMIGANA_RESULT_CACHE_DIR", f"{gettempdir()}/yomigana-result-cache"
+)
+RESULT_CACHE_SIZE = int(environ.get("YOMIGANA_RESULT_CACHE_SIZE", 1024**3))
+# Longest text accepted by /api/yomituki, in characters.
+MAX_TEXT_LENGTH = int(environ.get("YOMIGANA_MAX_TEXT_LENGTH", 10_000))
+# Seconds a conversion may run before it is stopped (0: no limit).
+JOB_TIMEOUT = float(environ.get("YOMIGANA_JOB_TIMEOUT", 0))
+# Seconds and MiB a single HTML file may take (0: no limit); files over them
+# are converted in a low-memory mode or copied through unannotated.
+ENTRY_TIMEOUT = float(environ.get("YOMIGANA_ENTRY_TIMEOUT", 0))
+ENTRY_MEMORY_MB = int(environ.get("YOMIGANA_ENTRY_MEMORY_MB", 0))
+
+UPLOAD_PATHS = {"/api/process-ebook", "/api/jobs", "/api/batches"}
+
+# Progress events are sent at most this often, and at least this often while
+# nothing changes (the ETA keeps counting down, and proxies keep the stream).
+MIN_EVENT_INTERVAL = 0.1
+MAX_EVENT_INTERVAL = 1.0
+# How often a request waiting for its first bytes checks for a disconnect.
+DISCONNECT_POLL_INTERVAL = 0.5
 
-from yomigana_ebook.process_ebook import process_ebook
 
-app: FastAPI = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    result_cache = (
+        ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_SIZE) if RESULT_CACHE_SIZE else None
+    )
+    jobs = JobManager(
+        max_workers=MAX_WORKERS,
+        max_concurrent_jobs=MAX_CONCURRENT_JOBS,
+        spool_max_size=SPOOL_MAX_SIZE,
+        max_queued_jobs=MAX_QUEUED_JOBS,
+        max_upload_size=MAX_UPLOAD_SIZE,
+        result_cache=result_cache,
+        metrics=app.state.metrics,
+        job_timeout=JOB_TIMEOUT,
+        entry_time_limit=ENTRY_TIMEOUT,
+        entry_memory_limit=ENTRY_MEMORY_MB * 1024 * 1024,
+    )
+    text_batcher = TextBatcher(metrics=app.state.metrics)
+    await text_batcher.start()
+    await jobs.start()
+    app.state.jobs = jobs
+    app.state.text_batcher = text_batcher
+    try:
+        yield
+    finally:
+        await jobs.shutdown()
+        await text_batcher.shutdown()
+
+
+app: FastAPI = FastAPI(lifespan=lifespan)
+app.state.metrics = ServiceMetrics()
 
 app.mount("/assets", StaticFiles(directory="client/dist/assets"), "assets")
 
 
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Reject uploads before their body is read when they cannot be admitted."""
+    if request.method == "POST" and request.url.path in UPLOAD_PATHS:
+        jobs: JobManager = request.app.state.jobs
+        content_length = request.headers.get("content-length")
+
+        if not jobs.ready:
+            return JSONResponse({"detail": "the service is not ready"}, 503)
+        try:
+            size = int(content_length) if content_length else None
+            if size is not None and size < 0:
+                raise ValueError(content_length)
+        except ValueError:
+            return JSONResponse({"detail": "invalid Content-Length header"}, 400)
+        try:
+            jobs.check_admission(size)
+        except (QueueFull, UploadTooLarge) as exc:
+            return rejection_response(exc)
+
+    return await call_next(request)
+
+
+# Registered last, so it is the outermost middleware and also times rejections.
+@app.middleware("http")
+async def measure_latency(request: Request, call_next):
+    start = perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        request.app.state.metrics.observe_request(
+            request.method, route_template(request), status, perf_counter() - start
+        )
+
+
+def route_template(request: Request) -> str:
+    """The path of the matching route, so job ids do not become label values."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match is Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.exception_handler(QueueFull)
+@app.exception_handler(UploadTooLarge)
+async def handle_rejection(_request: Request, exc: Exception) -> Response:
+    return rejection_response(exc)
+
+
+def rejection_response(exc: Exception) -> Response:
+    if isinstance(exc, QueueFull):
+        return JSONResponse(
+            {"detail": str(exc), "retry_after": exc.retry_after},
+            429,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    return JSONResponse({"detail": str(exc)}, 413)
+
+
 @app.get("/")
 async def index() -> FileResponse:
     return FileResponse("client/dist/index.html")
@@ -24,14 +167,242 @@ async def get_favicon() -> FileResponse:
     return FileResponse("client/dist/favicon.ico")
 
 
+@app.get("/healthz")
+async def healthz(request: Request):
+    """Liveness: the process is up and serving requests."""
+    jobs: JobManager = request.app.state.jobs
+    return {"status": "ok", **jobs.stats()}
+
+
+@app.get("/readyz")
+async def readyz(request: Request) -> JSONResponse:
+    """Readiness: 503 while the queue is full so load balancers route elsewhere."""
+    jobs: JobManager = request.app.state.jobs
+    stats = jobs.stats()
+
+    if not jobs.ready or jobs.queue_full():
+        retry_after = str(jobs.retry_after())
+        return JSONResponse(
+            {"status": "busy", **stats}, 503, headers={"Retry-After": retry_after}
+        )
+    return JSONResponse({"status": "ready", **stats})
+
+
+@app.get("/metrics")
+async def metrics(request: Request) -> PlainTextResponse:
+    """Prometheus metrics in the text exposition format."""
+    return PlainTextResponse(
+        request.app.state.metrics.render(request.app.state.jobs),
+        media_type=CONTENT_TYPE,
+    )
+
+
+class YomitukiRequest(BaseModel):
+    text: str
+    filter: bool = False
+
+
+@app.post("/api/yomituki")
+async def yomituki_handler(request: Request, body: YomitukiRequest):
+    """Annotate a short plain text; the result is an HTML fragment."""
+    if len(body.text) > MAX_TEXT_LENGTH:
+        raise HTTPException(413, f"the text exceeds {MAX_TEXT_LENGTH} characters")
+
+    text_batcher: TextBatcher = request.app.state.text_batcher
+    return {"html": await text_batcher.annotate(body.text, body.filter)}
+
+
 @app.post("/api/process-ebook")
 async def process_ebook_handler(
-    ebook: Annotated[bytes, File()], filter: Annotated[bool, Form()] = False
+    request: Request, ebook: UploadFile, filter: Annotated[bool, Form()] = False
+) -> StreamingResponse:
+    jobs: JobManager = request.app.state.jobs
+    if request.headers.get("if-none-match"):
+        # The client may already have this result: then it is not converted
+        # and takes no place in the queue.
+        etag = await jobs.cached_etag(ebook.file, filter)
+        if not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    job = await jobs.submit(ebook.file, ebook.filename or "ebook.epub", filter)
+
+    # The book is streamed while it is converted; only failures before the
+    # first bytes can still be reported with a status code.
+    while not await wait_for_output(job):
+        if await request.is_disconnected():
+            # Nobody is waiting for the book anymore: stop converting it.
+            jobs.delete(job)
+            return Response(status_code=499)
+
+    if job.finished.is_set() and job.status is not JobStatus.SUCCEEDED:
+        jobs.delete(job)
+        raise HTTPException(400, job.error or "the conversion failed")
+
+    return StreamingResponse(
+        stream_and_delete(jobs, job),
+        media_type="application/epub+zip",
+        # Known up front for cached results only: a conversion that is still
+        # running may yet copy files through unannotated.
+        headers=etag_header(job.etag),
+    )
+
+
+@app.post("/api/batches")
+async def process_batch(
+    request: Request,
+    ebooks: list[UploadFile],
+    filter: Annotated[bool, Form()] = False,
 ) -> StreamingResponse:
-    return StreamingResponse(process_ebook_streamer(ebook, filter))
+    """Convert several books at once; streams a zip archive of the results."""
+    jobs: JobManager = request.app.state.jobs
+    if jobs.max_queued_jobs is not None and len(ebooks) > jobs.max_queued_jobs:
+        raise HTTPException(400, f"a batch holds at most {jobs.max_queued_jobs} books")
+
+    batch = await jobs.submit_batch(
+        [(ebook.file, ebook.filename or "ebook.epub") for ebook in ebooks], filter
+    )
+    return StreamingResponse(
+        stream_batch_and_delete(jobs, batch),
+        media_type="application/zip",
+        headers={
+            # Clients can follow /api/jobs/{id}/events of every book.
+            "X-Job-Ids": ",".join(job.id for job in batch),
+            "Content-Disposition": 'attachment; filename="with-yomigana.zip"',
+        },
+    )
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    request: Request, ebook: UploadFile, filter: Annotated[bool, Form()] = False
+):
+    jobs: JobManager = request.app.state.jobs
+    job = await jobs.submit(ebook.file, ebook.filename or "ebook.epub", filter)
+    return job_status(jobs, job)
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    jobs: JobManager = request.app.state.jobs
+    return job_status(jobs, find_job(jobs, job_id))
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(request: Request, job_id: str) -> StreamingResponse:
+    """Server-sent ``progress`` events until the job ends, then one ``end`` event."""
+    jobs: JobManager = request.app.state.jobs
+    job = find_job(jobs, job_id)
+    return StreamingResponse(
+        progress_events(jobs, job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(request: Request, job_id: str) -> Response:
+    jobs: JobManager = request.app.state.jobs
+    job = find_job(jobs, job_id)
+
+    if not_modified(request, job.etag):
+        return Response(status_code=304, headers=etag_header(job.etag))
+
+    if job.status is not JobStatus.SUCCEEDED:
+        raise HTTPException(409, f"the job is {job.status.value}")
+
+    return StreamingResponse(
+        job.iter_output(),
+        media_type="application/epub+zip",
+        headers={
+            **etag_header(job.etag),
+            "Content-Disposition": "attachment; filename*=UTF-8''"
+            + quote(f"with-yomigana_{job.filename}"),
+        },
+    )
+
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(request: Request, job_id: str):
+    jobs: JobManager = request.app.state.jobs
+    job = find_job(jobs, job_id)
+    jobs.delete(job)
+    return job_status(jobs, job)
+
+
+def find_job(jobs: JobManager, job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "no such job")
+    return job
+
+
+def not_modified(request: Request, etag: Optional[str]) -> bool:
+    """Whether ``If-None-Match`` names ``etag``."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match or etag is None:
+        return False
+
+    etags = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return etag in etags
+
+
+def etag_header(etag: Optional[str]) -> Dict[str, str]:
+    return {"ETag": etag} if etag is not None else {}
+
+
+async def wait_for_output(job: Job) -> bool:
+    """Wait a little for the first bytes of ``job``; False when there are none yet."""
+    try:
+        await asyncio.wait_for(job.wait_for_output(), DISCONNECT_POLL_INTERVAL)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+def job_status(jobs: JobManager, job: Job):
+    return {
+        **job.to_dict(),
+        **jobs.progress(job),
+        "etag": job.etag,
+    }
+
+
+async def progress_events(jobs: JobManager, job: Job):
+    while True:
+        written = job.output_written
+        if job.finished.is_set():
+            yield server_sent_event("end", job_status(jobs, job))
+            return
+
+        yield server_sent_event("progress", jobs.progress(job))
+        await asyncio.sleep(MIN_EVENT_INTERVAL)
+        try:
+            await asyncio.wait_for(
+                written.wait(), MAX_EVENT_INTERVAL - MIN_EVENT_INTERVAL
+            )
+        except asyncio.TimeoutError:
+            pass
+
+
+def server_sent_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_batch_and_delete(jobs: JobManager, batch: list[Job]):
+    try:
+        async for chunk in stream_batch(batch):
+            yield chunk
+    finally:
+        for job in batch:
+            jobs.delete(job)
 
 
-async def process_ebook_streamer(ebook: bytes, filter_non_japanese: bool):
-    with BytesIO(ebook) as reader, BytesIO() as writer:
-        await asyncio.to_thread(process_ebook, reader, writer, filter_non_japanese)
-        yield writer.getbuffer().tobytes()
+async def stream_and_delete(jobs: JobManager, job: Job):
+    try:
+        async for chunk in job.iter_output():
+            yield chunk
+        if job.status is not JobStatus.SUCCEEDED:
+            # Abort the response so the client does not keep a truncated book.
+            raise RuntimeError(job.error or "the conversion failed")
+    finally:
+        jobs.delete(job)
@@ -0,0 +1,346 @@
+"""Service metrics in the Prometheus text exposition format.
+
+Only the three metric types the app needs are implemented here, so ``/metrics``
+works without ``prometheus_client`` or any other server. Everything is updated
+from the event loop; the lock only guards against scrapes from other threads.
+"""
+
+from abc import ABC, abstractmethod
+from math import inf
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from yomigana_ebook.report import STAGES
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+JOB_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        """``(sample name, labels, value)`` of every sample to render."""
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.help)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+        if not self.labelnames:
+            self.values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._label_values(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        self.values[self._label_values(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (inf,)
+        # label values -> (bucket counts, sum)
+        self.values: Dict[LabelValues, Tuple[List[int], float]] = {}
+        if not self.labelnames:
+            self.values[()] = ([0] * len(self.buckets), 0.0)
+
+    def observe(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self.values[key] = (counts, total + value)
+
+    def samples(self):
+        for key, (counts, total) in sorted(self.values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": bound}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class ServiceMetrics:
+    """The metrics of the web demo; job metrics are fed by ``JobManager``."""
+
+    def __init__(self):
+        self.started_at = time()
+        self._lock = Lock()
+
+        self.request_duration = Histogram(
+            "yomigana_http_request_duration_seconds",
+            "Time until the response headers were sent, by route.",
+            REQUEST_BUCKETS,
+            ("method", "route", "status"),
+        )
+        self.jobs = Counter(
+            "yomigana_jobs_total",
+            "Finished jobs by final status and whether the result cache served them.",
+            ("status", "cache_hit"),
+        )
+        self.queue_wait = Histogram(
+            "yomigana_job_queue_wait_seconds",
+            "Time jobs spent in the queue before a runner picked them up.",
+            JOB_BUCKETS,
+        )
+        self.job_duration = Histogram(
+            "yomigana_job_duration_seconds",
+            "Conversion time of jobs that ran, by final status.",
+            JOB_BUCKETS,
+            ("status",),
+        )
+        self.input_bytes = Counter(
+            "yomigana_input_bytes_total", "Bytes of books converted by workers."
+        )
+        self.stage_seconds = Counter(
+            "yomigana_conversion_stage_seconds_total",
+            "Time spent per conversion stage; worker stages are summed over workers.",
+            ("stage",),
+        )
+        self.entries = Counter(
+            "yomigana_html_entries_total",
+            "HTML entries handled, by source of the result.",
+            ("source",),
+        )
+        self.chars = Counter(
+            "yomigana_characters_total", "Characters of text annotated by workers."
+        )
+        self.morphemes = Counter(
+            "yomigana_morphemes_total", "Morphemes annotated by workers."
+        )
+        self.tagger_cache = Counter(
+            "yomigana_tagger_cache_lookups_total",
+            "Reading cache lookups in the workers, by result.",
+            ("result",),
+        )
+        self.text_batch_size = Histogram(
+            "yomigana_text_batch_size",
+            "Requests annotated together by the /api/yomituki batcher.",
+            BATCH_SIZE_BUCKETS,
+        )
+        self.text_batch_duration = Histogram(
+            "yomigana_text_batch_duration_seconds",
+            "Time to annotate one batch of /api/yomituki requests.",
+            REQUEST_BUCKETS,
+        )
+        for stage in STAGES:
+            self.stage_seconds.inc(0, stage=stage)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            self.request_duration.observe(
+                seconds, method=method, route=route, status=str(status)
+            )
+
+    def observe_text_batch(self, size: int, seconds: float):
+        with self._lock:
+            self.text_batch_size.observe(size)
+            self.text_batch_duration.observe(seconds)
+
+    def observe_job_started(self, queue_wait: float):
+        with self._lock:
+            self.queue_wait.observe(queue_wait)
+
+    def observe_job_finished(self, job) -> None:
+        """Record a finished ``web_demo.jobs.Job``."""
+        with self._lock:
+            self.jobs.inc(status=job.status.value, cache_hit=str(job.cache_hit).lower())
+            if job.cache_hit or job.started_at is None:
+                return
+
+            self.job_duration.observe(
+                job.finished_at - job.started_at, status=job.status.value
+            )
+            report = job.report
+            if report is None:
+                return
+
+            self.input_bytes.inc(job.input_size)
+            for stage, seconds in report.stage_seconds.items():
+                self.stage_seconds.inc(seconds, stage=stage)
+            self.entries.inc(
+                report.converted_entries - report.cached_entries, source="worker"
+            )
+            self.entries.inc(report.cached_entries, source="entry_cache")
+            self.entries.inc(report.annotated_entries, source="already_annotated")
+            self.chars.inc(report.chars)
+            self.morphemes.inc(report.morphemes)
+            self.tagger_cache.inc(report.tagger_cache_hits, result="hit")
+            self.tagger_cache.inc(report.tagger_cache_misses, result="miss")
+
+    def render(self, jobs) -> str:
+        """Render all metrics, sampling the gauges from ``web_demo.jobs.JobManager``."""
+        with self._lock:
+            metrics: List[Metric] = [
+                self.request_duration,
+                self.jobs,
+                self.queue_wait,
+                self.job_duration,
+                self.input_bytes,
+                self.stage_seconds,
+                self.entries,
+                self.chars,
+                self.morphemes,
+                self.tagger_cache,
+                self.text_batch_size,
+                self.text_batch_duration,
+                *self._gauges(jobs),
+            ]
+            lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+    def _gauges(self, jobs) -> List[Metric]:
+        uptime = max(time() - self.started_at, 1e-9)
+        worker_seconds = sum(
+            self.stage_seconds.values[(stage,)]
+            for stage in ("parse", "annotate", "serialize")
+        )
+        lookups = sum(self.tagger_cache.values.values())
+
+        gauges = [
+            (
+                "yomigana_jobs_running",
+                "Jobs being converted.",
+                len(jobs.running_jobs()),
+            ),
+            (
+                "yomigana_jobs_queued",
+                "Jobs waiting for a runner.",
+                len(jobs.queued_jobs()),
+            ),
+            (
+                "yomigana_pool_workers",
+                "Size of the shared process pool.",
+                jobs.max_workers,
+            ),
+            (
+                "yomigana_pool_utilization",
+                "Share of worker time spent converting since the start.",
+                min(1.0, worker_seconds / (uptime * jobs.max_workers)),
+            ),
+            (
+                "yomigana_characters_per_worker_second",
+                "Characters annotated per second of worker time.",
+                _ratio(self.chars.values[()], worker_seconds),
+            ),
+            (
+                "yomigana_morphemes_per_worker_second",
+                "Morphemes annotated per second of worker time.",
+                _ratio(self.morphemes.values[()], worker_seconds),
+            ),
+            (
+                "yomigana_tagger_cache_hit_ratio",
+                "Share of reading lookups answered by the worker cache.",
+                _ratio(self.tagger_cache.values.get(("hit",), 0.0), lookups),
+            ),
+            (
+                "yomigana_estimated_wait_seconds",
+                "Estimated time until the queued and running work is done.",
+                jobs.estimated_wait(),
+            ),
+            (
+                "process_start_time_seconds",
+                "Start time of the process since the epoch.",
+                self.started_at,
+            ),
+        ]
+        if jobs.result_cache is not None:
+            result_cache = jobs.result_cache
+            gauges += [
+                (
+                    "yomigana_result_cache_bytes",
+                    "Size of the converted book cache.",
+                    result_cache.total_bytes,
+                ),
+                (
+                    "yomigana_result_cache_hit_ratio",
+                    "Share of uploads answered by the converted book cache.",
+                    _ratio(result_cache.hits, result_cache.hits + result_cache.misses),
+                ),
+            ]
+
+        metrics: List[Metric] = []
+        for name, help, value in gauges:
+            gauge = Gauge(name, help)
+            gauge.set(value)
+            metrics.append(gauge)
+        return metrics
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
+
+
+def _format_value(value: float) -> str:
+    if value == inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    pairs = (
+        f'{name}="{_escape_label(_format_value(value) if name == "le" else str(value))}"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n")
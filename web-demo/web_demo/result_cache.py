@@ -0,0 +1,115 @@
+"""Size-bounded on-disk LRU cache of converted books.
+
+Popular books get uploaded again and again. A converted book only depends on
+the uploaded bytes, the ``filter`` flag, the converter version and the
+dictionary, so their hash identifies the result; it doubles as the ``ETag``.
+"""
+
+from collections import OrderedDict
+from hashlib import sha256
+from os import makedirs, path, remove, replace, scandir, utime
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import IO, Optional
+
+from yomigana_ebook import __version__
+from yomigana_ebook.yomituki import dictionary_identity
+
+_SUFFIX = ".epub"
+
+
+def result_hasher(filter_non_japanese: bool):
+    """A sha256 object primed with everything but the uploaded bytes."""
+    digest = sha256()
+    digest.update(f"{__version__}\0{dictionary_identity()}\0".encode())
+    digest.update(b"filter\0" if filter_non_japanese else b"all\0")
+    return digest
+
+
+class ResultCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        # key -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+
+        makedirs(self.cache_dir, exist_ok=True)
+        entries = sorted(
+            (
+                entry
+                for entry in scandir(self.cache_dir)
+                if entry.name.endswith(_SUFFIX)
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in entries:
+            size = entry.stat().st_size
+            self._entries[entry.name.removesuffix(_SUFFIX)] = size
+            self._total_bytes += size
+        self._evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def open(self, key: str) -> Optional[IO[bytes]]:
+        """Open the cached result for ``key`` and mark it as recently used."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            entry_path = self._path(key)
+            try:
+                result = open(entry_path, "rb")
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        try:
+            # Persist the recency for the next start-up.
+            utime(entry_path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, result: IO[bytes]):
+        """Copy ``result`` (read from its current position) into the cache."""
+        with NamedTemporaryFile("wb", dir=self.cache_dir, delete=False) as f:
+            copyfileobj(result, f)
+            size = f.tell()
+
+        if size > self.max_bytes:
+            remove(f.name)
+            return
+
+        with self._lock:
+            replace(f.name, self._path(key))
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return path.join(self.cache_dir, key + _SUFFIX)
@@ -0,0 +1,111 @@
+"""Micro-batching of short text annotations on a warm in-process tagger.
+
+Sentences sent to ``POST /api/yomituki`` are far too small to be worth a trip
+through the process pool. They are annotated in this process instead, on one
+dedicated thread that owns the tagger.
+
+A request that finds the tagger idle is annotated right away, so a lone
+request never waits for a batch to fill up. Requests arriving while a batch is
+being annotated (typically for a few milliseconds) are collected and annotated
+together as the next batch, so under load a burst costs one thread hand-off
+instead of one per request, and repeated sentences are only tagged once.
+"""
+
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from yomigana_ebook.checking import contains_japanese
+from yomigana_ebook.yomituki import yomituki
+
+from web_demo.metrics import ServiceMetrics
+
+DEFAULT_MAX_BATCH_SIZE = 64
+
+_MARKUP_CHARS = re.compile(r"([&<>])")
+
+# (text, filter_non_japanese)
+Request = Tuple[str, bool]
+
+
+def annotate_text(text: str, filter_non_japanese: bool = False) -> str:
+    """Annotate plain ``text`` and return it as an HTML fragment."""
+    if filter_non_japanese and not contains_japanese(text):
+        return escape(text, quote=False)
+
+    # Characters that need escaping are kept away from the tagger, which
+    # would otherwise give "&" of "&amp;" an (empty) reading.
+    parts = _MARKUP_CHARS.split(text)
+    return "".join(
+        escape(part, quote=False) if i % 2 else "".join(yomituki(part))
+        for i, part in enumerate(parts)
+    )
+
+
+def annotate_batch(requests: List[Request]) -> List[str]:
+    annotated = {request: annotate_text(*request) for request in set(requests)}
+    return [annotated[request] for request in requests]
+
+
+class TextBatcher:
+    def __init__(
+        self,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.metrics = metrics
+        self._pending: List[Tuple[Request, "asyncio.Future[str]"]] = []
+        self._batch: Optional["asyncio.Task[None]"] = None
+        # The tagger is not thread-safe; a single thread also keeps it warm.
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="yomituki")
+
+    async def start(self):
+        # Load the dictionary pages and the tagger before the first request.
+        await self.annotate("漢字")
+
+    async def shutdown(self):
+        while self._batch is not None:
+            await asyncio.gather(self._batch, return_exceptions=True)
+        await asyncio.to_thread(self._executor.shutdown)
+
+    async def annotate(self, text: str, filter_non_japanese: bool = False) -> str:
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        self._pending.append(((text, filter_non_japanese), future))
+        if self._batch is None:
+            self._start_batch()
+        return await future
+
+    def _start_batch(self):
+        batch = self._pending[: self.max_batch_size]
+        del self._pending[: self.max_batch_size]
+        self._batch = asyncio.ensure_future(self._run_batch(batch))
+        self._batch.add_done_callback(self._on_batch_done)
+
+    def _on_batch_done(self, _task: "asyncio.Task[None]"):
+        self._batch = None
+        if self._pending:
+            self._start_batch()
+
+    async def _run_batch(self, batch: List[Tuple[Request, "asyncio.Future[str]"]]):
+        requests = [request for request, _ in batch]
+        start = perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, annotate_batch, requests
+            )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        if self.metrics is not None:
+            self.metrics.observe_text_batch(len(batch), perf_counter() - start)
+        for (_, future), result in zip(batch, results):
+            # The request may have been cancelled by a client disconnect.
+            if not future.done():
+                future.set_result(result)
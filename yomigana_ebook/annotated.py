@@ -0,0 +1,59 @@
+"""Cheap detection of content that already carries furigana.
+
+Converting our own output again, or a book whose publisher already ships
+furigana, costs a full parse and tagging pass for (almost) nothing. These
+checks run on raw bytes with a few regular expressions, before any HTML is
+parsed.
+"""
+
+import re
+from typing import IO
+from zipfile import ZipFile
+
+OUTPUT_MARKER_PREFIX = b"yomigana-ebook"
+
+# An entry counts as annotated when at least this share of its kanji sits
+# inside <ruby> elements.
+ANNOTATED_KANJI_RATIO = 0.9
+
+_RUBY_PATTERN = re.compile(rb"<ruby[\s>].*?</ruby\s*>", re.DOTALL | re.IGNORECASE)
+_TAG_PATTERN = re.compile(rb"<[^>]*>")
+_KANJI_PATTERN = re.compile("[\u4e00-\u9fff\u3005]")
+
+
+def output_marker(version: str) -> bytes:
+    """The zip comment written into every converted archive."""
+    return OUTPUT_MARKER_PREFIX + b" " + version.encode()
+
+
+def is_converted_archive(reader: IO[bytes]) -> bool:
+    """Return whether ``reader`` is an archive written by ``process_ebook``.
+
+    Only the zip central directory is read; the stream position is restored.
+    """
+    position = reader.tell()
+    try:
+        with ZipFile(reader, "r") as zip_reader:
+            return zip_reader.comment.startswith(OUTPUT_MARKER_PREFIX)
+    finally:
+        reader.seek(position)
+
+
+def is_annotated_html(content: bytes, ratio: float = ANNOTATED_KANJI_RATIO) -> bool:
+    """Return whether most kanji in an HTML entry already have ``<ruby>`` readings."""
+    if b"<ruby" not in content and b"<RUBY" not in content:
+        return False
+
+    ruby_kanji = 0
+    for ruby in _RUBY_PATTERN.findall(content):
+        ruby_kanji += _count_kanji(ruby)
+    if not ruby_kanji:
+        return False
+
+    bare_kanji = _count_kanji(_RUBY_PATTERN.sub(b"", content))
+    return ruby_kanji >= ratio * (ruby_kanji + bare_kanji)
+
+
+def _count_kanji(markup: bytes) -> int:
+    text = _TAG_PATTERN.sub(b"", markup).decode("utf-8", "ignore")
+    return len(_KANJI_PATTERN.findall(text))
@@ -0,0 +1,82 @@
+"""Content-addressed cache of converted HTML entries.
+
+A converted entry only depends on its source bytes, the conversion options,
+the converter version and the dictionary, so those make up the cache key.
+Re-running a batch or converting a revised edition of a book then only
+re-processes the entries that actually changed.
+"""
+
+from hashlib import sha256
+from os import makedirs, path, replace
+from tempfile import NamedTemporaryFile
+from typing import Optional
+
+from yomigana_ebook import __version__
+from yomigana_ebook.vocabulary import WordCounts, dump_counts, load_counts
+from yomigana_ebook.yomituki import dictionary_identity
+
+
+class EntryCache:
+    """Directory-backed cache of converted HTML entries.
+
+    Entries are stored as ``<cache_dir>/<key[:2]>/<key>`` and written
+    atomically, so several processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = path.abspath(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        makedirs(self.cache_dir, exist_ok=True)
+
+    def key(
+        self,
+        content: bytes,
+        filter_non_japanese: bool = False,
+        kanji_level: Optional[str] = None,
+        compact_ruby: bool = False,
+    ) -> str:
+        digest = sha256()
+        digest.update(f"{__version__}\0{dictionary_identity()}\0".encode())
+        digest.update(b"filter\0" if filter_non_japanese else b"all\0")
+        if kanji_level is not None or compact_ruby:
+            # Left out by default, so existing caches stay valid.
+            digest.update(f"ruby:{kanji_level}:{compact_ruby}\0".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._write(self._path(key), data)
+
+    def get_words(self, key: str) -> Optional[WordCounts]:
+        """The word counts stored with an entry, see ``yomigana_ebook.vocabulary``."""
+        try:
+            with open(f"{self._path(key)}.words", "rb") as f:
+                return load_counts(f.read())
+        except FileNotFoundError:
+            return None
+
+    def put_words(self, key: str, words: WordCounts) -> None:
+        self._write(f"{self._path(key)}.words", dump_counts(words))
+
+    def _path(self, key: str) -> str:
+        return path.join(self.cache_dir, key[:2], key)
+
+    def _write(self, entry_path: str, data: bytes) -> None:
+        entry_dir = path.dirname(entry_path)
+        makedirs(entry_dir, exist_ok=True)
+
+        with NamedTemporaryFile("wb", dir=entry_dir, delete=False) as f:
+            f.write(data)
+        replace(f.name, entry_path)
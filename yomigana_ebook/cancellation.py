@@ -0,0 +1,61 @@
+"""Cooperative cancellation and deadlines for ``process_ebook``.
+
+A conversion checks its ``CancelToken`` and deadline between entries and while
+it waits for workers. Entries that were not started yet are cancelled. Entries
+already running in a process pool are stopped by terminating their workers,
+also in a shared ``RecyclingExecutor``, whose other workers keep running.
+Thread pools finish their running entries, at most ``max_in_flight``.
+"""
+
+from threading import Event
+from time import monotonic
+from typing import Optional
+
+# How often a conversion waiting for workers checks its token and deadline.
+POLL_INTERVAL = 0.1
+
+
+class ConversionCancelled(Exception):
+    """Raised by ``process_ebook`` when its token was cancelled."""
+
+
+class DeadlineExceeded(ConversionCancelled):
+    """Raised by ``process_ebook`` when its deadline has passed."""
+
+
+class CancelToken:
+    """Thread-safe flag a caller sets to stop a running conversion."""
+
+    def __init__(self):
+        self._event = Event()
+        self.reason = "the conversion was cancelled"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: Optional[str] = None):
+        if reason:
+            self.reason = reason
+        self._event.set()
+
+
+def check_cancelled(
+    cancel_token: Optional[CancelToken], deadline: Optional[float]
+) -> None:
+    """Raise when ``cancel_token`` was cancelled or the ``monotonic()`` deadline passed."""
+    if cancel_token is not None and cancel_token.cancelled:
+        raise ConversionCancelled(cancel_token.reason)
+    if deadline is not None and monotonic() >= deadline:
+        raise DeadlineExceeded("the conversion exceeded its deadline")
+
+
+def poll_timeout(
+    cancel_token: Optional[CancelToken], deadline: Optional[float]
+) -> Optional[float]:
+    """How long to block before checking again; None when nothing can stop us."""
+    if cancel_token is None and deadline is None:
+        return None
+    if deadline is None:
+        return POLL_INTERVAL
+    return max(0.0, min(POLL_INTERVAL, deadline - monotonic()))
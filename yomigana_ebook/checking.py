@@ -66,3 +66,13 @@ def contains_japanese_script(text: str) -> bool:
         if char == "\u3005":
             return True
     return False
+
+
+def contains_kanji(text: str) -> bool:
+    # Range checks like contains_japanese_script; runs once per morpheme.
+    for char in text:
+        if "一" <= char <= "鿿" or "㐀" <= char <= "䶿":
+            return True
+        if char == "々" or "豈" <= char <= "﫿":
+            return True
+    return False
@@ -1,9 +1,29 @@
-from typing import List
+from typing import List, Optional
 from argparse import ArgumentParser
-from os import path
-from time import time
+from concurrent.futures import Executor
+from dataclasses import replace
+from multiprocessing import Process
+from os import cpu_count, environ, path, makedirs
+from time import time, time_ns
 
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.distributed import QueueExecutor, TaskQueue, run_worker
+from yomigana_ebook.governor import Governor, lower_priority
+from yomigana_ebook.kanji_levels import KANJI_LEVELS
+from yomigana_ebook.options import ANNOTATED_POLICIES, BACKENDS, ConversionOptions
+from yomigana_ebook.overrides import ReadingOverrides
+from yomigana_ebook.library import convert_library, log_fallbacks
 from yomigana_ebook.process_ebook import process_ebook
+from yomigana_ebook.profiling import merge_profiles
+from yomigana_ebook.vocabulary import VOCABULARY_FORMATS, Vocabulary, vocabulary_path
+from yomigana_ebook.recycling import WORKER_MAX_RSS_ENV, WORKER_MAX_TASKS_ENV
+from yomigana_ebook.yomituki import (
+    DEFAULT_WORD_CACHE_SIZE,
+    READINGS_ENV,
+    WORD_CACHE_SIZE_ENV,
+    set_reading_overrides,
+    set_word_cache_size,
+)
 
 
 def main():
@@ -14,16 +34,275 @@ def main():
     parser.add_argument(
         "-f", "--filter", action="store_true", help="Filter non-Japanese paragraphs"
     )
+    parser.add_argument(
+        "--annotated",
+        choices=ANNOTATED_POLICIES,
+        default="skip",
+        help="Books and html files that already have furigana: skip them (default) "
+        "or annotate only the text that has no furigana yet",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Profile the worker processes with cProfile and write .pstats files to DIR",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="Reuse converted HTML entries cached in DIR and only process changed ones",
+    )
+    parser.add_argument(
+        "--library",
+        metavar="DIR",
+        help="Convert every epub under DIR into a mirrored tree (requires --output)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="DIR",
+        help="Output directory for --library; books that are already current are skipped",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=2,
+        help="Number of books converted in parallel in --library mode (default: 2)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Use at most N worker processes (default: all CPUs, half of them with --background)",
+    )
+    parser.add_argument(
+        "--background",
+        action="store_true",
+        help="Run the workers at low CPU and IO priority and use fewer of them "
+        "while the system is busy, so the machine stays responsive (threads of "
+        "--backend thread or auto keep the normal priority)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="process",
+        help="Run the workers as processes (default) or threads; auto uses threads "
+        "for small books, where starting processes may cost more than it saves "
+        "(--library always shares one process pool)",
+    )
+    parser.add_argument(
+        "--readings",
+        metavar="FILE",
+        help="TSV file of surface<TAB>reading pairs that override the dictionary, "
+        "e.g. for character names",
+    )
+    parser.add_argument(
+        "--kanji-level",
+        choices=KANJI_LEVELS,
+        help="Leave words bare whose kanji are all taught up to this school grade "
+        "(grade1-grade6, joyo) or tested up to this JLPT level (n5-n1)",
+    )
+    parser.add_argument(
+        "--compact-ruby",
+        action="store_true",
+        help="Merge adjacent furigana, e.g. one ruby for 第一部 instead of three",
+    )
+    parser.add_argument(
+        "--entry-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Time limit per html file, retries included; a file over it is "
+        "copied through unannotated",
+    )
+    parser.add_argument(
+        "--entry-memory",
+        type=int,
+        metavar="MB",
+        help="Memory limit per html file in MiB; a file over it is retried in a "
+        "low-memory mode, then copied through unannotated",
+    )
+    parser.add_argument(
+        "--vocabulary",
+        choices=VOCABULARY_FORMATS,
+        help="Also write the words with kanji of each book, with their readings "
+        "and frequencies, to <book>.words.json or <book>.words.sqlite",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="Keep fewer html files in flight while their estimated memory use "
+        "(plus converted files waiting to be written) would exceed MB MiB per book",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Measure peak memory of parsing, annotating and serializing with "
+        "tracemalloc (much slower)",
+    )
+    parser.add_argument(
+        "--worker-max-tasks",
+        type=int,
+        metavar="N",
+        help="In library mode, replace each worker process after it converted "
+        "N html files",
+    )
+    parser.add_argument(
+        "--worker-max-rss",
+        type=int,
+        metavar="MB",
+        help="In library mode, replace each worker process once it has used MB MiB",
+    )
+    parser.add_argument(
+        "--word-cache-size",
+        type=int,
+        metavar="N",
+        help="Words kept in each per-process reading cache "
+        f"(default {DEFAULT_WORD_CACHE_SIZE})",
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="DB",
+        help="Coordinate: put the html files into the SQLite task queue DB "
+        "instead of converting them here, and assemble the ebooks from the results",
+    )
+    parser.add_argument(
+        "--queue-worker",
+        metavar="DB",
+        help="Run --workers worker processes (default: all CPUs) that convert "
+        "tasks from the SQLite task queue DB; use the same --readings as the "
+        "coordinator",
+    )
     args = parser.parse_args()
+    options = ConversionOptions(
+        filter_non_japanese=args.filter,
+        annotated_policy=args.annotated,
+        kanji_level=args.kanji_level,
+        compact_ruby=args.compact_ruby,
+        entry_time_limit=args.entry_timeout,
+        entry_memory_limit=args.entry_memory and args.entry_memory * 1024 * 1024,
+        backend=args.backend,
+        memory_budget=args.memory_budget and args.memory_budget * 1024 * 1024,
+        trace_memory=args.trace_memory,
+    )
+
+    if args.readings:
+        use_reading_overrides(args.readings)
+    # Worker processes read these settings from the environment.
+    if args.worker_max_tasks is not None:
+        environ[WORKER_MAX_TASKS_ENV] = str(args.worker_max_tasks)
+    if args.worker_max_rss is not None:
+        environ[WORKER_MAX_RSS_ENV] = str(args.worker_max_rss)
+    if args.word_cache_size is not None:
+        set_word_cache_size(args.word_cache_size)
+        environ[WORD_CACHE_SIZE_ENV] = str(args.word_cache_size)
+
+    governor = None
+    if args.background:
+        governor = Governor.background(args.workers)
+        # --library and the queue always convert in worker processes.
+        processes = args.library or args.queue or args.queue_worker
+        if args.backend != "process" and not processes:
+            print(
+                "[warn]  --background cannot lower the priority of the threads "
+                f"of --backend {args.backend}, only of worker processes"
+            )
+    elif args.workers:
+        governor = Governor(args.workers)
+
+    if args.queue_worker:
+        count = args.workers or (governor.max_workers if governor else cpu_count())
+        run_queue_workers(args.queue_worker, count or 1, governor)
+        exit(0)
+
+    executor = QueueExecutor(TaskQueue(args.queue)) if args.queue else None
+
+    if args.library:
+        if not args.output:
+            parser.error("--library requires --output")
+        result = process_library(
+            args.library,
+            args.output,
+            jobs=args.jobs,
+            cache_dir=args.cache,
+            options=options,
+            governor=governor,
+            vocabulary_format=args.vocabulary,
+            executor=executor,
+        )
+        exit(1 if result.failed else 0)
 
     if args.ebook_paths:
-        process_ebooks(args.ebook_paths, args.filter)
+        process_ebooks(
+            args.ebook_paths,
+            options=options,
+            profile_dir=args.profile,
+            cache_dir=args.cache,
+            governor=governor,
+            vocabulary_format=args.vocabulary,
+            executor=executor,
+        )
         exit(0)
 
     parser.print_help()
 
 
-def process_ebooks(arg_paths: List[str], filter_non_japanese: bool = False):
+def use_reading_overrides(file_path: str):
+    file_path = path.abspath(file_path)
+    overrides = ReadingOverrides.from_tsv(file_path)
+    set_reading_overrides(overrides)
+    # Worker processes load the overrides themselves.
+    environ[READINGS_ENV] = file_path
+    print(f"[info]  {len(overrides)} reading overrides from {file_path}")
+
+
+def run_queue_workers(db_path: str, count: int, governor: Optional[Governor] = None):
+    queue = TaskQueue(db_path)
+    priority = (governor.nice, governor.idle_io) if governor is not None else None
+    workers = [
+        Process(target=_run_queue_worker, args=(queue, priority)) for _ in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def _run_queue_worker(queue: TaskQueue, priority: Optional[tuple[int, bool]]):
+    # Lowered in the worker itself, so the parent keeps its priority.
+    if priority is not None:
+        lower_priority(*priority)
+    run_worker(queue)
+
+
+def process_ebooks(
+    arg_paths: List[str],
+    filter_non_japanese: bool = False,
+    *,
+    options: Optional[ConversionOptions] = None,
+    profile_dir: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    governor: Optional[Governor] = None,
+    vocabulary_format: Optional[str] = None,
+    executor: Optional[Executor] = None,
+):
+    """Convert each EPUB in ``arg_paths`` to ``with-yomigana_<name>`` next to it.
+
+    ``filter_non_japanese`` is the same as ``options.filter_non_japanese``;
+    either turns the filter on.
+    """
+    if options is None:
+        options = ConversionOptions(filter_non_japanese=filter_non_japanese)
+    elif filter_non_japanese:
+        options = replace(options, filter_non_japanese=True)
+
+    profile_start_ns = time_ns()
+    if profile_dir is not None:
+        profile_dir = path.abspath(profile_dir)
+        makedirs(profile_dir, exist_ok=True)
+
+    cache = EntryCache(cache_dir) if cache_dir is not None else None
+
     for arg_path in arg_paths:
         file_path = path.abspath(arg_path)
         file_dir = path.dirname(file_path)
@@ -34,16 +313,93 @@ def process_ebooks(arg_paths: List[str], filter_non_japanese: bool = False):
             start_time = time()
             print()
             print(f"[start] parsing the ebook: {file_path}")
-            if filter_non_japanese:
+            if options.filter_non_japanese:
                 print("[info]  filtering non-Japanese paragraphs")
 
-            process_ebook(f_reader, f_writer, filter_non_japanese)
+            if cache is not None:
+                cache.hits = cache.misses = 0
+            vocabulary = Vocabulary() if vocabulary_format is not None else None
+
+            report = process_ebook(
+                f_reader,
+                f_writer,
+                options=options,
+                profile_dir=profile_dir,
+                cache=cache,
+                governor=governor,
+                vocabulary=vocabulary,
+                executor=executor,
+            )
 
             end_time = time() - start_time
+            if cache is not None:
+                print(
+                    f"[cache] {cache.hits} cached / {cache.misses} converted html files"
+                )
+            if options.kanji_level is not None or options.compact_ruby:
+                print(
+                    f"[ruby]  {report.ruby_bytes_saved / 1024:.1f} KiB of ruby markup "
+                    "saved (cached html files not counted)"
+                )
+            log_fallbacks(report)
+            print(f"[memory] {report.memory_summary()}")
+            if vocabulary is not None:
+                assert vocabulary_format is not None
+                words_path = vocabulary_path(output_path, vocabulary_format)
+                vocabulary.save(words_path)
+                print(f"[words] {len(vocabulary)} words with kanji: {words_path}")
             print(f"[done]  here's the parsed ebook: {output_path}")
             print(f"this ebook takes {end_time} secs to process.")
             print()
 
+    if profile_dir is not None:
+        print_profile_report(profile_dir, profile_start_ns)
+
+
+def process_library(
+    input_dir: str,
+    output_dir: str,
+    filter_non_japanese: bool = False,
+    jobs: int = 2,
+    cache_dir: Optional[str] = None,
+    *,
+    options: Optional[ConversionOptions] = None,
+    governor: Optional[Governor] = None,
+    vocabulary_format: Optional[str] = None,
+    executor: Optional[Executor] = None,
+):
+    start_time = time()
+    cache = EntryCache(cache_dir) if cache_dir is not None else None
+    result = convert_library(
+        input_dir,
+        output_dir,
+        filter_non_japanese,
+        jobs=jobs,
+        cache=cache,
+        options=options,
+        governor=governor,
+        vocabulary_format=vocabulary_format,
+        executor=executor,
+    )
+
+    print(
+        f"[library] converted {len(result.converted)}, skipped {len(result.skipped)}, "
+        f"failed {len(result.failed)} in {time() - start_time:.2f} secs"
+    )
+    for relative_path, error in result.failed:
+        print(f"[error] {relative_path}: {error}")
+    return result
+
+
+def print_profile_report(profile_dir: str, since_ns: int = 0, limit: int = 30):
+    stats = merge_profiles(profile_dir, since_ns)
+    if stats is None:
+        print(f"[profile] no profiles were written to {profile_dir}")
+        return
+
+    print(f"[profile] merged worker profiles: {profile_dir}")
+    stats.sort_stats("cumulative").print_stats(limit)
+
 
 if __name__ == "__main__":
     main()
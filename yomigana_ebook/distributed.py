@@ -0,0 +1,352 @@
+"""Conversions spread over several machines through a shared SQLite queue.
+
+A ``QueueExecutor`` stands in for the process pool of ``process_ebook`` or
+``convert_library``: every HTML entry becomes a task in a SQLite database,
+and the calling process (the coordinator) assembles the output EPUBs from
+the results as usual. ``run_worker`` processes on any host that can open the
+database claim tasks, convert them and store the results; no broker runs
+anywhere. Workers must run the same version of yomigana_ebook with the same
+dictionary and reading overrides, or the output depends on who converted it.
+
+Tasks and results are plain data: a task is the name and HTML of an entry
+with the options of ``convert_html`` as JSON, a result the converted HTML
+with its counts as JSON. Neither side runs code it reads from the database,
+but whoever can write to it decides the output. It must live on a filesystem
+with working locks; a task whose worker stops renewing its lease is handed
+to another worker.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from dataclasses import fields
+from functools import partial
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from yomigana_ebook.limits import enforce_entry_limits
+from yomigana_ebook.process_ebook import convert_html, warm_up_tagger
+from yomigana_ebook.report import EntryResult
+
+# Seconds a claimed task stays with its worker without a heartbeat.
+DEFAULT_LEASE = 60.0
+# Claims of a task before it is failed instead of handed out again, so an
+# entry that kills its workers does not take down every worker in turn.
+MAX_ATTEMPTS = 3
+LOST_ERROR = f"task lost its worker {MAX_ATTEMPTS} times"
+
+# Keyword arguments of convert_html a task may carry.
+TASK_OPTIONS = (
+    "filter_non_japanese",
+    "kanji_level",
+    "compact_ruby",
+    "time_limit",
+    "memory_limit",
+    "collect_words",
+    "trace_memory",
+)
+
+# (id, entry name, HTML, options as JSON)
+Task = Tuple[int, str, bytes, str]
+# (id, entry name, converted HTML or None, result as JSON)
+TaskResult = Tuple[int, str, Optional[bytes], str]
+
+
+class TaskQueue:
+    """SQLite database of HTML entries to convert and their results."""
+
+    def __init__(self, db_path: str, lease: float = DEFAULT_LEASE):
+        self.db_path = os.path.abspath(db_path)
+        self.lease = lease
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id INTEGER PRIMARY KEY, "
+                "entry TEXT NOT NULL, "
+                "content BLOB, "
+                "options TEXT, "
+                "state TEXT NOT NULL DEFAULT 'pending', "
+                "worker TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "renewed_at REAL, "
+                "result TEXT)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(tasks)")}
+            if "entry" not in columns:
+                raise ValueError(
+                    f"{self.db_path} holds pickled tasks of an older version; "
+                    "use a new queue database"
+                )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, id)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        # One connection per call: the executor uses the queue from several
+        # threads, and workers may be forked from a process that opened it.
+        connection = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def put(self, entry: str, content: bytes, options: str) -> int:
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO tasks (entry, content, options) VALUES (?, ?, ?)",
+                (entry, content, options),
+            )
+        assert cursor.lastrowid is not None
+        return cursor.lastrowid
+
+    def claim(self, worker: str) -> Optional[Task]:
+        """Take the oldest pending task, or one whose lease ran out."""
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                expired = time() - self.lease
+                connection.execute(
+                    "UPDATE tasks SET state = 'failed', content = NULL, "
+                    "options = NULL, result = ? WHERE state = 'claimed' "
+                    "AND renewed_at < ? AND attempts >= ?",
+                    (_error_result(LOST_ERROR), expired, MAX_ATTEMPTS),
+                )
+                row = connection.execute(
+                    "SELECT id, entry, content, options FROM tasks "
+                    "WHERE state = 'pending' "
+                    "OR (state = 'claimed' AND renewed_at < ?) ORDER BY id LIMIT 1",
+                    (expired,),
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE tasks SET state = 'claimed', worker = ?, "
+                        "attempts = attempts + 1, renewed_at = ? WHERE id = ?",
+                        (worker, time(), row[0]),
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return None if row is None else (row[0], row[1], row[2], row[3])
+
+    def renew(self, task_id: int, worker: str):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE tasks SET renewed_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'claimed'",
+                (time(), task_id, worker),
+            )
+
+    def finish(self, task_id: int, worker: str, content: Optional[bytes], result: str):
+        # Does nothing if the task was cancelled or handed to another worker.
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE tasks SET state = 'done', content = ?, options = NULL, "
+                "result = ? WHERE id = ? AND worker = ? AND state = 'claimed'",
+                (content, result, task_id, worker),
+            )
+
+    def take_results(self, task_ids: List[int]) -> List[TaskResult]:
+        """Remove and return the results that are ready among ``task_ids``."""
+        results: List[TaskResult] = []
+        with self._connect() as connection:
+            # Stay well below SQLite's limit on query parameters.
+            for start in range(0, len(task_ids), 500):
+                chunk = task_ids[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT id, entry, content, result FROM tasks WHERE id IN ({marks}) "
+                    "AND state IN ('done', 'failed')",
+                    chunk,
+                ).fetchall()
+                connection.executemany(
+                    "DELETE FROM tasks WHERE id = ?", [(row[0],) for row in rows]
+                )
+                results.extend(rows)
+        return results
+
+    def cancel(self, task_id: int):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def counts(self) -> Dict[str, int]:
+        """Tasks per state."""
+        with self._connect() as connection:
+            return dict(
+                connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state")
+            )
+
+
+class QueueExecutor(Executor):
+    """Executor whose tasks are run by ``run_worker`` processes on any host.
+
+    It only runs ``convert_html(file, content, **options)``, possibly as a
+    ``functools.partial``, with the options in ``TASK_OPTIONS``.
+    """
+
+    def __init__(self, queue: TaskQueue, poll_interval: float = 0.2):
+        self.queue = queue
+        self.poll_interval = poll_interval
+
+        self._lock = Lock()
+        self._futures: Dict[int, Future] = {}
+        self._poller: Optional[Thread] = None
+        self._shutdown = False
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        entry, content, options = _task_of(fn, args, kwargs)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            task_id = self.queue.put(entry, content, options)
+            future: Future = Future()
+            self._futures[task_id] = future
+            if self._poller is None:
+                self._poller = Thread(
+                    target=self._poll, name="yomigana-queue", daemon=True
+                )
+                self._poller.start()
+        future.add_done_callback(lambda future: self._forget(task_id, future))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            futures = list(self._futures.values())
+            poller = self._poller
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+        if wait and poller is not None:
+            poller.join()
+
+    def _forget(self, task_id: int, future: Future):
+        if future.cancelled():
+            with self._lock:
+                self._futures.pop(task_id, None)
+            self.queue.cancel(task_id)
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                if not self._futures:
+                    self._poller = None
+                    return
+                task_ids = list(self._futures)
+
+            for task_id, entry, content, result in self.queue.take_results(task_ids):
+                with self._lock:
+                    future = self._futures.pop(task_id, None)
+                if future is None or not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(_entry_result(entry, content, result))
+                except Exception as exc:  # noqa: BLE001 - fails this entry only
+                    future.set_exception(exc)
+            sleep(self.poll_interval)
+
+
+def run_worker(
+    queue: TaskQueue,
+    max_tasks: Optional[int] = None,
+    idle_timeout: Optional[float] = None,
+    poll_interval: float = 0.5,
+    log: Optional[Callable[[str], None]] = print,
+) -> int:
+    """Run tasks from ``queue`` until ``max_tasks`` are done or it stays empty
+    for ``idle_timeout`` seconds; by default forever. Returns the tasks run."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    enforce_entry_limits()
+    warm_up_tagger()
+    if log is not None:
+        log(f"[info]  worker {worker} ready: {queue.db_path}")
+
+    done = 0
+    idle_since = monotonic()
+    while max_tasks is None or done < max_tasks:
+        task = queue.claim(worker)
+        if task is None:
+            if idle_timeout is not None and monotonic() - idle_since >= idle_timeout:
+                break
+            sleep(poll_interval)
+            continue
+
+        task_id, entry, content, options = task
+        with _renewing(queue, task_id, worker):
+            converted, result = _run_task(entry, content, options)
+        queue.finish(task_id, worker, converted, result)
+        done += 1
+        idle_since = monotonic()
+    return done
+
+
+def _task_of(fn, args: tuple, kwargs: dict) -> Tuple[str, bytes, str]:
+    """Entry name, HTML and JSON options of a ``convert_html`` call."""
+    if isinstance(fn, partial):
+        fn, args, kwargs = fn.func, fn.args + args, {**fn.keywords, **kwargs}
+    if fn is not convert_html or len(args) != 2 or not set(kwargs) <= set(TASK_OPTIONS):
+        raise TypeError(
+            "a QueueExecutor only runs convert_html(file, content, **options)"
+        )
+    entry, content = args
+    return entry, content, json.dumps(kwargs)
+
+
+def _run_task(entry: str, content: bytes, options: str) -> Tuple[Optional[bytes], str]:
+    """The converted HTML and the result of a task, or None and an error."""
+    try:
+        kwargs = json.loads(options)
+        if not isinstance(kwargs, dict) or not set(kwargs) <= set(TASK_OPTIONS):
+            raise ValueError(f"invalid task options: {options[:200]!r}")
+        converted = convert_html(entry, content, **kwargs)
+    except Exception as exc:  # noqa: BLE001 - reported to the coordinator
+        return None, _error_result(f"{type(exc).__name__}: {exc}")
+
+    result: Dict[str, Any] = {
+        field.name: getattr(converted, field.name)
+        for field in fields(EntryResult)
+        if field.name not in ("file", "content")
+    }
+    if converted.words is not None:
+        result["words"] = [[*word, count] for word, count in converted.words.items()]
+    return converted.content, json.dumps({"entry": result})
+
+
+def _entry_result(entry: str, content: Optional[bytes], result: str) -> EntryResult:
+    data = json.loads(result)
+    if "error" in data:
+        raise RuntimeError(f"{entry}: {data['error']}")
+    values = data["entry"]
+    if values.get("words") is not None:
+        values["words"] = {
+            (word, reading): count for word, reading, count in values["words"]
+        }
+    return EntryResult(entry, content or b"", **values)
+
+
+@contextmanager
+def _renewing(queue: TaskQueue, task_id: int, worker: str):
+    """Renew the lease of the task while the block runs."""
+    stopped = Event()
+
+    def renew():
+        while not stopped.wait(queue.lease / 3):
+            queue.renew(task_id, worker)
+
+    thread = Thread(target=renew, name="yomigana-lease", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _error_result(message: str) -> str:
+    return json.dumps({"error": message})
@@ -0,0 +1,44 @@
+"""Just enough EPUB structure to know the reading order of a book."""
+
+from posixpath import dirname, join, normpath
+from typing import Dict, List
+from urllib.parse import unquote
+from xml.etree.ElementTree import ParseError, fromstring
+from zipfile import ZipFile
+
+CONTAINER_PATH = "META-INF/container.xml"
+
+_CONTAINER_NS = "{urn:oasis:names:tc:opendocument:xmlns:container}"
+_OPF_NS = "{http://www.idpf.org/2007/opf}"
+
+
+def spine_order(zip_reader: ZipFile) -> List[str]:
+    """Return the archive names of the spine documents in reading order.
+
+    Returns an empty list when the book has no readable container or package
+    document; callers then keep the archive order.
+    """
+    try:
+        container = fromstring(zip_reader.read(CONTAINER_PATH))
+        rootfile = container.find(f"{_CONTAINER_NS}rootfiles/{_CONTAINER_NS}rootfile")
+        if rootfile is None or not rootfile.get("full-path"):
+            return []
+
+        opf_path = rootfile.get("full-path", "")
+        package = fromstring(zip_reader.read(opf_path))
+    except (KeyError, ParseError):
+        return []
+
+    opf_dir = dirname(opf_path)
+    hrefs: Dict[str, str] = {}
+    for item in package.iterfind(f"{_OPF_NS}manifest/{_OPF_NS}item"):
+        item_id, href = item.get("id"), item.get("href")
+        if item_id and href:
+            hrefs[item_id] = normpath(join(opf_dir, unquote(href.split("#")[0])))
+
+    spine: List[str] = []
+    for itemref in package.iterfind(f"{_OPF_NS}spine/{_OPF_NS}itemref"):
+        href = hrefs.get(itemref.get("idref", ""))
+        if href is not None and href not in spine:
+            spine.append(href)
+    return spine
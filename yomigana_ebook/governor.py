@@ -0,0 +1,125 @@
+"""Keep background conversions from taking over the machine.
+
+A ``Governor`` caps the worker processes, runs them at a low CPU and IO
+priority, and hands out worker slots to ``process_ebook`` calls. With
+``adaptive`` set, fewer slots are handed out while other programs keep the
+CPUs busy (judged by the load average), trading throughput for a responsive
+desktop or build host.
+"""
+
+import ctypes
+import os
+import platform
+import sys
+from threading import Condition
+from time import monotonic
+from typing import Optional
+
+# Load averages only move every few seconds; sampling more often is pointless.
+LOAD_SAMPLE_INTERVAL = 5.0
+DEFAULT_NICE = 10
+
+# ioprio_set(2) is not exposed by the os module.
+_IOPRIO_SET_SYSCALLS = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+_BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+# Lowers the CPU, IO and memory priority of the process.
+_PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000
+
+
+class Governor:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        nice: int = 0,
+        idle_io: bool = False,
+        adaptive: bool = False,
+    ):
+        self.cpus = os.cpu_count() or 1
+        self.max_workers = max(1, min(max_workers or self.cpus, self.cpus))
+        self.nice = nice
+        self.idle_io = idle_io
+        self.adaptive = adaptive and hasattr(os, "getloadavg")
+
+        self._condition = Condition()
+        self._in_flight = 0
+        self._limit = self.max_workers
+        self._sampled_at = -LOAD_SAMPLE_INTERVAL
+
+    @classmethod
+    def background(cls, max_workers: Optional[int] = None) -> "Governor":
+        """Half of the CPUs (unless ``max_workers`` is given) at low priority."""
+        cpus = os.cpu_count() or 1
+        return cls(
+            max_workers or max(1, cpus // 2),
+            nice=DEFAULT_NICE,
+            idle_io=True,
+            adaptive=True,
+        )
+
+    def worker_limit(self) -> int:
+        """Worker slots that may be in use right now."""
+        if not self.adaptive:
+            return self.max_workers
+
+        with self._condition:
+            now = monotonic()
+            if now - self._sampled_at >= LOAD_SAMPLE_INTERVAL:
+                self._sampled_at = now
+                # Our own running entries count towards the load as well.
+                other_load = max(0.0, os.getloadavg()[0] - self._in_flight)
+                free_cpus = self.cpus - round(other_load)
+                self._limit = max(1, min(self.max_workers, free_cpus))
+            return self._limit
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take a worker slot; False when none got free within ``timeout``."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            while self._in_flight >= self.worker_limit():
+                remaining = LOAD_SAMPLE_INTERVAL
+                if deadline is not None:
+                    remaining = min(remaining, deadline - monotonic())
+                    if remaining <= 0:
+                        return False
+                # Woken up by release(); the timeout also picks up a new limit.
+                self._condition.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    def release(self, _future=None):
+        """Give a slot back; usable as a future's done callback."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+
+def lower_priority(nice: int = DEFAULT_NICE, idle_io: bool = True):
+    """Lower the CPU (and optionally IO) priority of the current process.
+
+    Best effort: unsupported platforms keep their priority.
+    """
+    if sys.platform == "win32":
+        mode = _PROCESS_MODE_BACKGROUND_BEGIN if idle_io else None
+        if mode is None and nice > 0:
+            mode = _BELOW_NORMAL_PRIORITY_CLASS
+        if mode is not None:
+            kernel32 = ctypes.windll.kernel32  # type: ignore
+            kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), mode)
+        return
+
+    if nice > 0:
+        os.nice(nice)
+
+    syscall = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if idle_io and sys.platform.startswith("linux") and syscall is not None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.syscall(
+            syscall,
+            _IOPRIO_WHO_PROCESS,
+            0,
+            _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT,
+        )
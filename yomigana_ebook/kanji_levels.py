@@ -0,0 +1,185 @@
+"""Kanji taught by school grade and tested by JLPT level.
+
+Used by ``--kanji-level`` to leave words bare that a reader at that level is
+expected to know. Each level lists only the kanji it adds to the one before:
+school grades 1-6 (kyōiku kanji, 2020 curriculum) followed by the rest of the
+jōyō kanji (2010), and JLPT N5 down to N1 (tanos.co.uk lists).
+
+Generated from the kanji-lists 0.2.0 package (MIT License, Daniel Lemm).
+"""
+
+from functools import lru_cache
+from typing import FrozenSet
+
+_GRADES = {
+    "grade1": (
+        "一七三上下中九二五人休先入八六円出力十千口右名四土夕大天女子字学小山川左"
+        "年手文日早月木本村林校森正気水火犬玉王生田男町白百目石空立竹糸耳花草虫見"
+        "貝赤足車金雨青音"
+    ),
+    "grade2": (
+        "万丸交京今会体何作元兄光公内冬刀分切前北午半南原友古台合同回図国園地場声"
+        "売夏外多夜太妹姉室家寺少岩工市帰広店弓引弟弱強当形後心思戸才教数新方明星"
+        "春昼時晴曜書朝来東楽歌止歩母毎毛池汽活海点父牛理用画番直矢知社秋科答算米"
+        "紙細組絵線羽考聞肉自船色茶行西親角言計記話語読谷買走近通週道遠里野長門間"
+        "雪雲電頭顔風食首馬高魚鳥鳴麦黄黒"
+    ),
+    "grade3": (
+        "丁世両主乗予事仕他代住使係倍全具写列助勉動勝化区医去反取受号向君味命和品"
+        "員商問坂央始委守安定実客宮宿寒対局屋岸島州帳平幸度庫庭式役待急息悪悲想意"
+        "感所打投拾持指放整旅族昔昭暑暗曲有服期板柱根植業様横橋次歯死氷決油波注泳"
+        "洋流消深温港湖湯漢炭物球由申界畑病発登皮皿相県真着短研礼神祭福秒究章童笛"
+        "第筆等箱級終緑練羊美習者育苦荷落葉薬血表詩調談豆負起路身転軽農返追送速進"
+        "遊運部都配酒重鉄銀開院陽階集面題飲館駅鼻"
+    ),
+    "grade4": (
+        "不争井付令以仲伝位低佐例便信倉候借健側働億兆児共兵典冷初別利刷副功加努労"
+        "勇包卒協単博印参司各周唱器固城埼塩変夫失奈好媛季孫完官害富察岐岡崎巣差希"
+        "席帯底府康建径徒徳必念愛成戦折挙改敗散料旗昨景最望未末札材束松果栃栄案梅"
+        "梨械極標機欠残氏民求沖治法泣浅浴清満滋漁潟灯無然焼照熊熱牧特産的省祝票種"
+        "積競笑管節約結給続縄置群老臣良芸芽英茨菜街衣要覚観訓試説課議貨賀軍輪辞辺"
+        "連達選郡量録鏡関阜阪陸隊静順願類飛飯養香験鹿"
+    ),
+    "grade5": (
+        "久仏仮件任似余価保修個停備像再刊判制則効務勢厚句可史告喜営因団囲圧在均型"
+        "基堂報境墓増士夢妻婦容寄導居属布師常幹序弁張往得復志応快性情態慣技招授採"
+        "接提損支政故救断旧易暴条枝査格桜検構武歴殺毒比永河液混減測準演潔災燃版犯"
+        "状独率現留略益眼破確示祖禁移程税築粉精紀素経統絶綿総編績織罪義耕職肥能脈"
+        "興舎航術衛製複規解設許証評講謝識護豊象財貧責貯貸費貿資賛賞質輸述迷逆造過"
+        "適酸鉱銅防限険際雑非領額飼"
+    ),
+    "grade6": (
+        "並乱乳亡仁供俳俵値傷優党冊処券刻割創劇勤危卵厳収后否吸呼善困垂域奏奮姿存"
+        "孝宅宇宗宙宝宣密寸専射将尊就尺届展層己巻幕干幼庁座延律従忘忠恩憲我批承担"
+        "拝拡捨探推揮操敬敵映晩暖暮朗机枚染株棒模権樹欲段沿泉洗派済源潮激灰熟片班"
+        "異疑痛皇盛盟看砂磁私秘穀穴窓筋策簡糖系紅納純絹縦縮署翌聖肺胃背胸脳腸腹臓"
+        "臨至舌若著蒸蔵蚕衆裁装裏補視覧討訪訳詞誌認誕誠誤論諸警貴賃退遺郵郷針銭鋼"
+        "閉閣降陛除障難革頂預骨"
+    ),
+    "joyo": (
+        "丈与且丘丙串丹丼乏乙乞乾亀了互亜享亭介仙仰企伎伏伐伯伴伸伺但佳併侍依侮侯"
+        "侵侶促俊俗俸俺倒倣倫倹偉偏偵偶偽傍傑傘催傲債傾僅僕僚僧儀儒償充克免兼冒冗"
+        "冠冥冶凄准凍凝凡凶凸凹刃刈刑到刹刺削剖剛剝剣剤剰劣励劾勃勅勘募勧勲勾匂匠"
+        "匹匿升卑卓占即却卸厄厘又及双叔叙叫召叱吉吏吐吟含吹呂呈呉呪咲咽哀哲哺唄唆"
+        "唇唐唯唾啓喉喚喝喩喪喫嗅嗣嘆嘱嘲噴嚇囚圏坊坑坪垣埋執培堀堅堆堕堤堪塀塁塊"
+        "塑塔塗塚塞塡塾墜墨墳墾壁壇壊壌壮壱奇奉契奔奥奨奪奴如妃妄妊妖妙妥妨妬姓姫"
+        "姻威娘娠娯婆婚婿媒嫁嫉嫌嫡嬢孔孤宛宜宰宴宵寂寛寝寡寧審寮寿封尉尋尚尻尼尽"
+        "尾尿屈履屯岬岳峠峡峰崇崖崩嵐巡巧巨巾帆帝帥帽幅幣幻幽幾床庶庸廃廉廊廷弄弊"
+        "弐弔弥弦弧弾彙彩彫彰影彼征徐御循微徴徹忌忍忙怒怖怠怨怪恋恐恒恣恥恨恭恵悔"
+        "悟悠患悦悩悼惑惜惧惨惰愁愉愚慄慈慌慎慕慢慨慮慰慶憂憎憤憧憩憬憶憾懇懐懲懸"
+        "戒戚戯戴戻房扇扉払扱扶抄把抑抗抜択披抱抵抹押抽拉拍拐拒拓拘拙拠括拭拳拶拷"
+        "挑挟挨挫振挿捉捕捗捜据捻掃掌排掘掛控措掲描揚換握援揺搬搭携搾摂摘摩摯撃撤"
+        "撮撲擁擦擬攻敏敢敷斉斎斑斗斜斤斥斬施旋既旦旨旬旺昆昇昧是普晶暁暇暦暫曇曖"
+        "更曹曽替朕朱朴朽杉杯析枕枠枢枯架柄某柔柳柵柿栓核栽桁桃桑桟梗棄棋棚棟棺椅"
+        "椎楷楼概槽欄欧欺款歓歳殉殊殖殴殻殿毀氾汁汎汗汚江汰沃沈沙没沢沸沼況泊泌泡"
+        "泥泰洞津洪浄浜浦浪浮浸涙涯涼淑淡淫添渇渉渋渓渡渦湧湾湿溝溶溺滅滑滝滞滴漂"
+        "漆漏漠漫漬漸潜潤潰澄濁濃濫濯瀬炉炊炎為烈焦煎煙煩煮燥爆爪爵爽牙牲犠狂狙狩"
+        "狭猛猟猫献猶猿獄獣獲玄玩珍珠琴瑠璃璧環璽瓦瓶甘甚甲畏畔畜畝畳畿疎疫疲疾症"
+        "痕痘痢痩痴瘍療癒癖皆盆盗監盤盲盾眉眠眺睡督睦瞬瞭瞳矛矯砕砲硝硫硬碁碑磨礁"
+        "礎祈祉祥禅禍秀租秩称稚稲稼稽稿穂穏穫突窃窒窟窮窯竜端符筒箇箋箸範篤簿籍籠"
+        "粋粒粗粘粛粧糧糾紋紛紡索紫累紳紹紺絞絡継維綱網綻緊緒締緩緯緻縁縛縫繁繊繕"
+        "繭繰缶罰罵罷羅羞羨翁翻翼耐耗聴肌肖肘肝股肢肩肪肯胆胎胞胴脂脅脇脊脚脱腎腐"
+        "腕腫腰腺膚膜膝膨膳臆臭致臼舗舞舟般舶舷艇艦艶芋芝芯芳苗苛茂茎荒荘菊菌菓華"
+        "萎葛葬蓄蓋蔑蔽薄薦薪薫藍藤藩藻虎虐虚虜虞虹蚊蛇蛍蛮蜂蜜融衝衡衰衷袋袖被裂"
+        "裕裸裾褐褒襟襲覆覇触訂訃託訟訴診詐詔詠詣詮詰該詳誇誉誓誘誰請諦諧諭諮諾謀"
+        "謁謄謎謙謡謹譜譲豚豪貌貞貢販貪貫貼賂賄賊賓賜賠賢賦賭購贈赦赴超越趣距跡跳"
+        "践踊踏踪蹴躍軌軒軟軸較載輝輩轄辛辣辱込迅迎迫迭逃透逐逓途逝逮逸遂遅遇遍違"
+        "遜遡遣遭遮遵遷避還那邦邪邸郊郎郭酌酎酔酢酪酬酵酷醒醜醸采釈釜釣鈍鈴鉛鉢銃"
+        "銘鋭鋳錠錦錬錮錯鍋鍛鍵鎌鎖鎮鐘鑑閑閥閲闇闘阻附陣陥陪陰陳陵陶隅隆随隔隙隠"
+        "隣隷隻雄雅雇雌離雰零雷需震霊霜霧露靴韓韻響頃項須頑頒頓頬頻頼顎顕顧飢飽飾"
+        "餅餌餓駄駆駐駒騎騒騰驚骸髄髪鬱鬼魂魅魔鮮鯨鶏鶴麓麗麺麻黙鼓齢"
+    ),
+}
+
+_JLPT = {
+    "n5": (
+        "一七万三上下中九二五人今休何先入八六円出前北十千午半南友右名四国土外大天"
+        "女子学小山川左年後日時書月木本来東校母毎気水火父生男白百聞行西見話語読車"
+        "金長間雨電食高"
+    ),
+    "n4": (
+        "不世主事京仕代以会住体作使借元兄公写冬切別力勉動医去口古台同味品員問図地"
+        "堂場売夏夕多夜妹姉始字安室家少屋工帰広店度建弟強待心思急悪意手持教文料新"
+        "方旅族早明映春昼曜有服朝業楽歌止正歩死注洋海漢牛物特犬理用田町画界病発目"
+        "真着知研社私秋究空立答紙終習考者肉自色花英茶親言計試買貸質赤走起足転近送"
+        "通週運道重野銀開院集青音題風飯飲館駅験魚鳥黒"
+    ),
+    "n3": (
+        "与両乗予争互亡交他付件任伝似位余例供便係信倒候値偉側偶備働優光全共具内冷"
+        "処列初判利到制刻割加助努労務勝勤化単危原参反収取受号合向君否吸吹告呼命和"
+        "商喜回因困園在報増声変夢太夫失好妻娘婚婦存宅守完官定実客害容宿寄富寒寝察"
+        "対局居差市師席常平幸幾座庭式引当形役彼徒得御必忘忙念怒怖性恐恥息悲情想愛"
+        "感慣成戦戻所才打払投折抜抱押招指捕掛探支放政敗散数断易昔昨晩景晴暗暮曲更"
+        "最望期未末束杯果格構様権横機欠次欲歯歳残段殺民求決治法泳洗活流浮消深済渡"
+        "港満演点然煙熱犯状猫王現球産由申留番疑疲痛登皆盗直相眠石破確示礼祖神福科"
+        "程種積突窓笑等箱米精約組経給絵絶続緒罪置美老耳職育背能腹舞船良若苦草落葉"
+        "薬術表要規覚観解記訪許認誤説調談論識警議負財貧責費資賛越路辞込迎返迷追退"
+        "逃途速連進遅遊過達違遠適選部都配酒閉関降限除険陽際雑難雪静非面靴頂頭頼顔"
+        "願類飛首馬髪鳴"
+    ),
+    "n2": (
+        "並丸久乱乳乾了介仏令仲伸伺低依個倍停傾像億兆児党兵冊再凍刊刷券刺則副劇効"
+        "勇募勢包匹区卒協占印卵厚双叫召史各含周咲喫営団囲固圧坂均型埋城域塔塗塩境"
+        "央奥姓委季孫宇宝寺封専将尊導届層岩岸島州巨巻布希帯帽幅干幼庁床底府庫延弱"
+        "律復快恋患悩憎戸承技担拝拾挟捜捨掃掘採接換損改敬旧昇星普暴曇替札机材村板"
+        "林枚枝枯柔柱査栄根械棒森植極橋欧武歴殿毒比毛氷永汗汚池沈河沸油況泉泊波泥"
+        "浅浴涙液涼混清減温測湖湯湾湿準溶滴漁濃濯灯灰炭焼照燃燥爆片版玉珍瓶甘畜略"
+        "畳療皮皿省県短砂硬磨祈祝祭禁秒移税章童競竹符筆筒算管築簡籍粉粒糸紅純細紹"
+        "絡綿総緑線編練績缶署群羽翌耕肌肩肯胃胸脂脳腕腰膚臓臣舟航般芸荒荷菓菜著蒸"
+        "蔵薄虫血衣袋被装裏補複角触訓設詞詰誌課諸講谷豊象貝貨販貯貿賞賢贈超跡踊軍"
+        "軒軟軽輪輸辛農辺述逆造郊郵量針鈍鉄鉱銅鋭録門防陸隅階隻雇雲零震革順預領額"
+        "香駐骨麦黄鼻齢"
+    ),
+    "n1": (
+        "丁丑且丘丙丞丹乃之乏乙也亀井亘亜亥亦亨享亭亮仁仙仮仰企伊伍伎伏伐伯伴伶伽"
+        "但佐佑佳併侃侍侑価侮侯侵促俊俗保修俳俵俸倉倖倣倫倭倹偏健偲偵偽傍傑傘催債"
+        "傷僕僚僧儀儒償允充克免典兼冒冗冠冴冶准凌凜凝凡凪凱凶凸凹刀刃刈刑削剖剛剣"
+        "剤剰創功劣励劾勁勅勘勧勲勺匁匠匡匿升卑卓博卯即却卸厄厘厳又及叔叙叡句只叶"
+        "司吉后吏吐吟呂呈呉哀哉哲唄唆唇唯唱啄啓善喚喝喪喬嗣嘆嘉嘱器噴嚇囚圏圭坑坪"
+        "垂垣執培基堀堅堕堤堪塀塁塊塑塚塾墓墜墨墳墾壁壇壊壌士壮壱奇奈奉奎奏契奔奨"
+        "奪奮奴如妃妄妊妙妥妨姫姻姿威娠娯婆婿媒媛嫁嫌嫡嬉嬢孔孟孤宏宗宙宜宣宥宮宰"
+        "宴宵寂寅密寛寡寧審寮寸射尉尋尚尭就尺尼尽尾尿屈展属履屯岐岬岳峠峡峰峻崇崎"
+        "崚崩嵐嵩嵯嶺巌巡巣巧己巳巴巽帆帝帥帳幕幣幹幻幽庄序庶康庸廃廉廊廷弁弊弐弓"
+        "弔弘弥弦弧張弾彗彦彩彪彫彬彰影往征径徐従循微徳徴徹忌忍志応忠怜怠怪恒恕恨"
+        "恩恭恵悌悔悟悠悦悼惇惑惜惟惣惨惰愁愉愚慈態慎慕慢慧慨慮慰慶憂憤憧憩憲憶憾"
+        "懇懐懲懸我戒戯房扇扉扱扶批抄把抑抗択披抵抹抽拍拐拒拓拘拙拠拡括拳拷挑挙振"
+        "挿据捷捺授掌排控推措掲描提揚握揮援揺搬搭携搾摂摘摩撃撤撮撲擁操擦擬攻故敏"
+        "救敢敦整敵敷斉斎斐斗斜斤斥於施旋旗既旦旨旬旭旺昂昆昌昭是昴晃晋晏晟晨晶智"
+        "暁暇暉暑暖暢暦暫曙曹朋朔朕朗朱朴朽杉李杏杜条松析枠枢架柄柊某染柚柳柾栓栗"
+        "栞株核栽桂桃案桐桑桜桟梅梓梢梧梨棄棋棚棟棺椋椎検椰椿楊楓楠楼概榛槙槻槽標"
+        "模樹樺橘檀欄欣欺欽款歓殉殊殖殴殻毅毬氏汁汐江汰汽沖沙没沢沼沿泌泡泣泰洞津"
+        "洪洲洵洸派浄浜浦浩浪浸涯淑淡淳添渇渉渋渓渚渥渦湧源溝滅滉滋滑滝滞漂漆漏漠"
+        "漫漬漱漸潔潜潟潤潮澄澪激濁濫瀬災炉炊炎為烈焦煩煮熊熙熟燎燦燿爵爽爾牧牲犠"
+        "狂狩独狭猛猟猪献猶猿獄獣獲玄率玖玲珠班琉琢琳琴瑚瑛瑞瑠瑳瑶璃環甚甫甲畔畝"
+        "異疎疫疾症痘痢痴癒癖皇皐皓盆益盛盟監盤盲盾眉看眸眺眼睡督睦瞬瞭瞳矛矢矯砕"
+        "砲硝硫碁碑碧碩磁磯礁礎祉祐祥票禄禅禍禎秀秘租秦秩称稀稔稚稜稲稼稿穀穂穏穣"
+        "穫穴窃窒窮窯竜竣端笙笛第笹筋策箇節範篤簿粋粗粘粛糖糧系糾紀紋納紗紘級紛素"
+        "紡索紫紬累紳紺絃結絞絢統絹継綜維綱網綸綺綾緊緋締緩緯縁縄縛縦縫縮繁繊織繕"
+        "繭繰罰罷羅羊義翁翔翠翻翼耀耐耗耶聖聡聴肇肖肝肢肥肪肺胆胎胞胡胤胴脅脈脚脩"
+        "脱脹腐腸膜膨臨臭至致興舌舎舗舜舶艇艦艶芋芙芝芳芹芽苑苗茂茄茅茉茎茜荘莉莞"
+        "菊菌菖菫華萌萩葬葵蒔蒼蓄蓉蓮蔦蕉蕗薦薪薫藍藤藩藻蘭虎虐虚虜虞虹蚊蚕蛇蛍蛮"
+        "蝶融衆街衛衝衡衰衷衿袈裁裂裕裟裸製褐褒襟襲覆覇視覧訂討託訟訳訴診証詐詔評"
+        "詠詢詩該詳誇誉誓誕誘誠誼諄請諒諭諮諾謀謁謄謙謝謡謹譜譲護豆豚豪貞貢貫貴賀"
+        "賃賄賊賓賜賠賦購赦赳赴趣距跳践踏躍軌軸較載輔輝輩轄辰辱迅迪迫迭透逐逓逝逮"
+        "逸遂遇遍遣遥遭遮遵遷遺遼避還邑那邦邪邸郁郎郡郭郷酉酌酔酢酪酬酵酷酸醜醸采"
+        "釈釣鈴鉛鉢銃銑銘銭鋳鋼錘錠錦錬錯鍛鎌鎖鎮鏡鐘鑑閑閣閥閲闘阻阿附陛陣陥陪陰"
+        "陳陵陶隆隊随隔障隠隣隷隼雄雅雌雛離雰雷需霊霜霞霧露靖鞠韻響項須頌頑頒頻顕"
+        "顧颯飢飼飽飾養餓馨駄駆駒駿騎騒騰驚髄鬼魁魂魅魔鮎鮮鯉鯛鯨鳩鳳鴻鵬鶏鶴鷹鹿"
+        "麗麟麻麿黎黙黛鼓"
+    ),
+}
+
+KANJI_LEVELS = tuple(_GRADES) + tuple(_JLPT)
+
+
+@lru_cache(maxsize=None)
+def known_kanji(level: str) -> FrozenSet[str]:
+    """Kanji known at ``level``: its own and those of every easier level."""
+    for levels in (_GRADES, _JLPT):
+        if level in levels:
+            known = ""
+            for name, kanji in levels.items():
+                known += kanji
+                if name == level:
+                    return frozenset(known)
+    raise ValueError(f"unknown kanji level: {level!r}")
@@ -0,0 +1,327 @@
+"""Library batch mode: convert a directory tree of EPUBs into a mirrored tree.
+
+A manifest in the output root records the input hash, size and mtime of every
+converted book together with the converter version and options. Books whose
+output is still current are skipped, so an interrupted run resumes where it
+stopped instead of starting over.
+
+Each converted book appends one line to a journal next to the manifest; the
+journal is folded into the manifest when the run ends. Recording a book thus
+costs the same in a library of ten books as in one of ten thousand, and a
+crash loses at most the line being written.
+"""
+
+import json
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from dataclasses import replace as dataclass_replace
+from hashlib import sha256
+from os import fsync, makedirs, path, remove, replace, stat, walk
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from yomigana_ebook import __version__
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.governor import Governor
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.process_ebook import create_executor, process_ebook
+from yomigana_ebook.report import ConversionReport
+from yomigana_ebook.vocabulary import Vocabulary, vocabulary_path
+from yomigana_ebook.yomituki import dictionary_identity
+
+MANIFEST_NAME = ".yomigana-manifest.json"
+# JSON Lines of records not yet folded into the manifest.
+JOURNAL_SUFFIX = ".journal"
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class LibraryResult:
+    converted: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+    # Reports of the converted books.
+    reports: Dict[str, ConversionReport] = field(default_factory=dict)
+
+
+class LibraryManifest:
+    """Per-book conversion records stored as JSON in the output root.
+
+    ``record`` appends to the journal; ``compact`` rewrites the manifest with
+    the journal folded in and removes the journal.
+    """
+
+    def __init__(self, manifest_path: str):
+        self.path = manifest_path
+        self.journal_path = manifest_path + JOURNAL_SUFFIX
+        self._lock = Lock()
+        self.books: Dict[str, Dict[str, Any]] = {}
+
+        if path.isfile(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self.books = json.load(f).get("books", {})
+        if path.isfile(self.journal_path):
+            self._replay_journal()
+
+    def is_current(
+        self,
+        relative_path: str,
+        input_path: str,
+        output_path: str,
+        options: Dict[str, Any],
+    ) -> bool:
+        """Return whether ``output_path`` is up to date for ``input_path``.
+
+        Size and mtime are checked first; the input is only hashed when the
+        mtime changed but the size did not (e.g. a copied or touched file).
+        """
+        record = self.books.get(relative_path)
+        if record is None or record.get("options") != options:
+            return False
+        if not path.isfile(output_path):
+            return False
+
+        input_stat = stat(input_path)
+        if record["size"] != input_stat.st_size:
+            return False
+        if record["mtime_ns"] == input_stat.st_mtime_ns:
+            return True
+
+        if record["sha256"] != file_sha256(input_path):
+            return False
+
+        self.record(relative_path, input_path, record["sha256"], options)
+        return True
+
+    def record(
+        self,
+        relative_path: str,
+        input_path: str,
+        input_hash: str,
+        options: Dict[str, Any],
+    ):
+        input_stat = stat(input_path)
+        record = {
+            "sha256": input_hash,
+            "size": input_stat.st_size,
+            "mtime_ns": input_stat.st_mtime_ns,
+            "options": options,
+            "converted_at": time(),
+        }
+        line = json.dumps({"book": relative_path, "record": record}, ensure_ascii=False)
+        with self._lock:
+            self.books[relative_path] = record
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                fsync(f.fileno())
+
+    def compact(self):
+        """Write every record to the manifest and drop the journal."""
+        with self._lock:
+            manifest_dir = path.dirname(self.path)
+            with NamedTemporaryFile(
+                "w", encoding="utf-8", dir=manifest_dir, delete=False
+            ) as f:
+                json.dump({"books": self.books}, f, ensure_ascii=False, indent=1)
+                f.flush()
+                fsync(f.fileno())
+            replace(f.name, self.path)
+            # Replaying the journal again after a crash right here is harmless.
+            if path.isfile(self.journal_path):
+                remove(self.journal_path)
+
+    def _replay_journal(self):
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line of a run that crashed while writing it.
+                    continue
+                self.books[entry["book"]] = entry["record"]
+
+
+def conversion_options(
+    options: ConversionOptions, vocabulary_format: Optional[str] = None
+) -> Dict[str, Any]:
+    """Everything besides the input bytes that determines a book's output."""
+    recorded: Dict[str, Any] = {
+        "converter_version": __version__,
+        "dictionary": dictionary_identity(),
+        "filter_non_japanese": options.filter_non_japanese,
+        "annotated_policy": options.annotated_policy,
+    }
+    # Only recorded when set, so books converted before they existed stay current.
+    if options.kanji_level is not None:
+        recorded["kanji_level"] = options.kanji_level
+    if options.compact_ruby:
+        recorded["compact_ruby"] = True
+    if vocabulary_format is not None:
+        recorded["vocabulary"] = vocabulary_format
+    return recorded
+
+
+def find_ebooks(input_dir: str, exclude_dir: Optional[str] = None) -> List[str]:
+    """Return the ``.epub`` files under ``input_dir`` as sorted relative paths."""
+    input_dir = path.abspath(input_dir)
+    exclude_dir = path.abspath(exclude_dir) if exclude_dir else None
+    ebooks: List[str] = []
+
+    for dir_path, dir_names, file_names in walk(input_dir):
+        dir_names[:] = sorted(
+            name for name in dir_names if path.join(dir_path, name) != exclude_dir
+        )
+        for file_name in file_names:
+            if file_name.lower().endswith(".epub"):
+                file_path = path.join(dir_path, file_name)
+                ebooks.append(path.relpath(file_path, input_dir))
+
+    return sorted(ebooks)
+
+
+def convert_library(
+    input_dir: str,
+    output_dir: str,
+    filter_non_japanese: bool = False,
+    jobs: int = 2,
+    cache: Optional[EntryCache] = None,
+    executor: Optional[Executor] = None,
+    *,
+    options: Optional[ConversionOptions] = None,
+    log: Callable[[str], None] = print,
+    governor: Optional[Governor] = None,
+    vocabulary_format: Optional[str] = None,
+) -> LibraryResult:
+    """Convert every EPUB under ``input_dir`` into the same path under ``output_dir``.
+
+    ``jobs`` books are converted at a time; all of them share one process
+    pool, so the HTML files of different books are processed side by side.
+    A ``governor`` limits the workers of all of them together. ``options``
+    are passed on to ``process_ebook``; ``filter_non_japanese`` overrides
+    theirs when set. Books with entries copied through unannotated are not
+    recorded as current, so the next run tries them again. With a
+    ``vocabulary_format`` ("json" or "sqlite"), each book's vocabulary is
+    written next to it. The ``memory_budget`` of the options applies to each
+    book, so up to ``jobs`` times as much may be in flight;
+    ``result.reports`` has the memory figures of each book.
+    """
+    input_dir = path.abspath(input_dir)
+    output_dir = path.abspath(output_dir)
+    makedirs(output_dir, exist_ok=True)
+
+    if options is None:
+        options = ConversionOptions(filter_non_japanese=filter_non_japanese)
+    elif filter_non_japanese:
+        options = dataclass_replace(options, filter_non_japanese=True)
+
+    manifest = LibraryManifest(path.join(output_dir, MANIFEST_NAME))
+    recorded = conversion_options(options, vocabulary_format)
+    result = LibraryResult()
+    outstanding: List[str] = []
+
+    for relative_path in find_ebooks(input_dir, exclude_dir=output_dir):
+        input_path = path.join(input_dir, relative_path)
+        output_path = path.join(output_dir, relative_path)
+
+        if manifest.is_current(relative_path, input_path, output_path, recorded):
+            result.skipped.append(relative_path)
+        else:
+            outstanding.append(relative_path)
+
+    log(
+        f"[library] {len(outstanding)} to convert, "
+        f"{len(result.skipped)} already up to date"
+    )
+    if not outstanding:
+        return result
+
+    def convert(relative_path: str, executor: Executor):
+        input_path = path.join(input_dir, relative_path)
+        output_path = path.join(output_dir, relative_path)
+        temp_path = f"{output_path}.tmp"
+        makedirs(path.dirname(output_path), exist_ok=True)
+
+        log(f"[start] {relative_path}")
+        start_time = time()
+        input_hash = file_sha256(input_path)
+        vocabulary = Vocabulary() if vocabulary_format is not None else None
+        try:
+            with open(input_path, "rb") as reader, open(temp_path, "wb") as writer:
+                report = process_ebook(
+                    reader,
+                    writer,
+                    options=options,
+                    cache=cache,
+                    executor=executor,
+                    governor=governor,
+                    vocabulary=vocabulary,
+                )
+            if vocabulary is not None:
+                assert vocabulary_format is not None
+                vocabulary.save(vocabulary_path(output_path, vocabulary_format))
+            replace(temp_path, output_path)
+        except BaseException:
+            if path.exists(temp_path):
+                remove(temp_path)
+            raise
+
+        result.reports[relative_path] = report
+        log_fallbacks(report, log, f"{relative_path}: ")
+        if not report.passthrough_entries:
+            manifest.record(relative_path, input_path, input_hash, recorded)
+        log(
+            f"[done]  {relative_path} ({time() - start_time:.2f} secs, "
+            f"{report.memory_summary()})"
+        )
+
+    if executor is None:
+        pool = create_executor(
+            governor=governor,
+            log=log,
+            stoppable=options.entry_time_limit is not None,
+        )
+    else:
+        pool = executor
+    try:
+        with ThreadPoolExecutor(max(1, jobs)) as book_executor:
+            futures = {
+                book_executor.submit(convert, relative_path, pool): relative_path
+                for relative_path in outstanding
+            }
+            for future in as_completed(futures):
+                relative_path = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    result.failed.append((relative_path, str(exc)))
+                    log(f"[error] {relative_path}: {exc}")
+                else:
+                    result.converted.append(relative_path)
+    finally:
+        if executor is None:
+            pool.shutdown()
+        manifest.compact()
+
+    return result
+
+
+def log_fallbacks(
+    report: ConversionReport, log: Callable[[str], None] = print, prefix: str = ""
+):
+    """Log the entries of ``report`` that were not converted normally."""
+    for file, reason in report.low_memory_entries.items():
+        log(f"[warn]  {prefix}{file}: converted in low-memory mode ({reason})")
+    for file, reason in report.passthrough_entries.items():
+        log(f"[warn]  {prefix}{file}: copied through unannotated ({reason})")
+
+
+def file_sha256(file_path: str) -> str:
+    digest = sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
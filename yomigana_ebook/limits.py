@@ -0,0 +1,125 @@
+"""Per-entry time and memory limits for ``convert_html``.
+
+The time limit is checked between text nodes. In worker processes it is also
+enforced with ``SIGALRM``, which interrupts a single huge text node, parsing
+and serializing as soon as control returns to Python; the parent stops a
+worker still busy ``ENTRY_KILL_GRACE`` seconds after that, as it is stuck in
+C code. Threads only stop at the next text node. The memory limit is checked
+up front against the estimated size of the document tree, and in worker
+processes on Linux it is also enforced on the process's heap, where going
+over it raises ``MemoryError`` inside the entry.
+"""
+
+import signal
+import sys
+from contextlib import contextmanager
+from threading import current_thread, main_thread
+from time import monotonic
+from typing import Generator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+# Measured with tracemalloc: BeautifulSoup's lxml tree takes about 14 bytes
+# per byte of HTML, before any furigana is added.
+DOM_BYTES_PER_HTML_BYTE = 16
+
+# Seconds past an entry's time limit before the parent stops its worker.
+ENTRY_KILL_GRACE = 5.0
+
+_enforce_memory_limits = False
+_enforce_time_limits = False
+
+
+class EntryLimitExceeded(Exception):
+    """Raised inside ``convert_html`` when an entry goes over one of its limits."""
+
+
+def enforce_entry_limits() -> None:
+    """Enforce entry limits on this process; only for pool worker processes.
+
+    The limits apply to the whole process, so they must not be set in one
+    that runs other work next to the entry, like the main or a web process.
+    """
+    global _enforce_memory_limits, _enforce_time_limits
+
+    _enforce_memory_limits = resource is not None and sys.platform == "linux"
+    _enforce_time_limits = hasattr(signal, "setitimer")
+
+
+def check_entry_deadline(deadline: Optional[float]) -> None:
+    if deadline is not None and monotonic() >= deadline:
+        raise EntryLimitExceeded("time limit")
+
+
+def estimated_tree_bytes(html_bytes: int) -> int:
+    """Expected size of the document tree of ``html_bytes`` of HTML."""
+    return html_bytes * DOM_BYTES_PER_HTML_BYTE
+
+
+def fits_in_memory(html_bytes: int, memory_limit: Optional[int]) -> bool:
+    """Whether the document tree of ``html_bytes`` of HTML is expected to fit."""
+    return memory_limit is None or estimated_tree_bytes(html_bytes) <= memory_limit
+
+
+@contextmanager
+def entry_limits(
+    deadline: Optional[float], memory_limit: Optional[int]
+) -> Generator[None, None, None]:
+    """Apply the limits of an entry that must be done by ``deadline``
+    (``monotonic()``); every attempt at the entry shares the deadline."""
+    check_entry_deadline(deadline)
+    # The alarm is stopped first, so it cannot interrupt lifting the limit.
+    with _data_limit(memory_limit), _alarm_at(deadline):
+        yield
+
+
+def _on_alarm(signum, frame):
+    raise EntryLimitExceeded("time limit")
+
+
+@contextmanager
+def _alarm_at(deadline: Optional[float]) -> Generator[None, None, None]:
+    # Signal handlers only run on the main thread.
+    if (
+        deadline is None
+        or not _enforce_time_limits
+        or current_thread() is not main_thread()
+    ):
+        yield
+        return
+
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - monotonic(), 1e-3))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+@contextmanager
+def _data_limit(memory_limit: Optional[int]) -> Generator[None, None, None]:
+    if memory_limit is None or not _enforce_memory_limits:
+        yield
+        return
+
+    # RLIMIT_DATA covers the heap but not the memory-mapped dictionary.
+    soft, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    limit = _data_size() + memory_limit
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_DATA, (soft, hard))
+
+
+def _data_size() -> int:
+    """Bytes in the data segment (heap and stack) of this process."""
+    with open("/proc/self/statm") as f:
+        data_pages = int(f.read().split()[5])
+    return data_pages * resource.getpagesize()
@@ -0,0 +1,99 @@
+"""Memory accounting for sizing the machines conversions run on.
+
+Every converted entry reports the peak RSS of the worker that converted it.
+With ``trace_memory``, workers also measure tracemalloc peaks for parsing,
+annotating and serializing. That slows conversion down considerably, so it is
+off by default. In the calling process, ``HeldBytes`` follows the bytes
+``process_ebook`` holds on to: the HTML it read, the entries in flight and
+converted entries waiting to be written.
+"""
+
+import ctypes
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Generator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+
+class HeldBytes:
+    """Bytes held per kind, and the peaks of each kind and of their total."""
+
+    def __init__(self):
+        self.current: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+        self.total = 0
+
+    def add(self, kind: str, size: int):
+        self.current[kind] = self.current.get(kind, 0) + size
+        self.peak[kind] = max(self.peak.get(kind, 0), self.current[kind])
+        self.total += size
+        self.peak["total"] = max(self.peak.get("total", 0), self.total)
+
+    def remove(self, kind: str, size: int):
+        self.current[kind] -= size
+        self.total -= size
+
+
+@contextmanager
+def traced_peak(
+    peaks: Optional[Dict[str, int]], stage: str
+) -> Generator[None, None, None]:
+    """Record the tracemalloc peak of the block as ``peaks[stage]``.
+
+    Does nothing when ``peaks`` is None. tracemalloc covers the whole
+    process, so entries converted on threads side by side share their peaks.
+    """
+    if peaks is None:
+        yield
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[stage] = max(peaks.get(stage, 0), peak - start)
+        if started:
+            tracemalloc.stop()
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes; 0 where unknown."""
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes.
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+    if sys.platform == "win32":
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()  # type: ignore
+        if ctypes.windll.psapi.GetProcessMemoryInfo(  # type: ignore
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return counters.PeakWorkingSetSize
+    return 0
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [
+        ("cb", ctypes.c_uint32),
+        ("PageFaultCount", ctypes.c_uint32),
+        ("PeakWorkingSetSize", ctypes.c_size_t),
+        ("WorkingSetSize", ctypes.c_size_t),
+        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+        ("PagefileUsage", ctypes.c_size_t),
+        ("PeakPagefileUsage", ctypes.c_size_t),
+    ]
@@ -0,0 +1,50 @@
+"""Options of a conversion, passed to ``process_ebook`` and ``convert_library``
+as one ``ConversionOptions`` instead of a keyword argument each."""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from yomigana_ebook.kanji_levels import KANJI_LEVELS
+
+# What to do with archives and entries that already carry furigana:
+# "skip" copies them through untouched, "bare" annotates only the text that
+# is not inside <ruby> yet.
+ANNOTATED_POLICIES = ("skip", "bare")
+
+BACKENDS = ("auto", "process", "thread")
+
+
+@dataclass(frozen=True)
+class ConversionOptions:
+    """How a book is converted; invalid values raise ``ValueError``.
+
+    ``filter_non_japanese``, ``annotated_policy``, ``kanji_level`` and
+    ``compact_ruby`` decide the output. The rest only decide how it is made,
+    see ``process_ebook``.
+    """
+
+    filter_non_japanese: bool = False
+    annotated_policy: str = "skip"
+    # Words whose kanji are all known at this level get no furigana.
+    kanji_level: Optional[str] = None
+    compact_ruby: bool = False
+    # Seconds and bytes a single HTML entry may take, see convert_html.
+    entry_time_limit: Optional[float] = None
+    entry_memory_limit: Optional[int] = None
+    # Pool used without a shared executor: "process", "thread" or "auto".
+    backend: str = "process"
+    # HTML entries of this book kept in the executor at once; on a shared
+    # executor twice its workers by default.
+    max_in_flight: Optional[int] = None
+    # Bytes of entries in flight and waiting to be written, see
+    # yomigana_ebook.memory; trace_memory adds tracemalloc peaks per stage.
+    memory_budget: Optional[int] = None
+    trace_memory: bool = False
+
+    def __post_init__(self):
+        if self.annotated_policy not in ANNOTATED_POLICIES:
+            raise ValueError(f"unknown annotated_policy: {self.annotated_policy!r}")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"unknown backend: {self.backend!r}")
+        if self.kanji_level is not None and self.kanji_level not in KANJI_LEVELS:
+            raise ValueError(f"unknown kanji_level: {self.kanji_level!r}")
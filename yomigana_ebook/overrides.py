@@ -0,0 +1,122 @@
+"""User-defined readings that take precedence over UniDic.
+
+Overrides are read from a TSV file with one ``surface<TAB>reading`` pair per
+line (readings in hiragana or katakana, ``#`` starts a comment) and compiled
+into an Aho–Corasick automaton, so finding them costs one pass over the text
+no matter how many entries the file has.
+"""
+
+from hashlib import sha256
+from typing import AbstractSet, Dict, List, Optional, Tuple
+
+from yomigana_ebook.converter import hira2kata
+
+# (start, end, reading in katakana)
+Match = Tuple[int, int, str]
+
+
+class ReadingOverrides:
+    def __init__(self, readings: Dict[str, str]):
+        """``readings`` maps surfaces to their readings in hiragana or katakana."""
+        self.readings = {
+            surface: hira2kata(reading)
+            for surface, reading in readings.items()
+            if surface and reading
+        }
+
+        # State 0 is the root. `_reading[state]` is set for states that end a
+        # surface, `_output[state]` links to the next shorter such suffix.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._depth = [0]
+        self._reading: List[Optional[str]] = [None]
+        for surface, reading in self.readings.items():
+            state = 0
+            for char in surface:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._depth.append(self._depth[state] + 1)
+                    self._reading.append(None)
+                state = next_state
+            self._reading[state] = reading
+
+        self._fail = [0] * len(self._goto)
+        self._output = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:  # breadth first; the queue grows while iterating
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] = (
+                    fail if self._reading[fail] is not None else self._output[fail]
+                )
+                queue.append(next_state)
+
+    @classmethod
+    def from_tsv(cls, file_path: str) -> "ReadingOverrides":
+        readings: Dict[str, str] = {}
+        with open(file_path, encoding="utf-8-sig") as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                fields = [field.strip() for field in line.split("\t")]
+                if len(fields) < 2 or not fields[0] or not fields[1]:
+                    raise ValueError(
+                        f"{file_path}:{line_number}: expected surface<TAB>reading"
+                    )
+                readings[fields[0]] = fields[1]
+        return cls(readings)
+
+    def __len__(self) -> int:
+        return len(self.readings)
+
+    @property
+    def fingerprint(self) -> str:
+        digest = sha256()
+        for surface, reading in sorted(self.readings.items()):
+            digest.update(f"{surface}\t{reading}\n".encode())
+        return digest.hexdigest()[:16]
+
+    def find(
+        self,
+        text: str,
+        starts: Optional[AbstractSet[int]] = None,
+        ends: Optional[AbstractSet[int]] = None,
+    ) -> List[Match]:
+        """Return the leftmost-longest, non-overlapping overrides in ``text``.
+
+        With ``starts`` and ``ends``, only matches that start and end at one
+        of those offsets count, e.g. at morpheme boundaries.
+        """
+        goto, fail, depth = self._goto, self._fail, self._depth
+        reading, output = self._reading, self._output
+
+        longest: Dict[int, int] = {}
+        state = 0
+        for end, char in enumerate(text, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            match = state if reading[state] is not None else output[state]
+            if ends is not None and end not in ends:
+                match = 0
+            while match:
+                start = end - depth[match]
+                if longest.get(start, 0) < end and (starts is None or start in starts):
+                    longest[start] = end
+                match = output[match]
+
+        matches: List[Match] = []
+        position = 0
+        for start in sorted(longest):
+            if start >= position:
+                position = longest[start]
+                matches.append((start, position, self.readings[text[start:position]]))
+        return matches
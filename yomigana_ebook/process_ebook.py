@@ -1,36 +1,227 @@
+import os
+import re
+from time import monotonic, perf_counter
 from warnings import filterwarnings
+from contextlib import nullcontext
+from dataclasses import replace
+from functools import partial
+from shutil import copyfileobj
 from typing import IO, Callable, Optional
 from zipfile import ZipFile, ZIP_DEFLATED
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 
 from bs4 import BeautifulSoup, Tag, XMLParsedAsHTMLWarning
 from bs4.element import NavigableString
-from yomigana_ebook.yomituki import yomituki
+from yomigana_ebook import __version__
+from yomigana_ebook.yomituki import (
+    counting_words,
+    merge_rubies,
+    morpheme_counts,
+    saved_ruby_bytes,
+    yomituki,
+)
+from yomigana_ebook.annotated import (
+    is_annotated_html,
+    is_converted_archive,
+    output_marker,
+)
+from yomigana_ebook.cache import EntryCache
+from yomigana_ebook.cancellation import (
+    CancelToken,
+    ConversionCancelled,
+    check_cancelled,
+    poll_timeout,
+)
 from yomigana_ebook.checking import contains_japanese
+from yomigana_ebook.epub import spine_order
+from yomigana_ebook.limits import (
+    ENTRY_KILL_GRACE,
+    EntryLimitExceeded,
+    check_entry_deadline,
+    enforce_entry_limits,
+    entry_limits,
+    estimated_tree_bytes,
+    fits_in_memory,
+)
+from yomigana_ebook.governor import Governor, lower_priority
+from yomigana_ebook.memory import HeldBytes, peak_rss, traced_peak
+from yomigana_ebook.options import ConversionOptions
+from yomigana_ebook.profiling import profile_to, start_worker_profiler
+from yomigana_ebook.recycling import RecyclingExecutor, recycling_settings
+from yomigana_ebook.report import ConversionReport, EntryResult
+from yomigana_ebook.vocabulary import Vocabulary, WordCounts
 
 filterwarnings("ignore", category=XMLParsedAsHTMLWarning, module="bs4")
+# Newer bs4 versions attribute the warning to the module calling BeautifulSoup.
+filterwarnings("ignore", category=XMLParsedAsHTMLWarning, module="yomigana_ebook")
+
+# Books with less HTML than this are converted on threads by the opt-in "auto"
+# backend, where starting worker processes and sending them the entries may
+# cost more than converting in parallel saves. Not tuned: measure the
+# crossover on the target machine with `python -m benchmarks --suite backends`.
+AUTO_THREAD_MAX_BYTES = 256 * 1024
+
+# Annotated once in every worker before its first entry.
+WARM_UP_TEXT = "漢字を読む"
 
 SKIP_TAGS = {"ruby", "rt", "rp", "script", "style"}
 
+# Seconds between checks for entries stuck past their time limit.
+_STUCK_CHECK_INTERVAL = 0.5
+
+# Comments, CDATA sections and tags, for annotate_html_lean.
+_MARKUP = re.compile(r"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<[^>]*>", re.DOTALL)
+_TAG_NAME = re.compile(r"</?\s*([A-Za-z][^\s/>]*)")
+_ENTITY = re.compile(r"(&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);)")
+
 
 def process_ebook(
     reader: IO[bytes],
     writer: IO[bytes],
     filter_non_japanese: bool = False,
     progress_callback: Optional[Callable[[int, int], None]] = None,
+    *,
+    options: Optional[ConversionOptions] = None,
+    profile_dir: Optional[str] = None,
+    cache: Optional[EntryCache] = None,
+    executor: Optional[Executor] = None,
+    cancel_token: Optional[CancelToken] = None,
+    deadline: Optional[float] = None,
+    governor: Optional[Governor] = None,
+    vocabulary: Optional[Vocabulary] = None,
+) -> ConversionReport:
+    """Convert the EPUB in ``reader`` into ``writer`` with ``options``.
+
+    ``filter_non_japanese`` is the same as ``options.filter_non_japanese``;
+    either turns the filter on.
+
+    ``writer`` does not have to be seekable; zip entries then carry data
+    descriptors. HTML entries are written in spine order as they finish, so
+    the output can be streamed to a client while the book is converted.
+
+    Cancelling ``cancel_token`` or passing the ``time.monotonic()`` value
+    ``deadline`` raises ``ConversionCancelled`` (``DeadlineExceeded``), see
+    ``yomigana_ebook.cancellation``. A seekable ``writer`` is then truncated
+    back to where the output started.
+
+    A ``governor`` (see ``yomigana_ebook.governor``) limits the workers this
+    conversion uses and lowers their priority.
+
+    Without an ``executor``, ``options.backend`` picks the pool: "process"
+    (the default), "thread", or "auto" to choose by the size of the book (see
+    ``choose_backend``). MeCab holds the GIL, so threads only pay off where
+    the book is too small to amortize starting processes.
+
+    Words whose kanji are all known at ``options.kanji_level`` (one of
+    ``KANJI_LEVELS``) get no furigana, and ``options.compact_ruby`` merges
+    adjacent rubies; ``report.ruby_bytes_saved`` tells how much markup that
+    saved.
+
+    Each HTML entry may take ``options.entry_time_limit`` seconds and
+    ``options.entry_memory_limit`` bytes; entries over a limit are converted
+    in a low-memory mode or copied through unannotated (see
+    ``convert_html``), and listed in ``report.low_memory_entries`` and
+    ``report.passthrough_entries``.
+
+    A ``vocabulary`` collects the words with kanji of the converted entries
+    with their readings and frequencies, see ``yomigana_ebook.vocabulary``.
+
+    The report records peak memory use, see ``yomigana_ebook.memory``;
+    ``options.trace_memory`` adds tracemalloc peaks per worker stage. With a
+    ``options.memory_budget`` (bytes), fewer entries are kept in flight while
+    their estimated size plus the converted entries waiting to be written
+    would exceed it.
+    """
+    if options is None:
+        options = ConversionOptions(filter_non_japanese=filter_non_japanese)
+    elif filter_non_japanese:
+        options = replace(options, filter_non_japanese=True)
+
+    report = ConversionReport()
+    start = perf_counter()
+    start_position = writer.tell() if _seekable(writer) else None
+    try:
+        _process_archive(
+            reader,
+            writer,
+            report,
+            options,
+            progress_callback=progress_callback,
+            profile_dir=profile_dir,
+            cache=cache,
+            executor=executor,
+            cancel_token=cancel_token,
+            deadline=deadline,
+            governor=governor,
+            vocabulary=vocabulary,
+        )
+    except ConversionCancelled:
+        # Do not leave a valid looking but incomplete archive behind.
+        if start_position is not None:
+            writer.seek(start_position)
+            writer.truncate()
+        raise
+    finally:
+        report.wall_seconds = perf_counter() - start
+        report.peak_rss = peak_rss()
+    return report
+
+
+def _process_archive(
+    reader: IO[bytes],
+    writer: IO[bytes],
+    report: ConversionReport,
+    options: ConversionOptions,
+    *,
+    progress_callback: Optional[Callable[[int, int], None]],
+    profile_dir: Optional[str],
+    cache: Optional[EntryCache],
+    executor: Optional[Executor],
+    cancel_token: Optional[CancelToken],
+    deadline: Optional[float],
+    governor: Optional[Governor],
+    vocabulary: Optional[Vocabulary],
 ):
+    check_cancelled(cancel_token, deadline)
+    skip_annotated = options.annotated_policy == "skip"
+    if skip_annotated and is_converted_archive(reader):
+        report.skipped_archive = True
+        copyfileobj(reader, writer)
+        if progress_callback is not None:
+            progress_callback(0, 0)
+        return
+
     with (
         ZipFile(reader, "r") as zip_reader,
         ZipFile(writer, "w", ZIP_DEFLATED) as zip_writer,
     ):
+        zip_writer.comment = output_marker(__version__)
         html_files: list[tuple[str, bytes]] = []
+        held = HeldBytes()
+        report.held_peak_bytes = held.peak
 
         for file in zip_reader.namelist():
-            content = zip_reader.read(file)
+            check_cancelled(cancel_token, deadline)
+            with report.timed("read"):
+                content = zip_reader.read(file)
+                is_html = file.endswith(("xhtml", "html"))
+                annotated = is_html and skip_annotated and is_annotated_html(content)
 
-            if file.endswith(("xhtml", "html")):
+            if is_html and not annotated:
                 html_files.append((file, content))
-            else:
+                held.add("html_files", len(content))
+                continue
+
+            if annotated:
+                report.annotated_entries += 1
+            with report.timed("write"):
                 zip_writer.writestr(file, content)
 
         if not html_files:
@@ -38,57 +229,682 @@ def process_ebook(
                 progress_callback(0, 0)
             return
 
+        # Entries are written in reading order, each as soon as it and all
+        # entries before it are done, so a streaming writer receives the book
+        # front to back while the rest is still being converted.
+        positions = {name: index for index, name in enumerate(spine_order(zip_reader))}
+        html_files.sort(
+            key=lambda html_file: positions.get(html_file[0], len(positions))
+        )
+        order = [file for file, _ in html_files]
+        # Source bytes read ahead, released as each entry is written.
+        source_sizes = {file: len(content) for file, content in html_files}
+        done_writes: dict[str, Callable[[], None]] = {}
+        next_index = 0
+
+        total = len(html_files)
+        completed = 0
+
         if progress_callback is not None:
-            progress_callback(0, len(html_files))
+            progress_callback(0, total)
+
+        def write_in_order(file: str, write: Callable[[], None], size: int):
+            nonlocal next_index
+
+            done_writes[file] = write
+            held.add("write_buffer", size)
+            while next_index < total and order[next_index] in done_writes:
+                done_writes.pop(order[next_index])()
+                next_index += 1
+
+        def write_entry(file: str, content: bytes):
+            # zipfile compresses the whole entry in memory.
+            held.add("zip_writer", len(content))
+            with report.timed("write"):
+                zip_writer.writestr(file, content)
+            held.remove("zip_writer", len(content))
+            held.remove("write_buffer", len(content))
+            held.remove("html_files", source_sizes.pop(file))
+
+        def write_cached(
+            file: str, cached_content: bytes, cached_words: Optional[WordCounts]
+        ):
+            nonlocal completed
+
+            write_entry(file, cached_content)
+            if vocabulary is not None and cached_words is not None:
+                vocabulary.update(cached_words)
+            report.converted_entries += 1
+            report.cached_entries += 1
+            completed += 1
+
+            if progress_callback is not None:
+                progress_callback(completed, total)
+
+        def write_processed(entry: EntryResult):
+            nonlocal completed
+
+            write_entry(entry.file, entry.content)
+            if vocabulary is not None and entry.words is not None:
+                vocabulary.update(entry.words)
+            # An entry copied through may convert fine on another try.
+            if cache is not None and entry.fallback != "passthrough":
+                with report.timed("cache"):
+                    cache.put(cache_keys[entry.file], entry.content)
+                    if entry.words is not None:
+                        cache.put_words(cache_keys[entry.file], entry.words)
+            report.add_entry(entry)
+            completed += 1
+
+            if progress_callback is not None:
+                progress_callback(completed, total)
+
+        def on_processed(entry: EntryResult):
+            write_in_order(
+                entry.file, partial(write_processed, entry), len(entry.content)
+            )
+
+        cache_keys: dict[str, str] = {}
+        if cache is not None:
+            uncached_files: list[tuple[str, bytes]] = []
+
+            for file, content in html_files:
+                check_cancelled(cancel_token, deadline)
+                with report.timed("cache"):
+                    key = cache.key(
+                        content,
+                        options.filter_non_japanese,
+                        options.kanji_level,
+                        options.compact_ruby,
+                    )
+                    cached_content = cache.get(key)
+                    cached_words = None
+                    if cached_content is not None and vocabulary is not None:
+                        # Converted before without counting its words.
+                        cached_words = cache.get_words(key)
+                        if cached_words is None:
+                            cached_content = None
+
+                if cached_content is None:
+                    cache_keys[file] = key
+                    uncached_files.append((file, content))
+                else:
+                    write_in_order(
+                        file,
+                        partial(write_cached, file, cached_content, cached_words),
+                        len(cached_content),
+                    )
+
+            html_files = uncached_files
+
+        if not html_files:
+            return
+
+        convert = partial(
+            convert_html,
+            filter_non_japanese=options.filter_non_japanese,
+            kanji_level=options.kanji_level,
+            compact_ruby=options.compact_ruby,
+            time_limit=options.entry_time_limit,
+            memory_limit=options.entry_memory_limit,
+            collect_words=vocabulary is not None,
+            trace_memory=options.trace_memory,
+        )
+        max_in_flight = options.max_in_flight
+        if executor is not None and max_in_flight is None:
+            # On a shared pool, a book that is cancelled leaves at most this
+            # many entries behind, and other books get their turn sooner.
+            workers = getattr(executor, "_max_workers", None)
+            max_in_flight = 2 * workers if workers else None
+        run = partial(
+            _run_on_executor,
+            html_files=html_files,
+            convert=convert,
+            on_processed=on_processed,
+            max_in_flight=max_in_flight,
+            cancel_token=cancel_token,
+            deadline=deadline,
+            governor=governor,
+            held=held,
+            memory_budget=options.memory_budget,
+            entry_time_limit=options.entry_time_limit,
+        )
+        if executor is not None:
+            # A shared executor outlives this book, so it is not shut down here.
+            run(executor)
+            return
 
         if len(html_files) == 1:
             file, content = html_files[0]
-            processed_file, processed_content = process_html(
-                file, content, filter_non_japanese
+            profiling = profile_to(profile_dir) if profile_dir else nullcontext()
+            with profiling:
+                on_processed(convert(file, content))
+            return
+
+        backend = options.backend
+        if backend == "auto":
+            html_bytes = sum(len(content) for _, content in html_files)
+            # Profiles are collected per worker process.
+            backend = "process" if profile_dir else choose_backend(html_bytes)
+
+        # Lives for this book only, so it is not recycled. It is only made
+        # stoppable where this book may stop entries that are running.
+        with create_executor(
+            profile_dir=profile_dir,
+            governor=governor,
+            backend=backend,
+            max_tasks_per_worker=0,
+            max_worker_rss=0,
+            stoppable=(
+                options.entry_time_limit is not None
+                or cancel_token is not None
+                or deadline is not None
+            ),
+        ) as executor:
+            run(executor)
+
+
+def create_executor(
+    max_workers: Optional[int] = None,
+    profile_dir: Optional[str] = None,
+    governor: Optional[Governor] = None,
+    backend: str = "process",
+    max_tasks_per_worker: Optional[int] = None,
+    max_worker_rss: Optional[int] = None,
+    log: Optional[Callable[[str], None]] = print,
+    stoppable: bool = False,
+) -> Executor:
+    """Create the pool that ``process_ebook`` runs ``process_html`` on.
+
+    Pass the result to several ``process_ebook`` calls as ``executor`` to share
+    one pool (and one dictionary load per worker) between books. Every worker
+    loads the dictionary as soon as it starts, see ``start_workers``.
+
+    The "thread" backend runs the workers as threads of this process, each
+    with its own tagger; ``profile_dir`` only applies to the "process" one.
+
+    With a ``governor``, the pool has at most ``governor.max_workers`` workers,
+    running at the governor's priority; threads share this process's priority,
+    which is left alone.
+
+    The "process" backend recycles workers: a worker is replaced after
+    ``max_tasks_per_worker`` tasks or once its peak RSS reaches
+    ``max_worker_rss`` bytes; None reads both from the environment, 0 is off.
+    Recycle events go to ``log``. A ``stoppable`` pool can stop the worker of
+    a single entry, so that cancelling a book and the parent's backstop of
+    ``entry_time_limit`` stop its running entries. Both make it a
+    ``RecyclingExecutor``, which costs a round-trip per task; otherwise it is
+    a plain ``ProcessPoolExecutor``.
+    """
+    if backend not in ("process", "thread"):
+        raise ValueError(f"unknown backend: {backend!r}")
+
+    priority = None
+    if governor is not None:
+        max_workers = min(max_workers or governor.max_workers, governor.max_workers)
+        priority = (governor.nice, governor.idle_io)
+
+    if backend == "thread":
+        return ThreadPoolExecutor(
+            max_workers or os.cpu_count(),
+            thread_name_prefix="yomigana",
+            initializer=warm_up_tagger,
+        )
+
+    if max_tasks_per_worker is None or max_worker_rss is None:
+        env_max_tasks, env_max_rss = recycling_settings()
+        max_tasks_per_worker = (
+            env_max_tasks if max_tasks_per_worker is None else max_tasks_per_worker
+        )
+        max_worker_rss = env_max_rss if max_worker_rss is None else max_worker_rss
+
+    if not (max_tasks_per_worker or max_worker_rss or stoppable):
+        return ProcessPoolExecutor(
+            max_workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(profile_dir, priority),
+        )
+
+    create = partial(
+        ProcessPoolExecutor,
+        1,
+        initializer=_init_worker,
+        initargs=(profile_dir, priority),
+    )
+    return RecyclingExecutor(
+        create,
+        max_workers or os.cpu_count() or 1,
+        max_tasks_per_worker,
+        max_worker_rss,
+        log=log,
+    )
+
+
+def choose_backend(html_bytes: int) -> str:
+    """The backend ``backend="auto"`` uses for a book with ``html_bytes`` of HTML."""
+    # MeCab holds the GIL, so threads only win where processes do not pay off.
+    if (os.cpu_count() or 1) == 1 or html_bytes < AUTO_THREAD_MAX_BYTES:
+        return "thread"
+    return "process"
+
+
+def start_workers(executor: Executor) -> None:
+    """Start the workers of ``executor`` now instead of with the first entries.
+
+    Workers load the dictionary before they take their first task, so calling
+    this ahead of time (e.g. while a user is still picking files) takes the
+    dictionary load out of the first conversion.
+    """
+    if isinstance(executor, RecyclingExecutor):
+        executor.start()
+        return
+    max_workers = executor._max_workers  # type: ignore
+    wait([executor.submit(os.getpid) for _ in range(max_workers)])
+
+
+def warm_up_tagger() -> None:
+    """Load the tagger and the dictionary pages it touches first."""
+    "".join(yomituki(WARM_UP_TEXT))
+
+
+def _init_worker(profile_dir: Optional[str], priority: Optional[tuple[int, bool]]):
+    if priority is not None:
+        lower_priority(*priority)
+    enforce_entry_limits()
+    warm_up_tagger()
+    if profile_dir is not None:
+        start_worker_profiler(profile_dir)
+
+
+def _run_on_executor(
+    executor: Executor,
+    html_files: list[tuple[str, bytes]],
+    convert: Callable[[str, bytes], EntryResult],
+    on_processed: Callable[[EntryResult], None],
+    *,
+    max_in_flight: Optional[int] = None,
+    cancel_token: Optional[CancelToken] = None,
+    deadline: Optional[float] = None,
+    governor: Optional[Governor] = None,
+    held: Optional[HeldBytes] = None,
+    memory_budget: Optional[int] = None,
+    entry_time_limit: Optional[float] = None,
+):
+    # Submitting lazily keeps at most `max_in_flight` entries of this book in
+    # the executor, so books sharing one pool take turns instead of the first
+    # book's entries occupying every worker until it is done.
+    limit = max(1, max_in_flight) if max_in_flight else len(html_files)
+    pending: set[Future[EntryResult]] = set()
+    held = held if held is not None else HeldBytes()
+    # Entry, source bytes and estimated tree bytes of the entries in flight.
+    in_flight: dict[Future[EntryResult], tuple[str, bytes, int]] = {}
+    estimated_in_flight = 0
+    # Workers stuck in an entry past its time limit are stopped, where the
+    # pool can stop a single worker; entries are timed from when they start.
+    stop_stuck = entry_time_limit is not None and isinstance(
+        executor, RecyclingExecutor
+    )
+    started: dict[Future[EntryResult], float] = {}
+
+    def process_next_done():
+        nonlocal pending, estimated_in_flight
+
+        timeout = poll_timeout(cancel_token, deadline)
+        if stop_stuck:
+            timeout = min(
+                _STUCK_CHECK_INTERVAL if timeout is None else timeout,
+                _STUCK_CHECK_INTERVAL,
             )
-            zip_writer.writestr(processed_file, processed_content)
+        done, pending = wait(pending, timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            file, content, estimate = in_flight.pop(future)
+            started.pop(future, None)
+            held.remove("in_flight", len(content))
+            estimated_in_flight -= estimate
+            if stop_stuck and isinstance(future.exception(), EntryLimitExceeded):
+                on_processed(
+                    EntryResult(
+                        file,
+                        content,
+                        fallback="passthrough",
+                        fallback_reason="time limit",
+                    )
+                )
+            else:
+                on_processed(future.result())
+        if stop_stuck:
+            stop_stuck_workers()
+        check_cancelled(cancel_token, deadline)
 
-            if progress_callback is not None:
-                progress_callback(1, len(html_files))
-            return
+    def stop_stuck_workers():
+        assert entry_time_limit is not None
+        now = monotonic()
+        for future in pending:
+            if future.running():
+                started.setdefault(future, now)
+        stuck = [
+            future
+            for future, since in started.items()
+            if now - since > entry_time_limit + ENTRY_KILL_GRACE
+        ]
+        if stuck:
+            executor.terminate(stuck, EntryLimitExceeded("time limit"))  # type: ignore
 
-        with ProcessPoolExecutor() as executor:
-            futures = [
-                executor.submit(process_html, file, content, filter_non_japanese)
-                for file, content in html_files
-            ]
+    def over_budget(estimate: int) -> bool:
+        # One entry is always let through, however large it is.
+        if memory_budget is None or not pending:
+            return False
+        held_for_writing = held.current.get("write_buffer", 0)
+        return estimated_in_flight + estimate + held_for_writing > memory_budget
 
-            completed = 0
-            for future in as_completed(futures):
-                file, processed_content = future.result()
-                zip_writer.writestr(file, processed_content)
-                completed += 1
+    def add_pending(future: Future[EntryResult], file: str, content: bytes):
+        nonlocal estimated_in_flight
 
-                if progress_callback is not None:
-                    progress_callback(completed, len(html_files))
+        estimate = estimated_tree_bytes(len(content))
+        pending.add(future)
+        in_flight[future] = (file, content, estimate)
+        held.add("in_flight", len(content))
+        estimated_in_flight += estimate
+
+    def take_slot(governor: Governor):
+        # Keep writing finished entries while waiting for a worker slot.
+        while not governor.acquire(
+            0 if pending else poll_timeout(cancel_token, deadline)
+        ):
+            if pending:
+                process_next_done()
+            else:
+                check_cancelled(cancel_token, deadline)
+
+    try:
+        for file, content in html_files:
+            estimate = estimated_tree_bytes(len(content))
+            while len(pending) >= limit or over_budget(estimate):
+                process_next_done()
+
+            if governor is None:
+                future = executor.submit(convert, file, content)
+                add_pending(future, file, content)
+                continue
+
+            take_slot(governor)
+            try:
+                future = executor.submit(convert, file, content)
+            except BaseException:
+                governor.release()
+                raise
+            future.add_done_callback(governor.release)
+            add_pending(future, file, content)
+
+        while pending:
+            process_next_done()
+    finally:
+        # Only left over after an error or a cancellation. Entries already
+        # running are stopped too where the pool can stop single workers, also
+        # on a shared pool, which only replaces their workers. Elsewhere, like
+        # threads, they finish their entry.
+        running = [future for future in pending if not future.cancel()]
+        if running and isinstance(executor, RecyclingExecutor):
+            executor.terminate(running)
+
+
+def _seekable(stream: IO[bytes]) -> bool:
+    try:
+        return stream.seekable()
+    except (AttributeError, ValueError):
+        return False
 
 
 def process_html(file: str, content: bytes, filter_non_japanese: bool = False):
-    soup = BeautifulSoup(content, "lxml")
+    entry = convert_html(file, content, filter_non_japanese)
+    return entry.file, entry.content
 
-    for child in soup.children:
-        process_tag(child, filter_non_japanese)  # type: ignore
 
-    return file, soup.encode(formatter=None)  # type: ignore
+def convert_html(
+    file: str,
+    content: bytes,
+    filter_non_japanese: bool = False,
+    kanji_level: Optional[str] = None,
+    compact_ruby: bool = False,
+    time_limit: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    collect_words: bool = False,
+    trace_memory: bool = False,
+) -> EntryResult:
+    """Annotate one HTML entry and measure how long each step took.
+
+    With ``trace_memory``, ``EntryResult.stage_peak_bytes`` holds the
+    tracemalloc peak of each step, see ``yomigana_ebook.memory``.
+
+    With ``collect_words``, ``EntryResult.words`` counts the words with kanji
+    of the entry, see ``yomigana_ebook.vocabulary``.
+
+    An entry that goes over ``time_limit`` (seconds) or ``memory_limit``
+    (bytes), or fails to convert, is retried with ``annotate_html_lean`` and
+    copied through unannotated if that fails too; ``EntryResult.fallback``
+    records which, see ``yomigana_ebook.limits``. Both attempts together get
+    ``time_limit`` seconds.
+    """
+    # Counted per thread, so entries converted side by side on threads do not
+    # count each other's morphemes.
+    morphemes_before, misses_before = morpheme_counts()
+    saved_before = saved_ruby_bytes()
+    options = (filter_non_japanese, kanji_level, compact_ruby)
+    entry = EntryResult(file, content)
+    peaks: Optional[dict[str, int]] = {} if trace_memory else None
 
+    # One deadline for the entry, so a retry does not start the clock again.
+    deadline = None if time_limit is None else monotonic() + time_limit
+    fallback_reason = None
+    try:
+        if not fits_in_memory(len(content), memory_limit):
+            raise MemoryError
+        with (
+            entry_limits(deadline, memory_limit),
+            counting_words(collect_words) as words,
+        ):
+            _convert_tree(entry, *options, deadline, peaks)
+        entry.words = words
+    except Exception as exc:
+        # Retried outside of the except block: its traceback would keep the
+        # document tree alive during the retry.
+        fallback_reason = _fallback_reason(exc)
 
-def process_tag(tag: Tag, filter_non_japanese: bool = False):
+    if fallback_reason is not None:
+        entry.fallback_reason = fallback_reason
+        try:
+            with (
+                entry_limits(deadline, memory_limit),
+                counting_words(collect_words) as words,
+            ):
+                _convert_lean(entry, *options, deadline, peaks)
+            entry.words = words
+            entry.fallback = "low-memory"
+        except Exception as exc:
+            entry.content = content
+            entry.chars = 0
+            entry.words = {} if collect_words else None
+            entry.fallback = "passthrough"
+            entry.fallback_reason = _fallback_reason(exc)
+
+    morphemes_after, misses_after = morpheme_counts()
+    entry.morphemes = morphemes_after - morphemes_before
+    entry.tagger_cache_misses = misses_after - misses_before
+    entry.tagger_cache_hits = entry.morphemes - entry.tagger_cache_misses
+    entry.ruby_bytes_saved = saved_ruby_bytes() - saved_before
+    entry.stage_peak_bytes = peaks
+    entry.worker_pid = os.getpid()
+    entry.worker_peak_rss = peak_rss()
+    return entry
+
+
+def _convert_tree(
+    entry: EntryResult,
+    filter_non_japanese: bool,
+    kanji_level: Optional[str],
+    compact_ruby: bool,
+    deadline: Optional[float],
+    peaks: Optional[dict[str, int]],
+):
+    start = perf_counter()
+    with traced_peak(peaks, "parse"):
+        soup = BeautifulSoup(entry.content, "lxml")
+    parsed = perf_counter()
+
+    chars = 0
+    with traced_peak(peaks, "annotate"):
+        for child in soup.children:
+            chars += process_tag(
+                child,  # type: ignore
+                filter_non_japanese,
+                kanji_level,
+                compact_ruby,
+                deadline,
+            )
+    annotated = perf_counter()
+
+    with traced_peak(peaks, "serialize"):
+        converted = soup.encode(formatter=None)  # type: ignore
+    serialized = perf_counter()
+
+    entry.content = converted
+    entry.chars = chars
+    entry.parse_seconds = parsed - start
+    entry.annotate_seconds = annotated - parsed
+    entry.serialize_seconds = serialized - annotated
+
+
+def _convert_lean(
+    entry: EntryResult,
+    filter_non_japanese: bool,
+    kanji_level: Optional[str],
+    compact_ruby: bool,
+    deadline: Optional[float],
+    peaks: Optional[dict[str, int]],
+):
+    start = perf_counter()
+    with traced_peak(peaks, "annotate"):
+        entry.content, entry.chars = annotate_html_lean(
+            entry.content, filter_non_japanese, kanji_level, compact_ruby, deadline
+        )
+    entry.annotate_seconds += perf_counter() - start
+
+
+def _fallback_reason(exc: Exception) -> str:
+    if isinstance(exc, EntryLimitExceeded):
+        return str(exc)
+    if isinstance(exc, MemoryError):
+        return "memory limit"
+    return f"{type(exc).__name__}: {exc}"
+
+
+def process_tag(
+    tag: Tag,
+    filter_non_japanese: bool = False,
+    kanji_level: Optional[str] = None,
+    compact_ruby: bool = False,
+    deadline: Optional[float] = None,
+) -> int:
+    """Annotate ``tag`` in place and return the number of characters annotated."""
     if isinstance(tag, NavigableString):
         text = str(tag)
-        if not text.strip():
-            return
-        if not filter_non_japanese or contains_japanese(text):
-            tag.replace_with("".join(yomituki(text)))
-        return
+        annotated = annotate_text(text, filter_non_japanese, kanji_level, compact_ruby)
+        if annotated is None:
+            return 0
+        check_entry_deadline(deadline)
+        tag.replace_with(annotated)
+        return len(text)
 
     if tag.name in SKIP_TAGS:
-        return
+        return 0
 
+    chars = 0
     if hasattr(tag, "children"):
         for child in tag.children:
-            process_tag(child, filter_non_japanese)  # type: ignore
+            chars += process_tag(
+                child,  # type: ignore
+                filter_non_japanese,
+                kanji_level,
+                compact_ruby,
+                deadline,
+            )
+    return chars
+
+
+def annotate_text(
+    text: str,
+    filter_non_japanese: bool = False,
+    kanji_level: Optional[str] = None,
+    compact_ruby: bool = False,
+) -> Optional[str]:
+    """Return ``text`` with furigana, or None if it is left as it is."""
+    if not text.strip():
+        return None
+    if filter_non_japanese and not contains_japanese(text):
+        return None
+
+    annotated = "".join(yomituki(text, kanji_level))
+    if compact_ruby:
+        annotated = merge_rubies(annotated)
+    return annotated
+
+
+def annotate_html_lean(
+    content: bytes,
+    filter_non_japanese: bool = False,
+    kanji_level: Optional[str] = None,
+    compact_ruby: bool = False,
+    deadline: Optional[float] = None,
+) -> tuple[bytes, int]:
+    """Annotate an HTML entry without building a document tree.
+
+    The text between tags is annotated as it is found, except inside
+    ``SKIP_TAGS``. This needs little more memory than the input and output
+    and skips parsing, but trusts the markup to be well-formed. Returns the
+    converted entry and the number of characters annotated.
+    """
+    html = content.decode("utf-8", errors="surrogateescape")
+    parts: list[str] = []
+    chars = 0
+    skip_depth = 0
+    position = 0
+
+    def add_text(text: str):
+        nonlocal chars
+
+        if skip_depth:
+            parts.append(text)
+            return
+
+        # Character references stay as they are; the text around them is
+        # annotated separately (odd pieces are the references).
+        for index, piece in enumerate(_ENTITY.split(text)):
+            annotated = None
+            if index % 2 == 0:
+                annotated = annotate_text(
+                    piece, filter_non_japanese, kanji_level, compact_ruby
+                )
+            if annotated is None:
+                parts.append(piece)
+                continue
+            check_entry_deadline(deadline)
+            parts.append(annotated)
+            chars += len(piece)
+
+    for markup in _MARKUP.finditer(html):
+        if markup.start() > position:
+            add_text(html[position : markup.start()])
+        parts.append(markup.group())
+        position = markup.end()
+
+        tag = markup.group()
+        name = _TAG_NAME.match(tag)
+        if name is not None and name[1].lower() in SKIP_TAGS:
+            if tag.startswith("</"):
+                skip_depth = max(0, skip_depth - 1)
+            elif not tag.endswith("/>"):
+                skip_depth += 1
+
+    if position < len(html):
+        add_text(html[position:])
+    return "".join(parts).encode("utf-8", errors="surrogateescape"), chars
@@ -0,0 +1,84 @@
+"""cProfile support for the worker processes used by ``process_ebook``.
+
+Profiling the CLI with ``python -m cProfile`` only sees the parent process,
+which spends its time waiting on futures. The real work (``convert_html``,
+``yomituki_word``, BeautifulSoup) runs in ``ProcessPoolExecutor`` children, so
+each worker profiles itself and writes a ``.pstats`` file when it exits.
+"""
+
+import cProfile
+import pstats
+from os import getpid, makedirs, path, scandir
+from contextlib import contextmanager
+from multiprocessing import util
+from time import time_ns
+from typing import Generator, Optional
+
+PROFILE_SUFFIX = ".pstats"
+MERGED_PROFILE_NAME = f"merged{PROFILE_SUFFIX}"
+
+_worker_profiler: Optional[cProfile.Profile] = None
+
+
+def start_worker_profiler(profile_dir: str) -> None:
+    """``ProcessPoolExecutor`` initializer that profiles the worker until exit."""
+    global _worker_profiler
+
+    if _worker_profiler is not None:
+        return
+
+    profiler = cProfile.Profile()
+    _worker_profiler = profiler
+
+    # atexit handlers do not run in multiprocessing children, but finalizers
+    # registered with multiprocessing.util run when the worker exits normally.
+    util.Finalize(
+        None, _dump_profile, args=(profiler, profile_dir, "worker"), exitpriority=10
+    )
+    profiler.enable()
+
+
+@contextmanager
+def profile_to(profile_dir: str, label: str = "main") -> Generator[None, None, None]:
+    """Profile the enclosed block in the current process into ``profile_dir``."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _dump_profile(profiler, profile_dir, label)
+
+
+def merge_profiles(profile_dir: str, since_ns: int = 0) -> Optional[pstats.Stats]:
+    """Merge the per-process ``.pstats`` files in ``profile_dir`` into one report.
+
+    Only files modified at or after ``since_ns`` are merged, so a directory can
+    be reused across runs. The merged statistics are also written to
+    ``merged.pstats`` for use with ``pstats`` or snakeviz.
+    """
+    if not path.isdir(profile_dir):
+        return None
+
+    profile_paths = sorted(
+        entry.path
+        for entry in scandir(profile_dir)
+        if entry.is_file()
+        and entry.name.endswith(PROFILE_SUFFIX)
+        and entry.name != MERGED_PROFILE_NAME
+        and entry.stat().st_mtime_ns >= since_ns
+    )
+    if not profile_paths:
+        return None
+
+    stats = pstats.Stats(*profile_paths)
+    stats.dump_stats(path.join(profile_dir, MERGED_PROFILE_NAME))
+    return stats
+
+
+def _dump_profile(profiler: cProfile.Profile, profile_dir: str, label: str) -> None:
+    profiler.disable()
+    makedirs(profile_dir, exist_ok=True)
+    profiler.dump_stats(
+        path.join(profile_dir, f"{label}-{getpid()}-{time_ns()}{PROFILE_SUFFIX}")
+    )
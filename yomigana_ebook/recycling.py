@@ -0,0 +1,317 @@
+"""A process pool whose workers are recycled, and stopped, one at a time.
+
+Workers of a pool that outlives a book (web demo, desktop app, library mode)
+keep growing: the word caches fill up, and freed parse trees leave a
+fragmented heap behind. A ``RecyclingExecutor`` replaces a worker after
+``max_tasks_per_worker`` tasks, or once its peak RSS reaches
+``max_worker_rss``. Only that worker is replaced, once it is idle, so the
+pool never runs more than one extra process while the new one starts.
+
+Each worker is a ``ProcessPoolExecutor`` of one process that is handed a
+task only when it is idle. Stopping the worker of one task (``terminate``)
+thus leaves the tasks of the other workers alone, where terminating a
+process of a ``ProcessPoolExecutor`` breaks the whole pool. The price is a
+round-trip through this process per task, so ``create_executor`` only uses
+it where workers are recycled or stopped.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import partial
+from os import environ
+from signal import SIGTERM
+from threading import Condition, RLock, Thread
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
+
+WORKER_MAX_TASKS_ENV = "YOMIGANA_WORKER_MAX_TASKS"
+WORKER_MAX_RSS_ENV = "YOMIGANA_WORKER_MAX_RSS_MB"
+
+
+def recycling_settings() -> Tuple[int, int]:
+    """``(max_tasks_per_worker, max_worker_rss)`` from the environment; 0 is off."""
+    max_tasks = int(environ.get(WORKER_MAX_TASKS_ENV) or 0)
+    max_rss_mb = int(environ.get(WORKER_MAX_RSS_ENV) or 0)
+    return max_tasks, max_rss_mb * 1024 * 1024
+
+
+@dataclass
+class _Worker:
+    executor: ProcessPoolExecutor
+    # The task it runs, None while it is idle.
+    task: Optional[Future] = None
+    tasks: int = 0
+    # Set by the first call in the process, which waits for its initializer
+    # (the dictionary load); tasks are only handed to started workers.
+    pid: Optional[int] = None
+    starting: bool = False
+    # Its pool is shutting down, see RecyclingExecutor.shutdown.
+    closed: bool = False
+
+
+class RecyclingExecutor(Executor):
+    def __init__(
+        self,
+        create: Callable[[], ProcessPoolExecutor],
+        max_workers: int,
+        max_tasks_per_worker: int = 0,
+        max_worker_rss: int = 0,
+        log: Optional[Callable[[str], None]] = print,
+    ):
+        """``create`` makes the pool of a single worker process."""
+        self._create = create
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_worker_rss = max_worker_rss
+        self._log = log
+        self.recycles = 0
+
+        self._lock = Condition(RLock())
+        self._workers = [_Worker(create()) for _ in range(max_workers)]
+        self._queue: Deque[Tuple[Future, Callable, tuple, dict]] = deque()
+        self._shutdown = False
+        # Threads shutting down replaced worker pools, joined by
+        # shutdown(wait=True) so that their processes have exited.
+        self._closing: List[Thread] = []
+
+    @property
+    def _max_workers(self) -> int:
+        return len(self._workers)
+
+    def pids(self) -> List[int]:
+        """Process IDs of the workers that have started."""
+        with self._lock:
+            return [worker.pid for worker in self._workers if worker.pid is not None]
+
+    def start(self):
+        """Start the workers that have not started yet and wait for them."""
+        with self._lock:
+            for worker in self._workers:
+                if worker.pid is None and not worker.starting and not worker.closed:
+                    self._start(worker)
+            self._lock.wait_for(
+                lambda: not any(worker.starting for worker in self._workers)
+            )
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queue.append((future, fn, args, kwargs))
+            self._dispatch()
+        return future
+
+    def terminate(
+        self,
+        futures: Optional[Iterable[Future]] = None,
+        error: Optional[BaseException] = None,
+    ) -> int:
+        """Stop the workers running ``futures`` (default: every busy worker).
+
+        Their futures fail with ``error``. The stopped workers are replaced
+        by ones that start with their next task; queued ``futures`` are left
+        alone, cancel them first. Returns the number of workers stopped.
+        """
+        selected = None if futures is None else set(futures)
+        stopped: List[Future] = []
+        with self._lock:
+            for worker in self._workers:
+                if worker.task is None:
+                    continue
+                if selected is None or worker.task in selected:
+                    stopped.append(worker.task)
+                    self._replace(worker, "task stopped", kill=True)
+            self._dispatch()
+        for future in stopped:
+            future.set_exception(
+                error or BrokenProcessPool("the worker was terminated")
+            )
+        return len(stopped)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            queued = []
+            if cancel_futures:
+                queued, self._queue = list(self._queue), deque()
+            self._dispatch()
+        for future, *_ in queued:
+            future.cancel()
+        if not wait:
+            return
+
+        with self._lock:
+            self._lock.wait_for(self._drained)
+            closing = list(self._closing)
+        for thread in closing:
+            thread.join()
+
+    def _dispatch(self):
+        # Called with the lock held: hand queued tasks to idle workers.
+        for worker in self._workers:
+            if not self._queue:
+                break
+            if worker.task is not None or worker.starting:
+                continue
+            if worker.pid is None:
+                self._start(worker)
+                continue
+            task = self._next_task()
+            if task is None:
+                break
+            future, fn, args, kwargs = task
+            worker.task = future
+            worker.tasks += 1
+            try:
+                inner = worker.executor.submit(fn, *args, **kwargs)
+            except (BrokenProcessPool, RuntimeError) as exc:
+                # The process died between two tasks, or could not be replaced.
+                worker.task = None
+                future.set_exception(exc)
+                self._replace(worker, "it stopped")
+                continue
+            inner.add_done_callback(partial(self._finished, worker, future))
+
+        if self._shutdown and not self._queue:
+            for worker in self._workers:
+                if worker.task is None and not worker.starting and not worker.closed:
+                    worker.closed = True
+                    self._close(worker.executor)
+        self._lock.notify_all()
+
+    def _next_task(self) -> Optional[Tuple[Future, Callable, tuple, dict]]:
+        while self._queue:
+            task = self._queue.popleft()
+            if task[0].set_running_or_notify_cancel():
+                return task
+        return None
+
+    def _drained(self) -> bool:
+        return not self._queue and all(
+            worker.task is None and not worker.starting for worker in self._workers
+        )
+
+    def _finished(self, worker: _Worker, future: Future, inner: Future):
+        with self._lock:
+            if worker.task is not future:
+                # Stopped by terminate, which already failed the future.
+                return
+            # Set before the worker takes another task, so that terminate
+            # never sees a finished task as running.
+            if inner.cancelled():
+                future.set_exception(BrokenProcessPool("the worker was shut down"))
+            elif inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result())
+
+            worker.task = None
+            reason = self._recycle_reason(worker, inner)
+            if reason is not None:
+                self._replace(worker, reason, start=True)
+            self._dispatch()
+
+    def _recycle_reason(self, worker: _Worker, inner: Future) -> Optional[str]:
+        if inner.cancelled():
+            return None
+        if isinstance(inner.exception(), BrokenProcessPool):
+            return "it stopped"
+        if self.max_tasks_per_worker and worker.tasks >= self.max_tasks_per_worker:
+            return f"{self.max_tasks_per_worker} tasks"
+        if self.max_worker_rss and inner.exception() is None:
+            # Results of convert_html carry the RSS of the worker that made them.
+            rss = getattr(inner.result(), "worker_peak_rss", 0)
+            if rss >= self.max_worker_rss:
+                return f"{rss / 1024 / 1024:.0f} MiB"
+        return None
+
+    def _replace(
+        self, worker: _Worker, reason: str, kill: bool = False, start: bool = False
+    ):
+        # Called with the lock held. The replacement starts now with ``start``,
+        # so it loads the dictionary before it takes the next task, and else
+        # with its next task: the pool may be about to shut down (cancelled
+        # book), or the worker may not start at all.
+        old, pid = worker.executor, worker.pid
+        if kill and pid is not None:
+            _kill(old, pid)
+        self._close(old)
+        worker.task = None
+        worker.tasks = 0
+        worker.pid = None
+        worker.starting = False
+        if self._shutdown:
+            return
+
+        try:
+            worker.executor = self._create()
+        except Exception as exc:  # noqa: BLE001 - the next task reports it
+            self._emit(f"[error] could not replace worker {pid}: {exc}")
+            return
+        worker.closed = False
+        self.recycles += 1
+        if pid is not None:
+            action = "stopped" if kill else "recycled"
+            self._emit(f"[info] {action} worker {pid} ({reason})")
+        if start:
+            self._start(worker)
+
+    def _start(self, worker: _Worker):
+        # Called with the lock held.
+        try:
+            started = worker.executor.submit(os.getpid)
+        except (BrokenProcessPool, RuntimeError) as exc:
+            # The pool could not be replaced; a queued task reports it.
+            self._fail_next(exc)
+            self._replace(worker, "it stopped")
+            return
+        worker.starting = True
+        started.add_done_callback(partial(self._started, worker, worker.executor))
+
+    def _started(self, worker: _Worker, executor: ProcessPoolExecutor, started: Future):
+        with self._lock:
+            if worker.executor is not executor:
+                return
+            worker.starting = False
+            if started.cancelled():
+                error: Optional[BaseException] = BrokenProcessPool("the worker stopped")
+            else:
+                error = started.exception()
+            if error is None:
+                worker.pid = started.result()
+            else:
+                # E.g. the initializer failed: report it rather than retry forever.
+                self._fail_next(error)
+                self._replace(worker, "it did not start")
+            self._dispatch()
+
+    def _fail_next(self, error: BaseException):
+        task = self._next_task()
+        if task is not None:
+            task[0].set_exception(error)
+
+    def _close(self, executor: ProcessPoolExecutor):
+        # Called with the lock held. The process is waited for on a thread of
+        # its own, so that a recycled worker still finishes writing (profiles)
+        # while the pool goes on.
+        self._closing = [thread for thread in self._closing if thread.is_alive()]
+        thread = Thread(target=executor.shutdown, name="yomigana-worker-shutdown")
+        thread.start()
+        self._closing.append(thread)
+
+    def _emit(self, message: str):
+        if self._log is not None:
+            self._log(message)
+
+
+def _kill(executor: ProcessPoolExecutor, pid: int):
+    terminate_workers = getattr(executor, "terminate_workers", None)
+    if terminate_workers is not None:  # Python 3.14+
+        terminate_workers()
+        return
+    try:
+        os.kill(pid, SIGTERM)
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,145 @@
+"""What a conversion did and where its time went.
+
+``process_ebook`` returns a ``ConversionReport``. The numbers measured inside
+the workers (parse, annotate and serialize time, characters, morphemes, tagger
+cache lookups, ruby markup saved and peak memory) travel back with every converted entry as an
+``EntryResult`` and are summed up in the report.
+"""
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from time import perf_counter
+from typing import Any, Dict, Generator, Optional, Tuple
+
+# "read", "cache" and "write" run in the calling process, the others in the
+# workers; worker stages are summed over all workers, so they can add up to
+# more than the wall time.
+MAIN_STAGES = ("read", "cache", "write")
+WORKER_STAGES = ("parse", "annotate", "serialize")
+STAGES = MAIN_STAGES + WORKER_STAGES
+
+
+@dataclass
+class EntryResult:
+    file: str
+    content: bytes
+    chars: int = 0
+    morphemes: int = 0
+    tagger_cache_hits: int = 0
+    tagger_cache_misses: int = 0
+    ruby_bytes_saved: int = 0
+    # "low-memory" or "passthrough" when the entry went over a limit or failed
+    # to convert, see convert_html; the reason says which.
+    fallback: Optional[str] = None
+    fallback_reason: Optional[str] = None
+    # Words with kanji and their counts, when the caller collects a vocabulary.
+    words: Optional[Dict[Tuple[str, str], int]] = None
+    # The worker's process and its peak RSS after this entry; tracemalloc
+    # peaks per worker stage with trace_memory.
+    worker_pid: int = 0
+    worker_peak_rss: int = 0
+    stage_peak_bytes: Optional[Dict[str, int]] = None
+    parse_seconds: float = 0.0
+    annotate_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+
+
+@dataclass
+class ConversionReport:
+    # Set when the whole archive was copied through as already converted.
+    skipped_archive: bool = False
+    # HTML entries that were annotated, by a worker or from the entry cache.
+    converted_entries: int = 0
+    cached_entries: int = 0
+    # HTML entries copied through because they already carry furigana.
+    annotated_entries: int = 0
+    chars: int = 0
+    morphemes: int = 0
+    tagger_cache_hits: int = 0
+    tagger_cache_misses: int = 0
+    # Ruby markup left out by kanji levels and merged rubies (approximate).
+    ruby_bytes_saved: int = 0
+    # Entries that fell back to the low-memory mode or were copied through
+    # unannotated, mapped to the reason.
+    low_memory_entries: Dict[str, str] = field(default_factory=dict)
+    passthrough_entries: Dict[str, str] = field(default_factory=dict)
+    stage_seconds: Dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(STAGES, 0.0)
+    )
+    wall_seconds: float = 0.0
+    # Peak RSS of the calling process and of every worker process, by pid
+    # (threads report the calling process), in bytes.
+    peak_rss: int = 0
+    worker_peak_rss: Dict[int, int] = field(default_factory=dict)
+    # Largest tracemalloc peak of each worker stage, with trace_memory.
+    stage_peak_bytes: Dict[str, int] = field(default_factory=dict)
+    # Peak bytes process_ebook held by kind ("html_files", "in_flight",
+    # "write_buffer", "zip_writer") and in total.
+    held_peak_bytes: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def worker_seconds(self) -> float:
+        return sum(self.stage_seconds[stage] for stage in WORKER_STAGES)
+
+    @property
+    def tagger_cache_hit_rate(self) -> float:
+        lookups = self.tagger_cache_hits + self.tagger_cache_misses
+        return self.tagger_cache_hits / lookups if lookups else 0.0
+
+    @contextmanager
+    def timed(self, stage: str) -> Generator[None, None, None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[stage] += perf_counter() - start
+
+    def add_entry(self, entry: EntryResult):
+        self.converted_entries += 1
+        self.chars += entry.chars
+        self.morphemes += entry.morphemes
+        self.tagger_cache_hits += entry.tagger_cache_hits
+        self.tagger_cache_misses += entry.tagger_cache_misses
+        self.ruby_bytes_saved += entry.ruby_bytes_saved
+        if entry.fallback == "low-memory":
+            self.low_memory_entries[entry.file] = entry.fallback_reason or ""
+        elif entry.fallback == "passthrough":
+            self.passthrough_entries[entry.file] = entry.fallback_reason or ""
+        self.stage_seconds["parse"] += entry.parse_seconds
+        self.stage_seconds["annotate"] += entry.annotate_seconds
+        self.stage_seconds["serialize"] += entry.serialize_seconds
+        if entry.worker_pid:
+            self.worker_peak_rss[entry.worker_pid] = max(
+                self.worker_peak_rss.get(entry.worker_pid, 0), entry.worker_peak_rss
+            )
+        for stage, peak in (entry.stage_peak_bytes or {}).items():
+            self.stage_peak_bytes[stage] = max(
+                self.stage_peak_bytes.get(stage, 0), peak
+            )
+
+    def memory_summary(self) -> str:
+        """Peak memory use in MiB, in one line for logs."""
+        summary = f"peak RSS {_mib(self.peak_rss)}"
+        if self.worker_peak_rss:
+            summary += (
+                f", workers up to {_mib(max(self.worker_peak_rss.values()))} "
+                f"({len(self.worker_peak_rss)} processes)"
+            )
+        summary += f", held {_mib(self.held_peak_bytes.get('total', 0))}"
+        if self.stage_peak_bytes:
+            stages = ", ".join(
+                f"{stage} {_mib(peak)}" for stage, peak in self.stage_peak_bytes.items()
+            )
+            summary += f", traced {stages}"
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **asdict(self),
+            "worker_seconds": self.worker_seconds,
+            "tagger_cache_hit_rate": self.tagger_cache_hit_rate,
+        }
+
+
+def _mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MiB"
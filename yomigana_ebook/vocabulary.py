@@ -0,0 +1,93 @@
+"""Per-book vocabulary gathered while a book is annotated.
+
+With a ``Vocabulary`` passed to ``process_ebook``, the workers count every
+word that contains kanji by its dictionary form and reading as they tag it,
+so building flashcard lists takes no second pass over the book. Counts come
+back with each entry and are merged in the calling process; cached entries
+keep theirs next to the cached HTML.
+"""
+
+import json
+import sqlite3
+from collections import Counter
+from os import path, remove, replace
+from tempfile import NamedTemporaryFile
+from typing import Any, Dict, Iterable, List, Tuple
+
+from yomigana_ebook.converter import kata2hira
+
+VOCABULARY_FORMATS = ("json", "sqlite")
+
+# (dictionary form, reading in katakana) -> occurrences
+WordCounts = Dict[Tuple[str, str], int]
+
+
+class Vocabulary:
+    def __init__(self):
+        self.counts: "Counter[Tuple[str, str]]" = Counter()
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def update(self, counts: WordCounts):
+        self.counts.update(counts)
+
+    def words(self) -> List[Dict[str, Any]]:
+        """Words with their reading in hiragana, most frequent first."""
+        ordered = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [
+            {"word": word, "reading": kata2hira(reading), "count": count}
+            for (word, reading), count in ordered
+        ]
+
+    def save(self, file_path: str):
+        """Write the words as JSON or SQLite, chosen by the extension of ``file_path``."""
+        vocabulary_format = path.splitext(file_path)[1].lstrip(".")
+        if vocabulary_format not in VOCABULARY_FORMATS:
+            raise ValueError(f"unknown vocabulary format: {file_path!r}")
+
+        file_dir = path.dirname(path.abspath(file_path))
+        with NamedTemporaryFile("wb", dir=file_dir, delete=False) as f:
+            temp_path = f.name
+        try:
+            if vocabulary_format == "json":
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump({"words": self.words()}, f, ensure_ascii=False, indent=1)
+            else:
+                _write_sqlite(temp_path, self.words())
+            replace(temp_path, file_path)
+        except BaseException:
+            if path.exists(temp_path):
+                remove(temp_path)
+            raise
+
+
+def vocabulary_path(output_path: str, vocabulary_format: str) -> str:
+    """Where the vocabulary of the book converted to ``output_path`` goes."""
+    return f"{path.splitext(output_path)[0]}.words.{vocabulary_format}"
+
+
+def dump_counts(counts: WordCounts) -> bytes:
+    return json.dumps(
+        [[word, reading, count] for (word, reading), count in counts.items()],
+        ensure_ascii=False,
+    ).encode()
+
+
+def load_counts(data: bytes) -> WordCounts:
+    return {(word, reading): count for word, reading, count in json.loads(data)}
+
+
+def _write_sqlite(file_path: str, words: Iterable[Dict[str, Any]]):
+    connection = sqlite3.connect(file_path)
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE words (word TEXT NOT NULL, reading TEXT NOT NULL, "
+                "count INTEGER NOT NULL, PRIMARY KEY (word, reading))"
+            )
+            connection.executemany(
+                "INSERT INTO words VALUES (:word, :reading, :count)", words
+            )
+    finally:
+        connection.close()
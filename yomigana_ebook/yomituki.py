@@ -1,11 +1,18 @@
-from typing import Tuple, Generator
-from os import environ
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Match, Optional, Tuple, Generator
+from os import environ, path
 from os.path import commonprefix
-from functools import lru_cache
+from functools import lru_cache, update_wrapper
+from hashlib import sha256
+from threading import current_thread, local, main_thread
 
 import unidic
 from fugashi import Tagger  # type: ignore
 from yomigana_ebook.converter import kata2hira
+from yomigana_ebook.kanji_levels import known_kanji
+from yomigana_ebook.overrides import ReadingOverrides
 from yomigana_ebook.checking import (
     is_unknown,
     is_kana_only,
@@ -14,10 +21,22 @@ from yomigana_ebook.checking import (
     is_hira,
     is_kanji,
     contains_japanese_script,
+    contains_kanji,
 )
 
 _UNIDIC_DIR_ENV = "YOMIGANA_UNIDIC_DIR"
 _LEGACY_UNIDIC_DIR_ENV = "YOMIGANA_UNICID_DIR"
+# TSV file of reading overrides, see yomigana_ebook.overrides. Read from the
+# environment so worker processes load it as well.
+READINGS_ENV = "YOMIGANA_READINGS"
+# Entries in each of the per-word caches; read from the environment so worker
+# processes use the same size.
+WORD_CACHE_SIZE_ENV = "YOMIGANA_WORD_CACHE_SIZE"
+DEFAULT_WORD_CACHE_SIZE = 65536
+
+# Adjacent rubies are merged as long as the merged base stays this short;
+# a longer base spreads the reading too far to match it to its kanji.
+MAX_MERGED_RUBY_BASE = 4
 
 _dicdir_env = environ.get(_UNIDIC_DIR_ENV) or environ.get(_LEGACY_UNIDIC_DIR_ENV)
 if _dicdir_env:
@@ -27,8 +46,103 @@ if _dicdir_env:
 
 tagger = Tagger()  # type: ignore
 
+_word_cache_size = int(environ.get(WORD_CACHE_SIZE_ENV) or DEFAULT_WORD_CACHE_SIZE)
 
-def yomituki(sentence: str) -> Generator[str, None, None]:
+_readings_path = environ.get(READINGS_ENV)
+_overrides: Optional[ReadingOverrides] = (
+    ReadingOverrides.from_tsv(_readings_path) if _readings_path else None
+)
+
+
+class _ThreadState(local):
+    """Per thread: MeCab taggers must not be shared between threads."""
+
+    def __init__(self):
+        self.tagger = tagger if current_thread() is main_thread() else None
+        self.morphemes = 0
+        self.cache_misses = 0
+        self.saved_bytes = 0
+        # Set while counting_words() runs.
+        self.words: Optional[Counter] = None
+
+
+_thread_state = _ThreadState()
+
+
+def thread_tagger() -> Tagger:
+    """Return the tagger of the calling thread, creating it on first use."""
+    state = _thread_state
+    if state.tagger is None:
+        state.tagger = Tagger()  # type: ignore
+    return state.tagger
+
+
+def morpheme_counts() -> Tuple[int, int]:
+    """Morphemes annotated and ``yomituki_word`` cache misses on this thread so far."""
+    state = _thread_state
+    return state.morphemes, state.cache_misses
+
+
+@contextmanager
+def counting_words(enabled: bool = True) -> Generator[Optional[Counter], None, None]:
+    """Count the words with kanji annotated on this thread inside the block.
+
+    Yields a ``Counter`` of ``(dictionary form, reading in katakana)``, or
+    None when not ``enabled``.
+    """
+    state = _thread_state
+    state.words = Counter() if enabled else None
+    try:
+        yield state.words
+    finally:
+        state.words = None
+
+
+def saved_ruby_bytes() -> int:
+    """Bytes of ruby markup left out by kanji levels and merging on this thread so far."""
+    return _thread_state.saved_bytes
+
+
+# Bytes of sys.dic hashed for the dictionary identity; the header and the
+# start of the trie are enough to tell dictionary builds apart without
+# reading hundreds of megabytes.
+_DICTIONARY_FINGERPRINT_BYTES = 1 << 16
+
+
+@lru_cache(maxsize=1)
+def dictionary_identity() -> str:
+    """Return a stable fingerprint of the UniDic dictionary used by ``tagger``.
+
+    The fingerprint does not depend on where the dictionary is installed, so
+    caches keyed by it can be shared between machines. Reading overrides are
+    part of it, as they change the output just like the dictionary does.
+    """
+    digest = sha256()
+    dicdir = unidic.DICDIR
+
+    for name in ("version", "dicrc"):
+        file_path = path.join(dicdir, name)
+        if path.isfile(file_path):
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+
+    sys_dic = path.join(dicdir, "sys.dic")
+    if path.isfile(sys_dic):
+        digest.update(str(path.getsize(sys_dic)).encode())
+        with open(sys_dic, "rb") as f:
+            digest.update(f.read(_DICTIONARY_FINGERPRINT_BYTES))
+
+    if _overrides is not None:
+        digest.update(f"overrides:{_overrides.fingerprint}".encode())
+
+    return digest.hexdigest()[:16]
+
+
+def yomituki(
+    sentence: str, kanji_level: Optional[str] = None
+) -> Generator[str, None, None]:
+    """Annotate ``sentence``; words whose kanji are all known at ``kanji_level``
+    (see ``yomigana_ebook.kanji_levels``) are left bare."""
     if not contains_japanese_script(sentence):
         yield sentence
         return
@@ -40,19 +154,125 @@ def yomituki(sentence: str) -> Generator[str, None, None]:
 
     # re-insert the whitespaces where they used to be
     for i, sub_sentence in enumerate(sub_sentences):
-        yield from yomituki_text(sub_sentence)
+        yield from yomituki_text(sub_sentence, kanji_level)
 
         if i < last_index:
             yield " "
 
 
-def yomituki_text(text: str) -> Generator[str, None, None]:
-    for morpheme in tagger(text):  # type: ignore
-        yield yomituki_word(morpheme.surface, morpheme.feature.kana)  # type: ignore
+def set_reading_overrides(overrides: Optional[ReadingOverrides]) -> None:
+    """Use ``overrides`` in this process; set ``YOMIGANA_READINGS`` for workers."""
+    global _overrides
+
+    _overrides = overrides
+    dictionary_identity.cache_clear()
 
 
-@lru_cache(maxsize=65536)
+def yomituki_text(
+    text: str, kanji_level: Optional[str] = None
+) -> Generator[str, None, None]:
+    state = _thread_state
+    morphemes = (state.tagger or thread_tagger())(text)  # type: ignore
+    state.morphemes += len(morphemes)
+    if _overrides is None:
+        yield from yomituki_morphemes(morphemes, kanji_level)
+        return
+
+    # Overrides apply to whole morphemes only, so the reading of a name like
+    # 光 does not leak into 光景. Morpheme index by start and end offset:
+    starts: Dict[int, int] = {}
+    ends: Dict[int, int] = {}
+    position = 0
+    for index, morpheme in enumerate(morphemes):
+        position += len(morpheme.white_space)
+        starts[position] = index
+        position += len(morpheme.surface)
+        ends[position] = index
+
+    # Overridden readings are always annotated, whatever the kanji level.
+    index = 0
+    for start, end, kata in _overrides.find(text, starts.keys(), ends.keys()):
+        yield from yomituki_morphemes(morphemes[index : starts[start]], kanji_level)
+        part = text[start:end]
+        if state.words is not None:
+            state.words[part, kata] += 1
+        yield yomituki_word(part, kata)
+        index = ends[end] + 1
+    yield from yomituki_morphemes(morphemes[index:], kanji_level)
+
+
+def yomituki_morphemes(
+    morphemes, kanji_level: Optional[str] = None
+) -> Generator[str, None, None]:
+    state = _thread_state
+    words = state.words
+    for morpheme in morphemes:
+        surface, kata = morpheme.surface, morpheme.feature.kana  # type: ignore
+        if words is not None:
+            count_word(words, morpheme.feature)
+        if kanji_level is not None:
+            saved = known_word_ruby_bytes(surface, kata, kanji_level)
+            if saved is not None:
+                state.saved_bytes += saved
+                yield surface
+                continue
+        yield yomituki_word(surface, kata)
+
+
+def count_word(words: Counter, feature) -> None:
+    """Count the dictionary form of a morpheme if it contains kanji."""
+    word, reading = feature.orthBase, feature.kanaBase
+    if word in (None, "*") or reading in (None, "*"):
+        return
+    if contains_kanji(word):
+        words[word, reading] += 1
+
+
+class _WordCache:
+    """``lru_cache`` that ``set_word_cache_size`` resizes in place, so that
+    references imported from this module use the new size too."""
+
+    def __init__(self, function):
+        update_wrapper(self, function)
+        self._cached = lru_cache(_word_cache_size)(function)
+
+    def __call__(self, *args):
+        return self._cached(*args)
+
+    def resize(self, maxsize: int) -> None:
+        self._cached = lru_cache(maxsize)(self.__wrapped__)  # type: ignore
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+    def cache_clear(self) -> None:
+        self._cached.cache_clear()
+
+
+@_WordCache
+def known_word_ruby_bytes(
+    surface: str, kata: str | None, kanji_level: str
+) -> Optional[int]:
+    """Roughly the bytes of ruby markup a word known at ``kanji_level`` goes
+    without; None unless all of its kanji are known there."""
+    if is_unknown(surface, kata) or is_kana_only(surface):
+        return None
+
+    kanji = [char for char in surface if is_kanji(char)]
+    if not kanji or not known_kanji(kanji_level).issuperset(kanji):
+        return None
+
+    # Skips the alignment yomituki_word does; the okurigana are cut off only
+    # to estimate what the ruby would have cost.
+    _, (mid_text, mid_hira), _ = cut_by_hira(surface, kata2hira(kata))
+    return len(ruby_wrap(mid_text, mid_hira).encode()) - len(mid_text.encode())
+
+
+@_WordCache
 def yomituki_word(surface: str, kata: str | None) -> str:
+    # Only runs when the cache misses.
+    _thread_state.cache_misses += 1
+
     if is_unknown(surface, kata):
         return surface
 
@@ -83,6 +303,15 @@ def yomituki_word(surface: str, kata: str | None) -> str:
         return ruby_wrap(surface, kata2hira(kata))
 
 
+def set_word_cache_size(maxsize: int) -> None:
+    """Resize the per-word caches of this process; they start out empty.
+
+    Set ``WORD_CACHE_SIZE_ENV`` as well for worker processes started later.
+    """
+    known_word_ruby_bytes.resize(maxsize)
+    yomituki_word.resize(maxsize)
+
+
 def yomituki_compound(surface: str, hira: str) -> str:
     hira_in_surface_reversed = ""
 
@@ -119,6 +348,36 @@ def ruby_wrap(kanji: str, hira: str) -> str:
     return f"<ruby>{kanji}<rt>{hira}</rt></ruby>"
 
 
+_RUBY = re.compile(r"<ruby>([^<]+)<rt>([^<]+)</rt></ruby>")
+_RUBY_RUN = re.compile(f"(?:{_RUBY.pattern}){{2,}}")
+_RUBY_MARKUP_BYTES = len(ruby_wrap("", ""))
+
+
+def merge_rubies(annotated: str) -> str:
+    """Merge adjacent rubies of ``annotated`` text, e.g. the three of 第一部 into one.
+
+    Only rubies with nothing between them are merged, so every reading still
+    sits over the same kanji, just without per-kanji alignment.
+    """
+    return _RUBY_RUN.sub(_merge_ruby_run, annotated)
+
+
+def _merge_ruby_run(run: Match[str]) -> str:
+    merged = []
+    base = reading = ""
+    for ruby in _RUBY.finditer(run.group()):
+        if base and len(base) + len(ruby[1]) <= MAX_MERGED_RUBY_BASE:
+            base += ruby[1]
+            reading += ruby[2]
+            _thread_state.saved_bytes += _RUBY_MARKUP_BYTES
+            continue
+        if base:
+            merged.append(ruby_wrap(base, reading))
+        base, reading = ruby[1], ruby[2]
+    merged.append(ruby_wrap(base, reading))
+    return "".join(merged)
+
+
 def cut_by_hira(surface: str, hira: str) -> Tuple[str, Tuple[str, str], str]:
     prefix = find_common_prefix(surface, hira)
     suffix = find_common_suffix(surface, hira)